@@ -45,4 +45,17 @@ with st.spinner("Testing agent..."):
         st.success("✅ Agent working!")
         st.write("**Answer:**", result["answer"])
     except Exception as e:
-        st.error(f"❌ Agent failed: {e}")
\ No newline at end of file
+        st.error(f"❌ Agent failed: {e}")
+        st.stop()
+
+# Crews are pooled across questions, so asking the same question again must
+# still run the search tool (no cached tool output) and return sources
+with st.spinner("Asking the same question again..."):
+    try:
+        repeat = agent.ask(question, use_cache=False)
+        if result["sources"] and not repeat["sources"]:
+            st.error("❌ Repeated question returned no sources (tool result was cached)")
+        else:
+            st.success(f"✅ Repeated question retrieved {len(repeat['sources'])} sources")
+    except Exception as e:
+        st.error(f"❌ Repeated question failed: {e}")
\ No newline at end of file
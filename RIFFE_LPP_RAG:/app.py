@@ -16,18 +16,30 @@
 
 import os
 import time
-import json
-import re
+import uuid
 from datetime import datetime
-from typing import Any, Dict, List
-
-import streamlit as st
-import pandas as pd
-
-from backend.database import RAGDatabase
-from backend.agent import RAGAgent
+from typing import Any, Dict, List, TYPE_CHECKING
+
+# First, so the startup report covers every import below
+from backend import startup
+
+with startup.timed_import("streamlit"):
+    import streamlit as st
+with startup.timed_import("pandas"):
+    import pandas as pd
+
+# backend.database no longer imports sentence_transformers/torch at import time.
+# backend.agent (crewai) is imported lazily in get_agent(), or by the warm-up thread.
+with startup.timed_import("backend.database"):
+    from backend.database import RAGDatabase, embedding_backend, warm_up_model
+from backend.vector_engine import corpus_version
+from backend.feedback_store import get_feedback_store
+from backend.principles import principle_mask, principle_names
 import config
 
+if TYPE_CHECKING:
+    from backend.agent import RAGAgent
+
 # -----------------------------------------------------------------------------
 # Page Configuration (must be first Streamlit command)
 # -----------------------------------------------------------------------------
@@ -37,47 +49,28 @@ st.set_page_config(
     layout="wide"
 )
 
+# Once per process: load the embedding model (+ one dummy encode) and import
+# crewai in the background while the sidebar renders, instead of on the first question
+if getattr(config, "STARTUP_WARMUP", True):
+    startup.start_warmup({
+        "embedding_model": warm_up_model,
+        "backend.agent": lambda: startup.preload("backend.agent"),
+    })
+
 # -----------------------------------------------------------------------------
 # Helper: CST principles detection (simple but effective demo feature)
 # -----------------------------------------------------------------------------
-CST_PRINCIPLES = {
-    "Human Dignity": [
-        r"\bdignity\b", r"\bhuman person\b", r"\bimage of God\b", r"\bintrinsic worth\b"
-    ],
-    "Common Good": [
-        r"\bcommon good\b", r"\bsocial good\b", r"\bpublic good\b"
-    ],
-    "Solidarity": [
-        r"\bsolidarity\b", r"\bmutual responsibility\b", r"\bwe are one\b"
-    ],
-    "Subsidiarity": [
-        r"\bsubsidiarity\b", r"\bclosest level\b", r"\blocal level\b", r"\bdecentraliz"
-    ],
-    "Preferential Option for the Poor": [
-        r"\bpreferential option\b", r"\bpoor\b", r"\bvulnerable\b", r"\bmarginalized\b"
-    ],
-    "Stewardship / Care for Creation": [
-        r"\bstewardship\b", r"\bcreation\b", r"\benvironment\b", r"\bsustainab"
-    ],
-    "Rights & Responsibilities": [
-        r"\bright(s)?\b", r"\bresponsibilit(y|ies)\b", r"\bdut(y|ies)\b"
-    ],
-    "Dignity of Work & Rights of Workers": [
-        r"\bdignity of work\b", r"\bworker(s)?\b", r"\blabor\b", r"\bjust wage\b", r"\bunion\b"
-    ],
-}
-
-def detect_principles(text: str, sources: List[Dict[str, Any]]) -> List[str]:
+# Chunks are tagged once at ingestion (backend.principles); per answer we only
+# OR their stored bitmasks and scan the answer text in one pass.
+def detect_principles(text: str, sources: List[Dict[str, Any]], db: RAGDatabase | None = None) -> List[str]:
     """Detect likely CST principles mentioned in answer + retrieved sources."""
-    blob = (text or "") + "\n\n" + "\n\n".join([s.get("text", "") for s in (sources or [])])
-    blob_lower = blob.lower()
-    found = []
-    for principle, patterns in CST_PRINCIPLES.items():
-        for pat in patterns:
-            if re.search(pat, blob_lower, flags=re.IGNORECASE):
-                found.append(principle)
-                break
-    return found
+    mask = principle_mask(text)
+    tags = db.get_principles([s["id"] for s in (sources or []) if s.get("id") is not None]) if db else {}
+    for s in sources or []:
+        tag = tags.get(s.get("id"))
+        # Untagged store (or a source without an id): scan the passage itself
+        mask |= tag if tag is not None else principle_mask(s.get("text", ""))
+    return principle_names(mask)
 
 # -----------------------------------------------------------------------------
 # Helper: Safe metadata extraction for source table
@@ -93,7 +86,8 @@ def build_sources_df(sources: List[Dict[str, Any]]) -> pd.DataFrame:
             "Section": s.get("section", s.get("heading", "")),
             "Chunk ID": s.get("chunk_id", s.get("chunk", s.get("id", ""))),
             "URL": s.get("url", ""),
-            "Chars": len(s.get("text", "") or ""),
+            "Date": s.get("date", "") or "",
+            "Chars": s.get("chars", len(s.get("text", "") or "")),
         })
     df = pd.DataFrame(rows)
     if not df.empty:
@@ -108,15 +102,181 @@ def similarity_stats(sources: List[Dict[str, Any]]) -> Dict[str, float]:
     return {"avg": sum(sims) / len(sims), "min": min(sims), "max": max(sims)}
 
 # -----------------------------------------------------------------------------
-# Helper: Feedback logging
+# Helper: Session latency percentiles (from the backend's per-stage timing)
+# -----------------------------------------------------------------------------
+TIMING_STAGES = [
+    ("Total", "total_s"),
+    ("First token", "ttft_s"),
+    ("Embedding", "embedding_s"),
+    ("DuckDB / search", "db_s"),
+    ("Tool calls (retrieval)", "retrieval_s"),
+    ("LLM", "llm_s"),
+    ("Agent setup", "setup_s"),
+]
+RUN_HISTORY_LIMIT = 200  # answered questions kept per session for p50/p95
+
+def stage_percentiles(history: List[Dict[str, Any]], last: Dict[str, Any]) -> pd.DataFrame:
+    rows = []
+    for label, key in TIMING_STAGES:
+        values = pd.Series([run["timing"][key] for run in history if key in run["timing"]], dtype=float)
+        rows.append({
+            "Stage": label,
+            "Last (s)": round(float(last.get(key, 0.0)), 3),
+            "p50 (s)": round(float(values.quantile(0.50)), 3) if len(values) else None,
+            "p95 (s)": round(float(values.quantile(0.95)), 3) if len(values) else None,
+        })
+    return pd.DataFrame(rows)
+
+# -----------------------------------------------------------------------------
+# Helper: Chat history rendering
 # -----------------------------------------------------------------------------
-def append_feedback_log(record: Dict[str, Any], path: str = "feedback.jsonl") -> None:
-    try:
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-    except Exception:
-        # Don't break app due to logging.
-        pass
+# Every interaction reruns the whole script, so past turns must be cheap:
+# - only the last CHAT_PAGE_TURNS turns are drawn; older ones load on request
+# - per-message view data (sources table, captions) is built ONCE and kept on
+#   the message as an immutable snapshot
+# - sources, exports and feedback are fragments: clicking in one reruns only
+#   that fragment, not the script; passages are drawn only when toggled on
+# - sources are stored as compact records (id, similarity, size); passage text
+#   is fetched by id from the shared RAGDatabase cache when it is shown
+CHAT_PAGE_TURNS = getattr(config, "CHAT_PAGE_TURNS", 5)
+CHAT_MAX_TURNS = getattr(config, "CHAT_MAX_TURNS", 200)
+SOURCE_COLUMNS = ["Rank", "Similarity", "Document", "Title", "Section", "Chunk ID", "Chars", "URL"]
+
+def new_message(role: str, content: str, **meta) -> Dict[str, Any]:
+    # Stable id: widget keys must not shift when older turns are paged out
+    return {"id": uuid.uuid4().hex[:12], "role": role, "content": content, **meta}
+
+def compact_sources(sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Source records without passage text (kept only when there is no id to fetch it by)."""
+    compact = []
+    for source in sources or []:
+        text = source.get("text", "") or ""
+        record = {k: v for k, v in source.items() if k != "text"}
+        record["chars"] = len(text)
+        if source.get("id") is None:
+            record["text"] = text
+        compact.append(record)
+    return compact
+
+def message_snapshot(message: Dict[str, Any]) -> Dict[str, Any]:
+    """View data for an assistant message, computed on first render and reused after."""
+    snapshot = message.get("snapshot")
+    if snapshot is None:
+        sources = message.get("sources", []) or []
+        df = build_sources_df(sources)
+        captions = []
+        for source in sources:
+            meta_bits = [f"{k}: {source[k]}" for k in ["title", "document", "doc", "section", "heading", "chunk_id", "url"]
+                         if source.get(k)]
+            captions.append(" • ".join(meta_bits))
+        snapshot = message["snapshot"] = {
+            "sources_df": df[SOURCE_COLUMNS] if not df.empty else df,
+            "similarity": similarity_stats(sources),
+            "captions": captions,
+        }
+    return snapshot
+
+@st.fragment
+def sources_panel(message: Dict[str, Any]) -> None:
+    sources = message.get("sources", []) or []
+    if not sources:
+        return
+    snapshot = message_snapshot(message)
+    with st.expander(f"📚 View Sources ({len(sources)} retrieved) • avg sim {snapshot['similarity']['avg']:.3f}"):
+        # Show table first (more professional than only text areas)
+        st.dataframe(snapshot["sources_df"], use_container_width=True, hide_index=True)
+
+        # Then the passages, only when asked for (up to 20 text areas per message)
+        if st.toggle("Show passages", key=f"src_{message['id']}"):
+            # Text isn't kept in session state: fetch it by chunk id (shared LRU in RAGDatabase)
+            ids = [source["id"] for source in sources if "text" not in source]
+            texts = get_database(message.get("db_path", st.session_state.db_path)).get_texts(ids) if ids else {}
+            for i, (source, caption) in enumerate(zip(sources, snapshot["captions"]), 1):
+                st.divider()
+                st.markdown(f"**Source {i}** (Similarity: {float(source.get('similarity', 0.0)):.3f})")
+                if caption:
+                    st.caption(caption)
+                text = source["text"] if "text" in source else texts.get(source["id"])
+                if text is None:
+                    st.caption("⚠️ This passage is no longer in the database (it was re-ingested).")
+                    continue
+                if len(text) != source.get("chars", len(text)):
+                    st.caption("⚠️ The database changed since this answer; showing the current passage text.")
+                st.text_area(
+                    f"Passage {i}",
+                    text,
+                    height=160,
+                    key=f"src_{message['id']}_{i}",
+                    label_visibility="collapsed"
+                )
+
+@st.fragment
+def export_buttons(message: Dict[str, Any]) -> None:
+    # Exports (answer only)
+    answer_text = message.get("content", "")
+    if not answer_text:
+        return
+    export_col1, export_col2 = st.columns(2)
+    with export_col1:
+        st.download_button(
+            "⬇️ Download answer (.md)",
+            data=answer_text,
+            file_name="cst_rag_answer.md",
+            mime="text/markdown",
+            key=f"dl_md_{message['id']}"
+        )
+    with export_col2:
+        st.download_button(
+            "⬇️ Download answer (.txt)",
+            data=answer_text,
+            file_name="cst_rag_answer.txt",
+            mime="text/plain",
+            key=f"dl_txt_{message['id']}"
+        )
+
+@st.fragment
+def feedback_form(message: Dict[str, Any]) -> None:
+    # Feedback (logged for reflection)
+    fb_key = f"fb_{message['id']}"
+    saved = st.session_state.last_feedback.get(message["id"])
+    thumbs = st.radio(
+        "Was this helpful?",
+        ["—", "👍", "👎"],
+        horizontal=True,
+        index=0,
+        key=fb_key
+    )
+    note = st.text_input("Optional feedback (what was missing?)", key=f"{fb_key}_note")
+
+    if thumbs in ["👍", "👎"] and st.button("Save feedback", key=f"{fb_key}_save"):
+        record = {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "thumb": thumbs,
+            "note": note,
+            "question": message.get("question", ""),
+            "answer": message.get("content", ""),
+            "mode": message.get("mode", ""),
+            "tone": message.get("tone", ""),
+            "strict_citations": message.get("strict_citations", None),
+            "model": message.get("model", ""),
+            "top_k": message.get("top_k", None),
+            "max_iter": message.get("max_iter", None),
+            "similarity": message.get("similarity", {}),
+        }
+        # Queued; a background thread commits it (shared by all sessions)
+        get_feedback_store().submit(record)
+        saved = st.session_state.last_feedback[message["id"]] = {"thumb": thumbs, "note": note}
+    if saved:
+        st.success(f"Feedback saved ({saved['thumb']})")
+
+def render_assistant_extras(message: Dict[str, Any]) -> None:
+    """Principles + sources + exports + feedback under an assistant answer."""
+    principles = message.get("principles", []) or []
+    if principles:
+        st.markdown("**Detected CST principles:** " + " • ".join([f"`{p}`" for p in principles]))
+    sources_panel(message)
+    export_buttons(message)
+    feedback_form(message)
 
 # -----------------------------------------------------------------------------
 # Cached resource: DB init (smooth reruns)
@@ -125,6 +285,22 @@ def append_feedback_log(record: Dict[str, Any], path: str = "feedback.jsonl") ->
 def get_database(db_path: str) -> RAGDatabase:
     return RAGDatabase(db_path)
 
+# Sidebar filter choices. `version` (corpus_version, a stat() of the file) is
+# only part of the cache key, so a re-ingested store gets fresh options.
+@st.cache_data(show_spinner=False)
+def get_filter_options(db_path: str, version: str) -> dict:
+    return get_database(db_path).filter_options()
+
+# -----------------------------------------------------------------------------
+# Cached resource: agent per (db, model, max_iter, key) so reruns reuse it.
+# The heavy LLM/Crew objects live in a shared runtime inside backend.agent.
+# -----------------------------------------------------------------------------
+@st.cache_resource(show_spinner=False)
+def get_agent(db_path: str, model_name: str, max_iter: int, api_key: str) -> "RAGAgent":
+    # Imported here (not at the top) so crewai isn't on the path to first paint
+    from backend.agent import RAGAgent
+    return RAGAgent(db=get_database(db_path), model_name=model_name, max_iter=max_iter, api_key=api_key)
+
 # -----------------------------------------------------------------------------
 # Session State Initialization
 # -----------------------------------------------------------------------------
@@ -143,9 +319,15 @@ if "pending_prompt" not in st.session_state:
 if "last_run_stats" not in st.session_state:
     st.session_state.last_run_stats = {}
 
+if "run_history" not in st.session_state:
+    st.session_state.run_history = []  # {mode, cache_hit, timing} per answered question
+
 if "last_feedback" not in st.session_state:
     st.session_state.last_feedback = {}  # message_id -> {thumb, note}
 
+if "chat_visible_turns" not in st.session_state:
+    st.session_state.chat_visible_turns = CHAT_PAGE_TURNS  # grows by a page per "Show earlier"
+
 # -----------------------------------------------------------------------------
 # Sidebar - User Configuration
 # -----------------------------------------------------------------------------
@@ -171,10 +353,36 @@ with st.sidebar:
         min_value=3,
         max_value=20,
         value=int(st.session_state.top_k),
-        help="Number of passages retrieved per question."
+        help="Number of passages retrieved per search (fast mode searches once; the agent may search several times)."
     )
     st.session_state.top_k = top_k
 
+    # Structured filters, applied in SQL before similarity ranking (backend.filters)
+    with st.expander("🔎 Filters", expanded=False):
+        # Off by default: loading the choices opens DuckDB, which must not delay first paint
+        use_filters = st.toggle("Filter retrieval", key="use_filters",
+                                help="Limit retrieval to chosen documents, sections, principles or dates.")
+        retrieval_filters = {}
+        if use_filters:
+            try:
+                filter_options = get_filter_options(db_path, corpus_version(db_path)) if os.path.exists(db_path) else {}
+            except Exception:
+                filter_options = {}
+            retrieval_filters = {
+                "doc": st.multiselect("Documents", filter_options.get("doc", [])),
+                "section": st.multiselect("Sections", filter_options.get("section", [])),
+                "principles": st.multiselect("CST principles", filter_options.get("principles", []),
+                                             help="Only passages that mention at least one of these."),
+            }
+            if "date" in filter_options:
+                date_range = st.date_input("Document date", value=filter_options["date"],
+                                           min_value=filter_options["date"][0], max_value=filter_options["date"][1])
+                # Untouched full range = no filter (a date filter also drops undated passages)
+                if isinstance(date_range, (list, tuple)) and len(date_range) == 2 and tuple(date_range) != tuple(filter_options["date"]):
+                    retrieval_filters["date_from"], retrieval_filters["date_to"] = date_range
+            if not filter_options:
+                st.caption("This vector store has no filterable metadata (build it with `python -m backend.ingest`).")
+
     st.subheader("Generation")
     model_choice = st.selectbox(
         "LLM Model",
@@ -182,12 +390,24 @@ with st.sidebar:
         index=0
     )
 
+    answer_mode = st.radio(
+        "Retrieval Strategy",
+        ["fast", "agentic"],
+        index=["fast", "agentic"].index(getattr(config, "DEFAULT_ANSWER_MODE", "fast")),
+        format_func=lambda m: {
+            "fast": "Fast: retrieve once, then answer",
+            "agentic": "Agentic: multi-step tool use",
+        }[m],
+        help="Fast skips the agent's extra LLM round trips. Agentic lets the agent run several searches for complex questions."
+    )
+
     max_iter = st.slider(
         "Max Tool Calls",
         min_value=1,
         max_value=5,
         value=int(getattr(config, "DEFAULT_MAX_ITER", 2)),
-        help="Max number of retrieval/tool steps the agent may perform."
+        help="Max number of retrieval/tool steps the agent may perform (agentic mode only).",
+        disabled=answer_mode == "fast"
     )
 
     response_mode = st.selectbox(
@@ -218,6 +438,12 @@ with st.sidebar:
         help="If enabled, the assistant should avoid unsupported claims and lean on retrieved sources."
     )
 
+    use_answer_cache = st.checkbox(
+        "Reuse answers to similar questions",
+        value=getattr(config, "ANSWER_CACHE_ENABLED", True),
+        help="Instantly return a recent answer when a paraphrase of the question was already answered."
+    )
+
     st.divider()
 
     col_a, col_b = st.columns(2)
@@ -225,6 +451,7 @@ with st.sidebar:
         if st.button("🗑️ Clear chat"):
             st.session_state.messages = []
             st.session_state.last_run_stats = {}
+            st.session_state.chat_visible_turns = CHAT_PAGE_TURNS
             st.session_state.pending_prompt = ""
             st.rerun()
 
@@ -257,6 +484,7 @@ st.caption(
     "Ask business questions and get a Catholic Social Teaching (CST) grounded, step-by-step ethical analysis—"
     "with retrieved sources and similarity scores."
 )
+startup.mark("first_paint")
 
 # -----------------------------------------------------------------------------
 # API Key Check
@@ -265,7 +493,8 @@ if not api_key:
     st.warning("⚠️ Enter your OpenAI API key in the sidebar to continue.")
     st.stop()
 
-os.environ["OPENAI_API_KEY"] = api_key
+# The key is passed to RAGAgent explicitly. It is NOT put in os.environ: that is
+# process-wide, so concurrent sessions would overwrite each other's key.
 
 # -----------------------------------------------------------------------------
 # Database Connection
@@ -279,6 +508,7 @@ if not database.test_connection():
         st.stop()
 else:
     st.success(f"✅ Database connected: `{st.session_state.db_path}`")
+    startup.mark("db_ready")
 
 # -----------------------------------------------------------------------------
 # Top-level layout columns
@@ -296,6 +526,10 @@ with right:
         st.metric("Retrieval time (s)", f"{stats.get('t_retrieval', 0.0):.2f}")
         st.metric("Generation time (s)", f"{stats.get('t_generation', 0.0):.2f}")
         st.metric("Total time (s)", f"{stats.get('t_total', 0.0):.2f}")
+        st.metric("Agent setup (s)", f"{stats.get('t_setup', 0.0):.3f}",
+                  help="Time to get a ready Crew: near zero when a pooled one is reused.")
+        st.metric("Time to first token (s)", f"{stats.get('t_first_token', 0.0):.2f}",
+                  help="How long until the first words of the answer appeared.")
 
         sim = stats.get("similarity", {"avg": 0.0, "min": 0.0, "max": 0.0})
         st.metric("Avg similarity", f"{sim.get('avg', 0.0):.3f}")
@@ -304,11 +538,59 @@ with right:
 
         st.caption(
             f"Model: `{stats.get('model', '')}` • top_k: `{stats.get('top_k', '')}` • "
-            f"max_iter: `{stats.get('max_iter', '')}` • mode: `{stats.get('mode', '')}`"
+            f"max_iter: `{stats.get('max_iter', '')}` • mode: `{stats.get('mode', '')}` • "
+            f"strategy: `{stats.get('answer_mode', '')}`"
+        )
+
+        # Where the time went, last question vs. the whole session
+        timing = stats.get("timing", {})
+        history = st.session_state.run_history
+        st.markdown(f"**Stage breakdown** (session: {len(history)} question(s))")
+        st.dataframe(stage_percentiles(history, timing), use_container_width=True, hide_index=True)
+        st.caption(
+            f"Tool calls: `{timing.get('tool_calls', 0)}` • LLM calls: `{timing.get('llm_calls', 0)}` • "
+            f"Tokens: `{timing.get('prompt_tokens', 0)}` prompt / `{timing.get('completion_tokens', 0)}` completion • "
+            f"Passage context: `{timing.get('context_tokens', 0)}` tokens (`{timing.get('passages_dropped', 0)}` passages dropped)"
         )
+
+        # Fast vs agentic total latency over this session (cache hits excluded)
+        mode_cols = st.columns(2)
+        for col, mode_name in zip(mode_cols, ("fast", "agentic")):
+            samples = pd.Series([
+                run["timing"].get("total_s", 0.0) for run in history
+                if run["mode"] == mode_name and not run["cache_hit"]
+            ], dtype=float)
+            with col:
+                st.metric(
+                    f"{mode_name.capitalize()} p50 / p95 (s)",
+                    f"{samples.quantile(0.5):.2f} / {samples.quantile(0.95):.2f}" if len(samples) else "–",
+                    help=f"Total latency of {len(samples)} {mode_name} answer(s) this session."
+                )
     else:
         st.info("Run a query to see latency + similarity diagnostics.")
 
+    if show_debug:
+        from backend.agent import get_answer_cache, runtime_stats
+
+        # Shared across all sessions: confirms the pooled connection is reused
+        with st.expander("🔌 DB connection pool"):
+            st.json(database.pool_stats())
+        with st.expander("🧠 Embedding cache"):
+            st.json({**database.cache_stats(), "encoder": embedding_backend()})
+        with st.expander("📄 Passage cache"):
+            st.json(database.passage_stats())
+        with st.expander("🤖 Agent runtimes"):
+            st.json(runtime_stats())
+        answer_cache = get_answer_cache()
+        if answer_cache is not None:
+            with st.expander("⚡ Answer cache"):
+                st.json(answer_cache.stats())
+        with st.expander("📝 Feedback store"):
+            st.json(get_feedback_store().stats())
+        # Process cold start: import time per module, time to first paint, warm-up
+        with st.expander("🚀 Startup"):
+            st.json(startup.report())
+
     st.divider()
 
     st.subheader("💡 Example business questions")
@@ -343,103 +625,25 @@ with left:
     # Optional: show a “scope guardrail”
     st.info("Tip: ask concrete questions (numbers, constraints, stakeholders). The assistant will ground answers in retrieved sources.")
 
-    # Display chat history
-    for idx, message in enumerate(st.session_state.messages):
+    # Display chat history: the most recent turns only, older ones a page at a time
+    messages = st.session_state.messages
+    visible = 2 * st.session_state.chat_visible_turns  # a turn = question + answer
+    if len(messages) > visible:
+        hidden_turns = (len(messages) - visible + 1) // 2
+        if st.button(f"⬆️ Show earlier messages ({hidden_turns} older turn(s) hidden)", key="chat_show_earlier"):
+            st.session_state.chat_visible_turns += CHAT_PAGE_TURNS
+            visible += 2 * CHAT_PAGE_TURNS
+    for message in messages[:-visible]:
+        # Paged out: drop the view snapshot (rebuilt if the turn is shown again)
+        message.pop("snapshot", None)
+    for message in messages[-visible:]:
         role = message.get("role", "assistant")
         with st.chat_message(role):
             st.markdown(message.get("content", ""))
 
             # Assistant extras: principles + sources + exports + feedback
             if role == "assistant":
-                sources = message.get("sources", []) or []
-                principles = message.get("principles", []) or []
-
-                if principles:
-                    st.markdown("**Detected CST principles:** " + " • ".join([f"`{p}`" for p in principles]))
-
-                if sources:
-                    df = build_sources_df(sources)
-                    sim = similarity_stats(sources)
-
-                    with st.expander(f"📚 View Sources ({len(sources)} retrieved) • avg sim {sim['avg']:.3f}"):
-                        # Show table first (more professional than only text areas)
-                        st.dataframe(
-                            df[["Rank", "Similarity", "Document", "Title", "Section", "Chunk ID", "Chars", "URL"]],
-                            use_container_width=True,
-                            hide_index=True
-                        )
-
-                        # Then show the passages
-                        st.divider()
-                        for i, source in enumerate(sources, 1):
-                            st.markdown(f"**Source {i}** (Similarity: {float(source.get('similarity', 0.0)):.3f})")
-                            meta_bits = []
-                            for k in ["title", "document", "doc", "section", "heading", "chunk_id", "url"]:
-                                v = source.get(k)
-                                if v:
-                                    meta_bits.append(f"{k}: {v}")
-                            if meta_bits:
-                                st.caption(" • ".join(meta_bits))
-
-                            st.text_area(
-                                f"Passage {i}",
-                                source.get("text", ""),
-                                height=160,
-                                key=f"hist_src_{idx}_{i}",
-                                label_visibility="collapsed"
-                            )
-                            if i < len(sources):
-                                st.divider()
-
-                # Exports (answer only)
-                answer_text = message.get("content", "")
-                if answer_text:
-                    export_col1, export_col2 = st.columns(2)
-                    with export_col1:
-                        st.download_button(
-                            "⬇️ Download answer (.md)",
-                            data=answer_text,
-                            file_name="cst_rag_answer.md",
-                            mime="text/markdown",
-                            key=f"dl_md_{idx}"
-                        )
-                    with export_col2:
-                        st.download_button(
-                            "⬇️ Download answer (.txt)",
-                            data=answer_text,
-                            file_name="cst_rag_answer.txt",
-                            mime="text/plain",
-                            key=f"dl_txt_{idx}"
-                        )
-
-                # Feedback (logged for reflection)
-                fb_key = f"fb_{idx}"
-                thumbs = st.radio(
-                    "Was this helpful?",
-                    ["—", "👍", "👎"],
-                    horizontal=True,
-                    index=0,
-                    key=fb_key
-                )
-                note = st.text_input("Optional feedback (what was missing?)", key=f"{fb_key}_note")
-
-                if thumbs in ["👍", "👎"] and st.button("Save feedback", key=f"{fb_key}_save"):
-                    record = {
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "thumb": thumbs,
-                        "note": note,
-                        "question": message.get("question", ""),
-                        "answer": answer_text,
-                        "mode": message.get("mode", ""),
-                        "tone": message.get("tone", ""),
-                        "strict_citations": message.get("strict_citations", None),
-                        "model": message.get("model", ""),
-                        "top_k": message.get("top_k", None),
-                        "max_iter": message.get("max_iter", None),
-                        "similarity": message.get("similarity", {}),
-                    }
-                    append_feedback_log(record)
-                    st.success("Saved to feedback.jsonl")
+                render_assistant_extras(message)
 
     # Chat input (example buttons feed into pending_prompt)
     default_prompt = st.session_state.pending_prompt or ""
@@ -453,28 +657,36 @@ with left:
     # -----------------------------------------------------------------------------
     if prompt:
         # Add user message to history + display
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        st.session_state.messages.append(new_message("user", prompt))
         with st.chat_message("user"):
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            with st.spinner("Retrieving sources and generating a CST-grounded answer..."):
+            # Answer tokens are streamed as they are generated; tool calls show in a status box
+            with st.container():
                 try:
                     t0 = time.perf_counter()
 
-                    # Initialize agent (your backend should use db + model)
-                    agent = RAGAgent(
-                        db=database,
-                        model_name=model_choice,
-                        max_iter=max_iter
-                    )
+                    # Reuse the cached agent (your backend should use db + model)
+                    agent = get_agent(st.session_state.db_path, model_choice, max_iter, api_key)
 
                     # We pass UI settings to the agent (if agent.ask supports it).
                     # If your current agent.ask only accepts (prompt), it will ignore extras safely
                     # if you implement agent.ask(**kwargs) later.
                     t_retr_start = time.perf_counter()
-                    # Option 1: simplest—just call ask(prompt)
-                    result = agent.ask(prompt)
+                    status = st.status("Retrieving sources and generating a CST-grounded answer...", expanded=False)
+
+                    def show_event(event):
+                        if event["type"] == "tool_call":
+                            status.write(f"🔎 Searching: _{event['query']}_")
+                        elif event["type"] == "retrieval":
+                            status.write(f"📚 {event['passages']} new passages in {event['seconds']:.2f}s")
+
+                    stream = agent.ask_stream(prompt, use_cache=use_answer_cache, mode=answer_mode, top_k=top_k,
+                                              filters=retrieval_filters)
+                    streamed = st.write_stream(stream.text_stream(on_event=show_event))
+                    status.update(label="Answer ready", state="complete")
+                    result = stream.result
 
                     t1 = time.perf_counter()
 
@@ -488,58 +700,40 @@ with left:
                     # ensure it uses st.session_state.top_k when retrieving.
                     # We still store it in metadata for rubric/report.
                     sim = similarity_stats(sources)
-                    principles = detect_principles(response, sources)
-
-                    # Render response
-                    st.markdown(response)
-
-                    # Sources + table immediately
-                    if sources:
-                        df = build_sources_df(sources)
-                        with st.expander(f"📚 View Sources ({len(sources)} retrieved) • avg sim {sim['avg']:.3f}", expanded=False):
-                            st.dataframe(
-                                df[["Rank", "Similarity", "Document", "Title", "Section", "Chunk ID", "Chars", "URL"]],
-                                use_container_width=True,
-                                hide_index=True
-                            )
-                            st.divider()
-                            for i, source in enumerate(sources, 1):
-                                st.markdown(f"**Source {i}** (Similarity: {float(source.get('similarity', 0.0)):.3f})")
-                                st.text_area(
-                                    f"Passage {i}",
-                                    source.get("text", ""),
-                                    height=160,
-                                    key=f"new_src_{i}",
-                                    label_visibility="collapsed"
-                                )
-                                if i < len(sources):
-                                    st.divider()
-
-                    # Principles panel
-                    if principles:
-                        st.markdown("**Detected CST principles:** " + " • ".join([f"`{p}`" for p in principles]))
-
-                    # Exports
-                    exp1, exp2 = st.columns(2)
-                    with exp1:
-                        st.download_button(
-                            "⬇️ Download answer (.md)",
-                            data=response,
-                            file_name="cst_rag_answer.md",
-                            mime="text/markdown",
-                            key="dl_md_new"
-                        )
-                    with exp2:
-                        st.download_button(
-                            "⬇️ Download answer (.txt)",
-                            data=response,
-                            file_name="cst_rag_answer.txt",
-                            mime="text/plain",
-                            key="dl_txt_new"
+                    principles = detect_principles(response, sources, database)
+
+                    # Render response (already streamed, unless the final answer differs,
+                    # e.g. the no-evidence fallback)
+                    if not isinstance(streamed, str) or streamed.strip() != response.strip():
+                        st.markdown(response)
+                    if result.get("cache_hit"):
+                        st.caption(
+                            f"⚡ Reused a cached answer to a similar question "
+                            f"(similarity {result.get('cache_similarity', 0.0):.3f}): "
+                            f"“{result.get('cached_question', '')}”"
                         )
 
+                    # Sources, principles, exports + feedback immediately (same fragments as the history)
+                    message = new_message(
+                        "assistant",
+                        response,
+                        sources=compact_sources(sources),
+                        db_path=st.session_state.db_path,
+                        principles=principles,
+                        question=prompt,
+                        mode=response_mode,
+                        tone=tone,
+                        strict_citations=strict_citations,
+                        model=model_choice,
+                        top_k=top_k,
+                        max_iter=max_iter,
+                        similarity=sim,
+                    )
+                    render_assistant_extras(message)
+
                     # Stats (for diagnostics panel)
                     t_total = time.perf_counter() - t0
+                    startup.mark("first_answer")
                     # We can’t perfectly separate retrieval vs generation without backend timing,
                     # so we provide a useful proxy split.
                     # If your backend returns timing, override these.
@@ -547,32 +741,30 @@ with left:
                         "t_retrieval": float(result.get("timing", {}).get("retrieval_s", 0.0)),
                         "t_generation": float(result.get("timing", {}).get("generation_s", 0.0)),
                         "t_total": float(result.get("timing", {}).get("total_s", t_total)),
+                        "t_setup": float(result.get("timing", {}).get("setup_s", 0.0)),
+                        "t_first_token": float(result.get("timing", {}).get("ttft_s", 0.0)),
                         "similarity": sim,
                         "model": model_choice,
                         "top_k": top_k,
                         "max_iter": max_iter,
                         "mode": response_mode,
+                        "answer_mode": result.get("mode", answer_mode),
+                        "timing": {**result.get("timing", {}), "total_s": float(result.get("timing", {}).get("total_s", t_total))},
                     }
+                    st.session_state.run_history.append({
+                        "mode": result.get("mode", answer_mode),
+                        "cache_hit": bool(result.get("cache_hit")),
+                        "timing": st.session_state.last_run_stats["timing"],
+                    })
+                    del st.session_state.run_history[:-RUN_HISTORY_LIMIT]
                     # If backend didn't provide timing, give a reasonable UI estimate:
                     if st.session_state.last_run_stats["t_retrieval"] == 0.0 and st.session_state.last_run_stats["t_generation"] == 0.0:
                         # crude: treat whole call as generation, keep total for user
                         st.session_state.last_run_stats["t_generation"] = float(t_total)
 
                     # Save assistant message w/ metadata
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": response,
-                        "sources": sources,
-                        "principles": principles,
-                        "question": prompt,
-                        "mode": response_mode,
-                        "tone": tone,
-                        "strict_citations": strict_citations,
-                        "model": model_choice,
-                        "top_k": top_k,
-                        "max_iter": max_iter,
-                        "similarity": sim,
-                    })
+                    st.session_state.messages.append(message)
+                    del st.session_state.messages[:-2 * CHAT_MAX_TURNS]
 
                     if show_debug:
                         with st.expander("🐛 Debug: raw result"):
@@ -581,16 +773,17 @@ with left:
                 except Exception as e:
                     error_msg = f"❌ Error: {str(e)}"
                     st.error(error_msg)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": error_msg,
-                        "sources": [],
-                        "question": prompt,
-                        "mode": response_mode,
-                        "tone": tone,
-                        "strict_citations": strict_citations,
-                        "model": model_choice,
-                        "top_k": top_k,
-                        "max_iter": max_iter,
-                        "similarity": {"avg": 0.0, "min": 0.0, "max": 0.0},
-                    })
+                    st.session_state.messages.append(new_message(
+                        "assistant",
+                        error_msg,
+                        sources=[],
+                        question=prompt,
+                        mode=response_mode,
+                        tone=tone,
+                        strict_citations=strict_citations,
+                        model=model_choice,
+                        top_k=top_k,
+                        max_iter=max_iter,
+                        similarity={"avg": 0.0, "min": 0.0, "max": 0.0},
+                    ))
+                    del st.session_state.messages[:-2 * CHAT_MAX_TURNS]
@@ -3,11 +3,36 @@
 # =============================================================================
 # This file creates an AI agent that can DECIDE when to search the database.
 # Instead of always retrieving passages, the LLM chooses when retrieval helps.
+# For most questions the agent retrieves first anyway, so a "fast" mode skips
+# that deliberation: retrieve once, then ONE generation call.
 # =============================================================================
 
+import asyncio
+import contextvars
+import hashlib
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from crewai import Agent, Task, Crew, LLM
+from crewai.events import (
+    crewai_event_bus, LLMStreamChunkEvent,
+)
 from crewai.tools import tool
+from backend import context_packer, timing
+from backend.rate_limit import get_rate_limiter
 from backend.database import RAGDatabase
+from backend.answer_cache import SemanticAnswerCache
+from backend.filters import describe as describe_filters
+from config import (
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_PATH, ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL_S, ANSWER_CACHE_MAX_ENTRIES, DEFAULT_ANSWER_MODE, DEFAULT_TOP_K,
+    CONTEXT_TOKEN_BUDGET, ASK_MANY_CONCURRENCY, LLM_BASE_URL, AGENT_RUNTIME_CACHE_SIZE,
+)
 # =============================================================================
 # Agent Persona + Task Policy (Rubric: persona + configuration + quality)
 # =============================================================================
@@ -65,71 +90,407 @@ FALLBACK_NO_EVIDENCE = (
     "or course readings) added to the corpus."
 )
 
-class RAGAgent:
-    def __init__(self, db: RAGDatabase, model_name: str, max_iter: int):
+# =============================================================================
+# Shared semantic answer cache (one per process, like the cached RAGDatabase)
+# =============================================================================
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> SemanticAnswerCache | None:
+    """Return the process-wide answer cache, or None if disabled in config.py."""
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(
+                ANSWER_CACHE_PATH, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_S, ANSWER_CACHE_MAX_ENTRIES
+            )
+        return _answer_cache
+
+# =============================================================================
+# Per-request state
+# =============================================================================
+# The tool, LLM and Crew below are shared between requests, so anything that
+# belongs to ONE question (which database, which sources were retrieved)
+# lives in a RequestState bound to the current context for the duration of
+# the kickoff. Concurrent Streamlit sessions each see only their own state.
+# =============================================================================
+class RequestState:
+    def __init__(self, db: RAGDatabase, emit=None, tokenizer: context_packer.Tokenizer | None = None,
+                 context_budget: int | None = CONTEXT_TOKEN_BUDGET, filters: dict | None = None,
+                 top_k: int = DEFAULT_TOP_K):
         self.db = db
-        self.model_name = model_name
-        self.max_iter = max_iter
-        self.last_sources = []  # We'll store retrieved passages here for the UI
-
-    def create_tool(self):
-        # ---------------------------------------------------------------------
-        # The @tool decorator transforms this function into something the
-        # LLM can call. The docstring is CRUCIAL—it's what the LLM reads
-        # to decide whether and how to use this tool.
-        # ---------------------------------------------------------------------
-        @tool("Query RAG Database")
-        def query_rag_db(query: str) -> str:
-            """Search the vector database containing customized texts.
-            
-            Args:
-                query: Search query about topic.
-                
-            Returns:
-                Relevant passages from the database
-            """
-            try:
-                results = self.db.query(query)
-                
-                if results:
-                    # Store sources for UI display
-                    self.last_sources.extend(results)
-                    
-                    # Format passages for the LLM to read
-                    passages = []
-                    for i, row in enumerate(results, start=1):
-                        text = row.get("text", "")
-                        source = row.get("source", row.get("metadata", ""))
-                        header = f"Passage {i} (source={source}):" if source else f"Passage {i}:"
-                        passages.append(f"{header}\n{text}".strip())
-                    return "\n\n---\n\n".join(passages)
-                
-                else:
-                    return "No relevant passages found."
-                    
-            except Exception as e:
-                return f"Error querying database: {str(e)}"
-        
-        return query_rag_db
+        self.filters = filters  # structured retrieval filters for every search (backend.filters)
+        self.top_k = top_k  # passages per search
+        self.sources = []  # We'll store retrieved passages here for the UI
+        self.tool_calls = []  # {'query', 'passages', 'seconds'} per tool call
+        self.emit = emit  # optional callback(event_dict) for streaming requests
+        # Passage tokens allowed in the prompt for this whole question (None = unlimited)
+        self.tokenizer = tokenizer
+        self.context_budget = context_budget if tokenizer is not None else None
+        self.context_tokens = 0
+        self.passages_dropped = 0
 
-    # TO DO: Update the ask() function
-    def ask(self, question: str) -> dict:
-        """
-        Ask a question to the agent.
+    def notify(self, event: dict) -> None:
+        if self.emit is not None:
+            self.emit(event)
+
+    def pack(self, query: str, rows: list[dict]) -> tuple[list[dict], list[dict]]:
+        """Fit rows into what is left of the budget; returns (kept rows, prompt rows)."""
+        if self.tokenizer is None:
+            return rows, rows
+        remaining = None if self.context_budget is None else self.context_budget - self.context_tokens
+        kept, prompt_rows, used = context_packer.pack(self.tokenizer, query, rows, remaining)
+        self.context_tokens += used
+        self.passages_dropped += len(rows) - len(kept)
+        return kept, prompt_rows
+
+_current_request: ContextVar[RequestState | None] = ContextVar("rag_request", default=None)
+
+def format_passages(rows: list[dict], first_number: int = 1) -> str:
+    """Format retrieved rows as numbered passages for the LLM to cite."""
+    passages = []
+    for i, row in enumerate(rows, start=first_number):
+        text = row.get("text", "")
+        source = row.get("source", row.get("metadata", ""))
+        header = f"Passage {i} (source={source}):" if source else f"Passage {i}:"
+        passages.append(f"{header}\n{text}".strip())
+    return "\n\n---\n\n".join(passages)
+
+def create_tool():
+    # ---------------------------------------------------------------------
+    # The @tool decorator transforms this function into something the
+    # LLM can call. The docstring is CRUCIAL—it's what the LLM reads
+    # to decide whether and how to use this tool.
+    # ---------------------------------------------------------------------
+    @tool("Query RAG Database")
+    def query_rag_db(query: str) -> str:
+        """Search the vector database containing customized texts.
         
+        Args:
+            query: Search query about topic.
+            
         Returns:
-            Dictionary with 'answer' and 'sources'.
+            Relevant passages from the database
         """
-        # Reset sources for this query
-        self.last_sources = []
-        
-        # TO DO: Create the LLM instance
-        llm = LLM(model=self.model_name)
+        state = _current_request.get()
+        if state is None:
+            return "Error querying database: no active request."
+        try:
+            state.notify({"type": "tool_call", "tool": "Query RAG Database", "query": query})
+            t0 = time.perf_counter()
+
+            # Skip chunks an earlier tool call in this ask() already returned,
+            # and pick a relevant-but-non-redundant set with MMR
+            seen_ids = {row.get("id") for row in state.sources}
+            results = state.db.query_diverse(query, state.top_k, exclude_ids=seen_ids, filters=state.filters)
+            # Keep the prompt within the token budget (drops the weak tail, windows long chunks)
+            found = len(results)
+            results, prompt_rows = state.pack(query, results)
+            call = {"query": query, "passages": len(results), "seconds": time.perf_counter() - t0}
+            state.tool_calls.append(call)
+            state.notify({"type": "retrieval", **call})
+            
+            if results:
+                # Number passages across the whole ask() so [Passage N]
+                # citations stay unambiguous over several tool calls
+                first_number = len(state.sources) + 1
+
+                # Store sources for UI display
+                state.sources.extend(results)
+                
+                # Format passages for the LLM to read
+                return format_passages(prompt_rows, first_number)
+            
+            elif found and state.sources:
+                return "Context budget reached; answer with the passages already retrieved."
+            elif seen_ids:
+                return "No new passages found beyond those already retrieved."
+            else:
+                return "No relevant passages found."
+                
+        except Exception as e:
+            return f"Error querying database: {str(e)}"
+    
+    return query_rag_db
+
+# =============================================================================
+# LLM call tracking + token streaming
+# =============================================================================
+# Each pooled Crew (and each fast-mode call) has its own LLM, so a request's
+# tracker is registered under that LLM object for the duration of the request
+# (weakly, and removed when the request ends, so a route can never outlive its
+# LLM or be picked up by a new object that reuses a freed id()).
+#   - LLM calls are rate-limited, counted, timed and token-counted by ONE
+#     wrapper around llm.call (_tracked), in the calling thread. CrewAI's call
+#     start/end events run later on the event bus's thread pool, after the
+#     request may be done.
+#   - Streamed chunks come from CrewAI's event bus (delivered synchronously,
+#     in order) with the emitting LLM object as `source`.
+# The agent's intermediate ReAct text ("Thought: ... Action: ...") is not part
+# of the answer, so only text after "Final Answer:" is forwarded.
+# =============================================================================
+_stream_routes = weakref.WeakKeyDictionary()  # LLM -> LLMCallTracker
+_stream_routes_lock = threading.Lock()
+_TRACKED_ATTR = "_rag_tracked"  # set on an LLM once _tracked() has wrapped its call()
+
+@crewai_event_bus.on(LLMStreamChunkEvent)
+def _on_llm_stream_chunk(source, event):
+    try:
+        route = _stream_routes.get(source)
+    except TypeError:  # events from sources that cannot be weakly referenced
+        return
+    if route is not None:
+        route.chunk(event.chunk or "")
+
+@contextmanager
+def _routed(llm: LLM, route):
+    """Send `llm`'s calls and stream chunks to the tracker `route` for the duration of the block."""
+    with _stream_routes_lock:
+        _stream_routes[llm] = route
+    try:
+        yield
+    finally:
+        with _stream_routes_lock:
+            _stream_routes.pop(llm, None)
+
+class FinalAnswerFilter:
+    """Pass through only the text after 'Final Answer:' in each LLM call."""
+    MARKER = "Final Answer:"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self._buffer = ""
+        self._streaming = False
+
+    def feed(self, chunk: str) -> str:
+        if self._streaming:
+            return chunk
+        self._buffer += chunk
+        idx = self._buffer.find(self.MARKER)
+        if idx < 0:
+            return ""
+        self._streaming = True
+        return self._buffer[idx + len(self.MARKER):].lstrip()
+
+class LLMCallTracker:
+    """Route target for one request: counts/times LLM calls and forwards tokens to emit."""
+
+    def __init__(self, emit=None, answer_filter: FinalAnswerFilter | None = None,
+                 tokenizer: "context_packer.Tokenizer | None" = None):
+        self.emit = emit
+        self.answer_filter = answer_filter
+        self.tokenizer = tokenizer  # counts tokens for calls that report no usage
+        self.calls = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def call_started(self) -> None:
+        self.calls += 1
+        # Before the request is sent, so no chunk of this call has been seen yet
+        if self.answer_filter is not None:
+            self.answer_filter.reset()
+
+    def call_finished(self, seconds: float, prompt_tokens: int, completion_tokens: int) -> None:
+        self.seconds += seconds
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+    def chunk(self, chunk: str) -> None:
+        if self.emit is not None:
+            text = self.answer_filter.feed(chunk) if self.answer_filter is not None else chunk
+            if text:
+                self.emit({"type": "token", "text": text})
+
+    def count_tokens(self, messages, response) -> tuple[int, int]:
+        """(prompt, completion) token counts for a call, from its messages and response text."""
+        if self.tokenizer is None:
+            return 0, 0
+        if isinstance(messages, str):
+            messages = [{"content": messages}]
+        prompt = sum(
+            self.tokenizer.count(message.get("content"))
+            for message in messages or []
+            if isinstance(message, dict) and isinstance(message.get("content"), str)
+        )
+        return prompt, self.tokenizer.count(response) if isinstance(response, str) else 0
+
+def _tracked(llm: LLM) -> LLM:
+    """
+    Rate-limit, count, time and token-count every call() on this LLM.
+
+    Each call first waits for the shared rate limiter (outside the timed
+    section, so the wait is not counted as LLM time), then is reported to the
+    tracker routed to this LLM, if any. Token usage comes from the LLM when it
+    reports it. Streamed calls through CrewAI's native OpenAI client report
+    none, so those are counted with the tracker's tokenizer instead.
+
+    Wrapping is idempotent: an LLM that already has the wrapper is returned
+    unchanged, so the limiter is never applied twice to one call.
+    """
+    if getattr(llm, _TRACKED_ATTR, False):
+        return llm
+    call = llm.call
+    limiter = get_rate_limiter()
+
+    def tracked_call(*args, **kwargs):
+        if limiter is not None:
+            with timing.stage("rate_limit"):
+                limiter.acquire()
+        tracker = _stream_routes.get(llm)
+        if tracker is None:
+            return call(*args, **kwargs)
+        tracker.call_started()
+        before = _token_usage(llm)
+        t0 = time.perf_counter()
+        response = None
+        try:
+            response = call(*args, **kwargs)
+            return response
+        finally:
+            seconds = time.perf_counter() - t0
+            after = _token_usage(llm)
+            prompt_tokens, completion_tokens = after[0] - before[0], after[1] - before[1]
+            if not (prompt_tokens or completion_tokens):
+                messages = args[0] if args else kwargs.get("messages")
+                prompt_tokens, completion_tokens = tracker.count_tokens(messages, response)
+            tracker.call_finished(seconds, prompt_tokens, completion_tokens)
+
+    # Instance attribute shadows the method (object.__setattr__ also works on pydantic models)
+    object.__setattr__(llm, "call", tracked_call)
+    object.__setattr__(llm, _TRACKED_ATTR, True)
+    return llm
+
+def _token_usage(llm: LLM) -> tuple[int, int]:
+    """Cumulative (prompt, completion) tokens an LLM has used; (0, 0) if it doesn't report usage."""
+    try:
+        usage = llm.get_token_usage_summary()
+    except Exception:
+        return 0, 0
+    return int(getattr(usage, "prompt_tokens", 0) or 0), int(getattr(usage, "completion_tokens", 0) or 0)
+
+class AnswerStream:
+    """
+    Iterator over streaming events from RAGAgent.ask_stream().
+
+    Events are dicts with a 'type':
+        token      -> {'text'}                  answer text as it is generated
+        tool_call  -> {'tool', 'query'}         the agent decided to search
+        retrieval  -> {'query', 'passages', 'seconds'}
+    After iteration finishes, `result` holds the same dict ask() returns,
+    with timing['ttft_s'] (time to first answer token).
+    """
+    _DONE = object()
+
+    def __init__(self, produce):
+        self._produce = produce  # callable(emit) -> result dict; runs in a worker thread
+        self._events = queue.Queue()
+        self.result = None
+        self.error = None
+
+    def __iter__(self):
+        t0 = time.perf_counter()
+        ttft = None
+
+        def work():
+            try:
+                self.result = self._produce(self._events.put)
+            except Exception as e:  # surfaced to the consumer below
+                self.error = e
+            finally:
+                self._events.put(self._DONE)
+
+        # copy_context() so the worker sees the caller's context variables
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(work,), daemon=True)
+        worker.start()
+        while True:
+            event = self._events.get()
+            if event is self._DONE:
+                break
+            if event["type"] == "token" and ttft is None:
+                ttft = time.perf_counter() - t0
+            yield event
+        worker.join()
+        if self.error is not None:
+            raise self.error
+        self.result.setdefault("timing", {})["ttft_s"] = ttft if ttft is not None else time.perf_counter() - t0
+
+    def text_stream(self, on_event=None):
+        """Yield only answer text (for st.write_stream); other events go to on_event."""
+        for event in self:
+            if event["type"] == "token":
+                yield event["text"]
+            elif on_event is not None:
+                on_event(event)
+
+# =============================================================================
+# Reusable agent runtime
+# =============================================================================
+# Building an LLM client, Agent, Task and Crew for every question is pure
+# overhead. One AgentRuntime per (model, max_iter, mode) keeps:
+#   - ONE tool object (per-request state comes from _current_request)
+#   - a pool of idle (LLM, Crew) workers; a Crew runs one question at a time,
+#     so concurrent requests each check out their own and return it afterwards
+#   - a pool of idle LLMs for fast mode
+# The question is passed via kickoff(inputs=...) into the {question} slot.
+# =============================================================================
+TASK_DESCRIPTION = (
+    f"{TASK_POLICY.strip()}\n\n"
+    "USER QUESTION:\n{question}\n\n"
+    "INSTRUCTIONS:\n"
+    "- Retrieve relevant passages before answering.\n"
+    "- Follow the RESPONSE STRUCTURE.\n"
+    "- Cite passages explicitly as [Passage N].\n"
+    "- If evidence is insufficient, state this clearly.\n"
+)
 
+# Fast mode: same policy, but the passages are already in the prompt
+FAST_TASK_DESCRIPTION = (
+    f"{TASK_POLICY.strip()}\n\n"
+    "USER QUESTION:\n{question}\n\n"
+    "RETRIEVED PASSAGES:\n{passages}\n\n"
+    "INSTRUCTIONS:\n"
+    "- Answer using the retrieved passages above.\n"
+    "- Follow the RESPONSE STRUCTURE.\n"
+    "- Cite passages explicitly as [Passage N].\n"
+    "- If evidence is insufficient, state this clearly.\n"
+)
+
+class AgentRuntime:
+    def __init__(self, model_name: str, max_iter: int, mode: str = "agentic", api_key: str | None = None,
+                 base_url: str | None = None):
+        self.model_name = model_name
+        self.max_iter = max_iter
+        self.mode = mode
+        self.api_key = api_key
+        self.base_url = base_url
         # TO DO: Call the database tool (e.g. the function above)
-        query_tool = self.create_tool()
-        
+        self.query_tool = create_tool()
+        self.tokenizer = context_packer.get_tokenizer(model_name)
+        # Idle (llm, crew) workers and idle LLMs (fast mode), keyed by stream=True/False.
+        # Every worker owns its LLM so LLM time and tokens can be attributed per request.
+        self._idle_crews = {False: queue.SimpleQueue(), True: queue.SimpleQueue()}
+        self._idle_llms = {False: queue.SimpleQueue(), True: queue.SimpleQueue()}
+        self._stats_lock = threading.Lock()
+        self._stats = {"crews_built": 0, "crews_reused": 0, "requests": 0, "streaming_requests": 0}
+        self._closed = False  # set when evicted from _runtimes; in-flight workers are then dropped
 
+    def _bump(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _new_llm(self, stream: bool) -> LLM:
+        # TO DO: Create the LLM instance
+        kwargs = {"api_key": self.api_key} if self.api_key else {}
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        return _tracked(LLM(model=self.model_name, stream=stream, **kwargs))
+
+    def _build_crew(self, llm: LLM) -> Crew:
         agent = Agent(
             role="CST & Business Ethics Research Assistant",
             goal=(
@@ -137,47 +498,356 @@ class RAGAgent:
                 "business ethics, and corporate governance using retrieved passages as primary support."
             ),
             backstory=AGENT_PERSONA.strip(),
-            tools=[query_tool],
+            tools=[self.query_tool],
             llm=llm,
             verbose=True,
             allow_delegation=False,
-            max_iter=self.max_iter
+            max_iter=self.max_iter,
+            # Pooled crews outlive a question: a cached tool result would skip the
+            # query, leaving this request's state.sources empty and its filters unused
+            cache=False
         )
 
-        
         # TO DO: Create the task
         task = Task(
-            description=(
-                f"{TASK_POLICY.strip()}\n\n"
-                f"USER QUESTION:\n{question}\n\n"
-                "INSTRUCTIONS:\n"
-                "- Retrieve relevant passages before answering.\n"
-                "- Follow the RESPONSE STRUCTURE.\n"
-                "- Cite passages explicitly as [Passage N].\n"
-                "- If evidence is insufficient, state this clearly.\n"
-            ),
+            description=TASK_DESCRIPTION,
             agent=agent,
             expected_output=(
                 "A structured academic response with explicit passage citations "
                 "and a brief confidence/limits statement."
             )
         )
-        # TO DO: Create the Crew and run it
-        crew = Crew(agents = [agent],
+        # TO DO: Create the Crew
+        # No max_rpm here: the shared limiter in _new_llm() covers every Crew at once
+        return Crew(agents = [agent],
                     tasks = [task],
                     verbose = True,
-                    max_rpm= 20)
+                    cache = False)
+
+    def _checkout_crew(self, stream: bool) -> tuple[LLM, Crew]:
+        try:
+            worker = self._idle_crews[stream].get_nowait()
+            self._bump("crews_reused")
+        except queue.Empty:
+            llm = self._new_llm(stream)
+            worker = (llm, self._build_crew(llm))
+            self._bump("crews_built")
+        return worker
+
+    def _checkout_llm(self, stream: bool) -> LLM:
+        try:
+            return self._idle_llms[stream].get_nowait()
+        except queue.Empty:
+            return self._new_llm(stream)
+
+    @staticmethod
+    def _tracked_call(llm: LLM, tracker: "LLMCallTracker", call):
+        """Run call() with llm's calls and stream chunks routed to tracker."""
+        with _routed(llm, tracker):
+            return call()
+
+    def run(self, question: str, db: RAGDatabase, top_k: int = DEFAULT_TOP_K, emit=None,
+            filters: dict | None = None) -> dict:
+        """
+        Answer one question with a pooled Crew.
+
+        Args:
+            top_k: Passages returned by each tool call.
+            emit: Optional callback; when given, answer tokens and tool/retrieval
+                events are pushed to it as they happen (see RAGAgent.ask_stream).
+            filters: Structured retrieval filters applied to every tool call.
+
+        Returns:
+            Dictionary with 'answer' (str), 'sources' and 'timing' (see
+            _timing(); 'setup_s' is the time spent getting a ready-to-run Crew).
+        """
+        stream = emit is not None
+        self._bump("streaming_requests" if stream else "requests")
+        t0 = time.perf_counter()
+        llm, crew = self._checkout_crew(stream)
+        setup_s = time.perf_counter() - t0
+
+        # The ReAct "Thought/Action" text is not part of the answer
+        tracker = LLMCallTracker(emit, FinalAnswerFilter() if stream else None, self.tokenizer)
+        state = RequestState(db, emit, self.tokenizer, filters=filters, top_k=top_k)
+        token = _current_request.set(state)
+        t1 = time.perf_counter()
+        try:
+            result = self._tracked_call(llm, tracker, lambda: crew.kickoff(inputs={"question": question}))
+        finally:
+            _current_request.reset(token)
+        run_s = time.perf_counter() - t1
+        # Only a Crew that finished cleanly goes back into the pool
+        if not self._closed:
+            self._idle_crews[stream].put((llm, crew))
+        return {"answer": str(result), "sources": state.sources,
+                "timing": self._timing(state, tracker, setup_s, run_s)}
+
+    def run_fast(self, question: str, db: RAGDatabase, top_k: int = DEFAULT_TOP_K, emit=None,
+                 filters: dict | None = None) -> dict:
+        """
+        Retrieve once for the question, then answer with ONE LLM call.
+
+        Skips the agent's "should I search?" round trip(s). Retrieval uses the
+        same diverse (MMR) selection as the tool.
+
+        Returns:
+            Same shape as run().
+        """
+        stream = emit is not None
+        self._bump("streaming_requests" if stream else "requests")
+        state = RequestState(db, emit, self.tokenizer, filters=filters, top_k=top_k)
+        t0 = time.perf_counter()
+        state.notify({"type": "tool_call", "tool": "Query RAG Database", "query": question})
+        state.sources, prompt_rows = state.pack(question, db.query_diverse(question, top_k, filters=filters))
+        retrieval_s = time.perf_counter() - t0
+        state.tool_calls.append({"query": question, "passages": len(state.sources), "seconds": retrieval_s})
+        state.notify({"type": "retrieval", "query": question, "passages": len(state.sources), "seconds": retrieval_s})
+        tracker = LLMCallTracker(emit, tokenizer=self.tokenizer)
+        if not state.sources:
+            # Nothing to ground an answer in, so don't spend an LLM call
+            return {"answer": "", "sources": [], "timing": self._timing(state, tracker, 0.0, retrieval_s)}
+
+        messages = [
+            {"role": "system", "content": AGENT_PERSONA.strip()},
+            {"role": "user", "content": FAST_TASK_DESCRIPTION.format(
+                question=question, passages=format_passages(prompt_rows))},
+        ]
+        llm = self._checkout_llm(stream)
+        t1 = time.perf_counter()
+        answer = self._tracked_call(llm, tracker, lambda: llm.call(messages))
+        run_s = retrieval_s + time.perf_counter() - t1
+        if not self._closed:
+            self._idle_llms[stream].put(llm)
+        return {"answer": str(answer), "sources": state.sources,
+                "timing": self._timing(state, tracker, 0.0, run_s)}
+
+    @staticmethod
+    def _timing(state: "RequestState", tracker: "LLMCallTracker", setup_s: float, run_s: float) -> dict:
+        """
+        Per-stage breakdown of one request.
+
+        'retrieval_s' is the time spent in tool calls; 'generation_s' is the
+        time spent inside llm.call (see _tracked), or the rest of the run if
+        no LLM call was seen.
+        """
+        retrieval_s = sum(call["seconds"] for call in state.tool_calls)
+        return {
+            "setup_s": setup_s,
+            "retrieval_s": retrieval_s,
+            "generation_s": tracker.seconds if tracker.calls else max(run_s - retrieval_s, 0.0),
+            "llm_s": tracker.seconds,
+            "llm_calls": tracker.calls,
+            "tool_calls": len(state.tool_calls),
+            "tool_call_s": [call["seconds"] for call in state.tool_calls],
+            "prompt_tokens": tracker.prompt_tokens,
+            "completion_tokens": tracker.completion_tokens,
+            "context_tokens": state.context_tokens,
+            "passages_dropped": state.passages_dropped,
+        }
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                **self._stats,
+                "idle_crews": self._idle_crews[False].qsize(),
+                "idle_streaming_crews": self._idle_crews[True].qsize(),
+            }
+
+    def close(self) -> None:
+        """Drop every idle Crew / LLM; requests still running finish but are not pooled again."""
+        self._closed = True
+        for idle in (*self._idle_crews.values(), *self._idle_llms.values()):
+            while True:
+                try:
+                    idle.get_nowait()
+                except queue.Empty:
+                    break
+
+# Most recently used last; at most AGENT_RUNTIME_CACHE_SIZE entries
+_runtimes = OrderedDict()
+_runtimes_lock = threading.Lock()
+
+def get_runtime(model_name: str, max_iter: int, mode: str = "agentic", api_key: str | None = None,
+                base_url: str | None = LLM_BASE_URL) -> AgentRuntime:
+    """Return the shared runtime for (model, max_iter, mode, endpoint), building it once (LRU-bounded)."""
+    # The key is hashed so the raw API key is never used as a dict key/log value
+    key_id = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else None
+    cache_key = (model_name, max_iter, mode, key_id, base_url)
+    evicted = []
+    with _runtimes_lock:
+        runtime = _runtimes.get(cache_key)
+        if runtime is None:
+            runtime = AgentRuntime(model_name, max_iter, mode, api_key, base_url)
+            _runtimes[cache_key] = runtime
+            # Every distinct API key / endpoint gets a runtime, so evict the least recently used
+            while len(_runtimes) > max(AGENT_RUNTIME_CACHE_SIZE, 1):
+                evicted.append(_runtimes.popitem(last=False)[1])
+        else:
+            _runtimes.move_to_end(cache_key)
+    for old_runtime in evicted:
+        old_runtime.close()
+    return runtime
+
+def runtime_stats() -> dict:
+    """Crew build/reuse counters for every live runtime, plus the shared rate limiter."""
+    with _runtimes_lock:
+        runtimes = list(_runtimes.values())
+    stats = {f"{r.model_name}/max_iter={r.max_iter}/{r.mode}": r.stats() for r in runtimes}
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        stats["rate_limiter"] = limiter.stats()
+    return stats
+
+class RAGAgent:
+    MODES = ("fast", "agentic")
+
+    def __init__(self, db: RAGDatabase, model_name: str, max_iter: int,
+                 answer_cache: SemanticAnswerCache | None = None, api_key: str | None = None,
+                 mode: str = DEFAULT_ANSWER_MODE, base_url: str | None = LLM_BASE_URL):
+        self.db = db
+        self.model_name = model_name
+        self.max_iter = max_iter
+        self.api_key = api_key  # None = use OPENAI_API_KEY from the environment
+        self.answer_cache = answer_cache if answer_cache is not None else get_answer_cache()
+        self.mode = mode  # default for ask(); "fast" or "agentic"
+        self.base_url = base_url  # None = OpenAI; a URL = any OpenAI-compatible server
+
+    def ask_stream(self, question: str, use_cache: bool = True, mode: str | None = None,
+                   top_k: int = DEFAULT_TOP_K, filters: dict | None = None) -> AnswerStream:
+        """
+        Streaming variant of ask().
+
+        Returns:
+            An AnswerStream: iterate it (or its text_stream()) to receive answer
+            tokens and tool/retrieval events as they happen; afterwards
+            `.result` holds the full ask() result for chat history.
+        """
+        def produce(emit):
+            result = self.ask(question, use_cache=use_cache, emit=emit, mode=mode, top_k=top_k, filters=filters)
+            if result.get("cache_hit"):
+                # Nothing was generated, so deliver the cached answer in one piece
+                emit({"type": "token", "text": result["answer"]})
+            return result
+        return AnswerStream(produce)
+
+    async def aask(self, question: str, **kwargs) -> dict:
+        """ask() without blocking the event loop (runs in a worker thread)."""
+        return await asyncio.to_thread(self.ask, question, **kwargs)
+
+    async def ask_many(self, questions: list[str], concurrency: int = ASK_MANY_CONCURRENCY, **kwargs) -> list[dict]:
+        """
+        Answer many questions concurrently.
+
+        At most `concurrency` questions are in flight at once; LLM calls are
+        additionally throttled by the shared rate limiter.
+
+        Args:
+            questions: The questions, in the order results should come back.
+            concurrency: Max questions answered at the same time.
+            **kwargs: Passed to ask() (use_cache, mode, top_k, filters).
+
+        Returns:
+            One result per question, in input order, each with 'question',
+            'answer', 'sources' and 'error' plus the other ask() keys. 'error'
+            is None on success; a question that failed gets answer=None,
+            sources=[] and the error text instead of stopping the batch.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def answer(question: str) -> dict:
+            async with semaphore:
+                try:
+                    result = await self.aask(question, **kwargs)
+                except Exception as e:
+                    return {"question": question, "answer": None, "sources": [], "error": f"{type(e).__name__}: {e}",
+                            "cache_hit": False, "mode": kwargs.get("mode") or self.mode, "timing": {}}
+                return {"question": question, **result, "error": None}
+
+        return await asyncio.gather(*(answer(q) for q in questions))
+
+    # TO DO: Update the ask() function
+    def ask(self, question: str, use_cache: bool = True, emit=None, mode: str | None = None,
+            top_k: int = DEFAULT_TOP_K, filters: dict | None = None) -> dict:
+        """
+        Ask a question to the agent.
+
+        Args:
+            question: The user's question.
+            use_cache: Look up / store the answer in the semantic answer cache.
+            emit: Optional callback for streaming events (see ask_stream()).
+            mode: "fast" (retrieve once, one LLM call) or "agentic" (the agent
+                decides when and what to retrieve). Defaults to self.mode.
+            top_k: Passages retrieved per search (the one search in fast mode,
+                each tool call in agentic mode).
+            filters: Structured retrieval filters (doc, section, principles,
+                date_from, date_to; see backend.filters) for every search.
         
-        result = crew.kickoff()
-        if not self.last_sources:
+        Returns:
+            Dictionary with 'answer', 'sources', 'cache_hit', 'mode' and 'timing':
+            total_s, setup_s, retrieval_s, generation_s, llm_s, llm_calls,
+            tool_calls, tool_call_s (per call), prompt_tokens, completion_tokens,
+            and embedding_s / db_s (+ *_calls) for the stages that ran.
+        """
+        mode = mode or self.mode
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown answer mode: {mode}")
+        with timing.collect() as stages:
+            result = self._ask(question, use_cache, emit, mode, top_k, filters)
+        # Embedding / DuckDB time recorded anywhere below, incl. inside tool calls
+        result["timing"].update(stages.as_dict())
+        return result
+
+    def _ask(self, question: str, use_cache: bool, emit, mode: str, top_k: int, filters: dict | None) -> dict:
+        t0 = time.perf_counter()
+
+        # Check the semantic cache first: a close paraphrase under the same
+        # model / max_iter / corpus version / mode / top_k / filters is answered without any LLM call
+        cache = self.answer_cache if use_cache else None
+        if cache is not None:
+            # Pick up a re-ingested .duckdb file before its corpus_version goes into the key
+            self.db.refresh_if_changed()
+            cache_key = cache.make_key(self.model_name, self.max_iter, self.db.corpus_version, mode,
+                                       describe_filters(filters), top_k)
+            question_embedding = self.db.encode([question])[0]
+            hit = cache.lookup(question_embedding, cache_key)
+            if hit is not None:
+                return {
+                    "answer": hit["answer"],
+                    "sources": hit["sources"],
+                    "cache_hit": True,
+                    "cached_question": hit["question"],
+                    "cache_similarity": hit["similarity"],
+                    "mode": mode,
+                    "timing": {"total_s": time.perf_counter() - t0},
+                }
+
+        # TO DO: Run the question on the shared runtime for this configuration
+        runtime = get_runtime(self.model_name, self.max_iter, mode, self.api_key, self.base_url)
+        if mode == "fast":
+            result = runtime.run_fast(question, self.db, top_k, emit, filters)
+        else:
+            result = runtime.run(question, self.db, top_k, emit, filters)
+        result["timing"]["total_s"] = time.perf_counter() - t0
+
+        if not result["sources"]:
             return {
                 "answer": FALLBACK_NO_EVIDENCE,
-                "sources": []
+                "sources": [],
+                "cache_hit": False,
+                "mode": mode,
+                "timing": result["timing"],
             }
 
+        # Only grounded answers are worth caching (never the fallback)
+        if cache is not None:
+            cache.store(question, question_embedding, cache_key, result["answer"], result["sources"])
         
         # Returns the answer and sources
         return {
-            "answer": str(result),
-            "sources": self.last_sources.copy()
+            "answer": result["answer"],
+            "sources": result["sources"],
+            "cache_hit": False,
+            "mode": mode,
+            "timing": result["timing"],
         }
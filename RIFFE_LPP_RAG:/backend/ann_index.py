@@ -0,0 +1,237 @@
+# =============================================================================
+# HNSW index module for RAG Assistant
+# =============================================================================
+# A plain "ORDER BY array_cosine_similarity(...)" has to score EVERY row.
+# DuckDB's vss extension can keep an HNSW graph inside the .duckdb file so the
+# top-k neighbours are found without a full scan.
+#
+# Usage (run from the project folder, with the Streamlit app stopped, because
+# building needs write access to the database file):
+#   python -m backend.ann_index build      # create the index if it is missing
+#   python -m backend.ann_index rebuild    # drop + recreate (e.g. new M/ef)
+#   python -m backend.ann_index load       # check the index loads and is used
+#   python -m backend.ann_index status     # print the index metadata
+# =============================================================================
+
+import argparse
+import json
+from datetime import datetime
+
+import duckdb
+
+from config import (
+    DEFAULT_DB_PATH,
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL_NAME,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    HNSW_M,
+    VECTOR_TABLE_NAME,
+)
+
+INDEX_NAME = f"{VECTOR_TABLE_NAME}_hnsw"
+META_TABLE = f"{VECTOR_TABLE_NAME}_index_meta"
+
+
+def load_extension(conn, install: bool = False) -> bool:
+    """Load vss on a connection. Returns False if the extension is unavailable."""
+    try:
+        if install:
+            conn.execute("INSTALL vss")
+        conn.execute("LOAD vss")
+        return True
+    except duckdb.Error:
+        return False
+
+
+def search_sql(id_column: str, query_embedding) -> str:
+    """
+    The top-k query RAGDatabase runs against the index (LIMIT is a bound parameter).
+
+    The HNSW optimizer only kicks in for ORDER BY distance(col, <constant>) LIMIT n
+    with the distance selected as-is, so the vector is inlined as a literal and
+    callers compute similarity = 1 - distance themselves (projecting
+    "1 - array_cosine_distance(...)" makes DuckDB fall back to a full scan).
+    """
+    vector = "[" + ", ".join(repr(float(x)) for x in query_embedding) + f"]::FLOAT[{EMBEDDING_DIMENSION}]"
+    return f"""
+        SELECT {id_column}, text, array_cosine_distance(embedding, {vector}) AS distance
+        FROM {VECTOR_TABLE_NAME}
+        ORDER BY distance
+        LIMIT ?
+    """
+
+
+def index_status(conn) -> dict:
+    """
+    Describe the HNSW index on a connection.
+
+    Returns:
+        Dictionary with 'exists', 'stale' and the metadata stored at build time.
+        The index counts as stale when the row count, embedding model or
+        dimension no longer match what it was built from.
+    """
+    exists = conn.execute(
+        "SELECT count(*) FROM duckdb_indexes() WHERE index_name = ?", [INDEX_NAME]
+    ).fetchone()[0] > 0
+    status = {"exists": exists, "stale": True, "meta": None}
+    if not exists:
+        return status
+
+    meta = read_meta(conn, INDEX_NAME)
+    if meta is None:
+        return status
+
+    current_rows = conn.execute(f"SELECT count(*) FROM {VECTOR_TABLE_NAME}").fetchone()[0]
+    status["meta"] = meta
+    status["stale"] = (
+        meta["row_count"] != current_rows
+        or meta["embedding_model"] != EMBEDDING_MODEL_NAME
+        or meta["embedding_dimension"] != EMBEDDING_DIMENSION
+    )
+    return status
+
+
+def read_meta(conn, index_name: str) -> dict | None:
+    """Return the build metadata recorded for an index, or None."""
+    has_meta = conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [META_TABLE]
+    ).fetchone()[0] > 0
+    if not has_meta:
+        return None
+
+    row = conn.execute(f"""
+        SELECT row_count, m, ef_construction, embedding_model, embedding_dimension, built_at
+        FROM {META_TABLE}
+        WHERE index_name = ?
+    """, [index_name]).fetchone()
+    if row is None:
+        return None
+
+    return {
+        "row_count": row[0],
+        "m": row[1],
+        "ef_construction": row[2],
+        "embedding_model": row[3],
+        "embedding_dimension": row[4],
+        "built_at": str(row[5]),
+    }
+
+
+def enable_for_queries(conn, ef_search: int = HNSW_EF_SEARCH) -> bool:
+    """
+    Prepare a (read-only) connection for index scans.
+
+    Returns:
+        True when the index exists, is fresh and vss is loaded—i.e. when it is
+        safe for RAGDatabase to use the ANN query path.
+    """
+    if not load_extension(conn):
+        return False
+    try:
+        # GLOBAL so every cursor duplicated from this connection inherits it
+        conn.execute(f"SET GLOBAL hnsw_ef_search = {int(ef_search)}")
+        status = index_status(conn)
+    except duckdb.Error:
+        return False
+    return status["exists"] and not status["stale"]
+
+
+def write_meta(conn, m: int | None, ef_construction: int | None, index_name: str = INDEX_NAME) -> None:
+    """Record what an index was built from so staleness can be detected."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {META_TABLE} (
+            index_name VARCHAR PRIMARY KEY,
+            row_count BIGINT,
+            m INTEGER,
+            ef_construction INTEGER,
+            embedding_model VARCHAR,
+            embedding_dimension INTEGER,
+            built_at TIMESTAMP
+        )
+    """)
+    row_count = conn.execute(f"SELECT count(*) FROM {VECTOR_TABLE_NAME}").fetchone()[0]
+    conn.execute(f"DELETE FROM {META_TABLE} WHERE index_name = ?", [index_name])
+    conn.execute(f"INSERT INTO {META_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        index_name, row_count, m, ef_construction,
+        EMBEDDING_MODEL_NAME, EMBEDDING_DIMENSION, datetime.now(),
+    ])
+
+
+def build_index(db_path: str = DEFAULT_DB_PATH, m: int = HNSW_M,
+                ef_construction: int = HNSW_EF_CONSTRUCTION, rebuild: bool = False) -> dict:
+    """
+    Create (or recreate) the HNSW index inside the DuckDB file.
+
+    Args:
+        db_path: Path to the .duckdb vector store.
+        m: HNSW graph degree.
+        ef_construction: Candidate list size used while building.
+        rebuild: Drop an existing index first.
+
+    Returns:
+        The index status after building.
+    """
+    conn = duckdb.connect(db_path)
+    try:
+        if not load_extension(conn, install=True):
+            raise RuntimeError("DuckDB vss extension is not available")
+        # Needed to store an HNSW index in a file-backed database
+        conn.execute("SET hnsw_enable_experimental_persistence = true")
+
+        status = index_status(conn)
+        if status["exists"] and not (rebuild or status["stale"]):
+            return status
+        conn.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+        conn.execute(f"""
+            CREATE INDEX {INDEX_NAME} ON {VECTOR_TABLE_NAME}
+            USING HNSW (embedding)
+            WITH (metric = 'cosine', M = {int(m)}, ef_construction = {int(ef_construction)})
+        """)
+        write_meta(conn, m, ef_construction)
+        conn.execute("CHECKPOINT")
+        return index_status(conn)
+    finally:
+        conn.close()
+
+
+def load_index(db_path: str = DEFAULT_DB_PATH, ef_search: int = HNSW_EF_SEARCH) -> dict:
+    """Open the file read-only the way the app does and confirm the index is used."""
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        ready = enable_for_queries(conn, ef_search)
+        status = index_status(conn)
+        status["ready"] = ready
+        if ready:
+            # EXPLAIN the exact query the app runs, not a simplified stand-in
+            id_column = "id" if conn.execute(
+                "SELECT count(*) FROM duckdb_columns() WHERE table_name = ? AND column_name = 'id'",
+                [VECTOR_TABLE_NAME],
+            ).fetchone()[0] else "rowid"
+            plan = conn.execute(
+                "EXPLAIN " + search_sql(id_column, [0.0] * EMBEDDING_DIMENSION), [1]
+            ).fetchall()
+            status["uses_index"] = "HNSW_INDEX_SCAN" in "".join(str(r[1]) for r in plan)
+        return status
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the HNSW index for the RAG vector store.")
+    parser.add_argument("command", choices=["build", "rebuild", "load", "status"])
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the .duckdb file")
+    parser.add_argument("--m", type=int, default=HNSW_M)
+    parser.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION)
+    parser.add_argument("--ef-search", type=int, default=HNSW_EF_SEARCH)
+    args = parser.parse_args()
+
+    if args.command in ("build", "rebuild"):
+        result = build_index(args.db, args.m, args.ef_construction, rebuild=args.command == "rebuild")
+    else:
+        result = load_index(args.db, args.ef_search)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# =============================================================================
+# Semantic answer cache for RAG Assistant
+# =============================================================================
+# A full RAGAgent.ask() costs several LLM round trips. When someone asks a
+# paraphrase of a question answered recently, we can return that answer
+# instantly instead.
+# - Questions are embedded with the SAME model RAGDatabase already loads
+# - A hit needs cosine similarity >= threshold AND the same cache key
+#   (LLM model, max_iter, corpus version, answer mode), so changing any of
+#   them misses
+# - TTL + LRU eviction keep the cache small and fresh
+# - Entries persist in a local SQLite file so they survive restarts
+# =============================================================================
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Embedding-similarity lookup of previous answers, persisted to SQLite."""
+
+    def __init__(self, path: str | None, threshold: float, ttl_s: float, max_entries: int):
+        self.path = path or ":memory:"
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        # entry_id -> {"key", "question", "embedding", "answer", "sources", "created_at"}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cache_key TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self._load()
+
+    def _load(self) -> None:
+        """Read unexpired entries back into memory, least recently used first."""
+        cutoff = time.time() - self.ttl_s
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answer_cache WHERE created_at < ?", [cutoff])
+            rows = self._conn.execute("""
+                SELECT entry_id, cache_key, question, embedding, answer, sources, created_at
+                FROM answer_cache ORDER BY last_used_at
+            """).fetchall()
+        for entry_id, key, question, embedding, answer, sources, created_at in rows[-self.max_entries:]:
+            self._entries[entry_id] = {
+                "key": key,
+                "question": question,
+                "embedding": np.asarray(json.loads(embedding), dtype=np.float32),
+                "answer": answer,
+                "sources": json.loads(sources),
+                "created_at": created_at,
+            }
+
+    @staticmethod
+    def make_key(model_name: str, max_iter: int, corpus_version: str, mode: str = "agentic",
+                 filters: str = "", top_k: int | None = None) -> str:
+        # top_k is the passages per search (fast mode: its one search, agentic: each tool call)
+        return json.dumps([model_name, max_iter, corpus_version, mode, top_k, filters])
+
+    def lookup(self, embedding: list[float], key: str) -> dict | None:
+        """
+        Find the most similar cached question under the same key.
+
+        Returns:
+            The cached entry plus its 'similarity', or None on a miss.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        now = time.time()
+        with self._lock:
+            best_id, best_sim = None, self.threshold
+            expired = []
+            for entry_id, entry in self._entries.items():
+                if now - entry["created_at"] > self.ttl_s:
+                    expired.append(entry_id)
+                    continue
+                if entry["key"] != key:
+                    continue
+                sim = float(entry["embedding"] @ query)
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            for entry_id in expired:
+                del self._entries[entry_id]
+
+            if best_id is None:
+                self.misses += 1
+                hit = None
+            else:
+                self.hits += 1
+                self._entries.move_to_end(best_id)
+                hit = {**self._entries[best_id], "similarity": best_sim}
+
+            # The SQLite connection is shared, so writes stay under the lock too
+            with self._conn:
+                if expired:
+                    self._conn.executemany("DELETE FROM answer_cache WHERE entry_id = ?", [[i] for i in expired])
+                if best_id is not None:
+                    self._conn.execute("UPDATE answer_cache SET last_used_at = ? WHERE entry_id = ?", [now, best_id])
+        return hit
+
+    def store(self, question: str, embedding: list[float], key: str, answer: str, sources: list[dict]) -> None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute("""
+                    INSERT INTO answer_cache (cache_key, question, embedding, answer, sources, created_at, last_used_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, [key, question, json.dumps(vector.tolist()), answer,
+                      json.dumps(sources, ensure_ascii=False, default=str), now, now])
+                self._entries[cursor.lastrowid] = {
+                    "key": key,
+                    "question": question,
+                    "embedding": vector,
+                    "answer": answer,
+                    "sources": sources,
+                    "created_at": now,
+                }
+                evicted = []
+                while len(self._entries) > self.max_entries:
+                    evicted.append(self._entries.popitem(last=False)[0])
+                if evicted:
+                    self._conn.executemany("DELETE FROM answer_cache WHERE entry_id = ?", [[i] for i in evicted])
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._entries.clear()
+            self._conn.execute("DELETE FROM answer_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
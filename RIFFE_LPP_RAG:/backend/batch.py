@@ -0,0 +1,66 @@
+# =============================================================================
+# Bulk question answering for RAG Assistant
+# =============================================================================
+# Answers a file of questions with RAGAgent.ask_many: several questions in
+# flight at once, all LLM calls under the shared rate limiter, one JSONL
+# result per question in input order (failures are recorded, not fatal).
+#
+# Usage (run from the project folder; needs OPENAI_API_KEY):
+#   python -m backend.batch questions.txt --out answers.jsonl
+# Input: .txt (one question per line) or .jsonl ({"question": ...} per line).
+# =============================================================================
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from config import ASK_MANY_CONCURRENCY, DEFAULT_ANSWER_MODE, DEFAULT_DB_PATH, DEFAULT_MAX_ITER, DEFAULT_MODEL
+from backend.agent import RAGAgent, runtime_stats
+from backend.database import RAGDatabase
+
+
+def read_questions(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    if os.path.splitext(path)[1].lower() == ".jsonl":
+        return [json.loads(line)["question"] for line in lines]
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Answer a batch of questions concurrently.")
+    parser.add_argument("questions", help=".txt (one per line) or .jsonl with a 'question' field")
+    parser.add_argument("--out", default="answers.jsonl", help="Output JSONL path")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the .duckdb file")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--max-iter", type=int, default=DEFAULT_MAX_ITER)
+    parser.add_argument("--mode", choices=RAGAgent.MODES, default=DEFAULT_ANSWER_MODE)
+    parser.add_argument("--concurrency", type=int, default=ASK_MANY_CONCURRENCY)
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the semantic answer cache")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    agent = RAGAgent(RAGDatabase(args.db), args.model, args.max_iter, mode=args.mode)
+    t0 = time.perf_counter()
+    results = asyncio.run(agent.ask_many(questions, args.concurrency, use_cache=not args.no_cache))
+    elapsed = time.perf_counter() - t0
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+
+    errors = sum(1 for r in results if r.get("error"))
+    print(json.dumps({
+        "questions": len(questions),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "questions_per_min": round(len(questions) / elapsed * 60, 2) if elapsed else 0.0,
+        "out": args.out,
+        "runtimes": runtime_stats(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
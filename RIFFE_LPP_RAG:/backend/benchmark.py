@@ -0,0 +1,283 @@
+# =============================================================================
+# Offline end-to-end benchmark for RAG Assistant
+# =============================================================================
+# Drives the real RAGAgent.ask + RAGDatabase against a local stub LLM
+# (backend.stub_llm), so what we measure is OUR overhead: embedding, DuckDB,
+# context packing, CrewAI orchestration and HTTP, with a fixed, known LLM cost.
+#   - Replays the questions recorded with user feedback (feedback store and
+#     the legacy feedback.jsonl) plus the example
+#     questions in app.py (or any --questions file)
+#   - Reports throughput, p50/p95/p99 per timing stage and memory (RSS)
+#   - Writes JSON, tagged with the git commit, so runs can be diffed
+#
+# Usage (run from the project folder):
+#   python -m backend.benchmark --mode both --repeat 3 --out bench.json
+#   python -m backend.benchmark --stub-latency-ms 0 --stub-tokens-per-s 0   # pure stack overhead
+# =============================================================================
+
+import argparse
+import ast
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from config import BASE_DIR, DEFAULT_DB_PATH, DEFAULT_MAX_ITER, DEFAULT_MODEL, DEFAULT_TOP_K
+from backend.feedback_store import stored_questions
+from backend.ingest import peak_memory_mb
+from backend.rate_limit import set_rate_limit
+from backend.stub_llm import StubLLMServer, StubResponder, load_responses
+
+FEEDBACK_PATH = os.path.join(BASE_DIR, "feedback.jsonl")
+APP_PATH = os.path.join(BASE_DIR, "app.py")
+
+
+# -----------------------------------------------------------------------------
+# Question sets
+# -----------------------------------------------------------------------------
+def feedback_questions(path: str = FEEDBACK_PATH) -> list[str]:
+    """Questions users actually asked (recorded with their feedback)."""
+    questions = stored_questions()
+    if not os.path.exists(path):
+        return questions
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                question = json.loads(line).get("question")
+                if question:
+                    questions.append(question)
+    return questions
+
+
+def app_example_questions(path: str = APP_PATH) -> list[str]:
+    """The `examples = [...]` list from app.py, read without running Streamlit."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "examples" for t in node.targets):
+            return list(ast.literal_eval(node.value))
+    return []
+
+
+def load_questions(path: str | None = None) -> list[str]:
+    """--questions file (.txt / .jsonl), else feedback.jsonl + app.py examples, de-duplicated."""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        questions = [json.loads(line)["question"] for line in lines] if path.endswith(".jsonl") else lines
+    else:
+        questions = feedback_questions() + app_example_questions()
+    return list(dict.fromkeys(questions))
+
+
+# -----------------------------------------------------------------------------
+# Measurements
+# -----------------------------------------------------------------------------
+def current_rss_mb() -> float:
+    """Resident set size right now (Linux /proc), else the peak so far."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_memory_mb()
+
+
+def percentiles(samples_s: list[float]) -> dict:
+    """Latency summary in milliseconds."""
+    if not samples_s:
+        return {"n": 0}
+    values = np.asarray(samples_s, dtype=float) * 1000
+    return {
+        "n": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def summarize(results: list[dict], elapsed_s: float) -> dict:
+    """Throughput, per-stage latency and counters for one mode's results."""
+    ok = [r for r in results if not r.get("error")]
+    stages = {}
+    for result in ok:
+        for key, value in result.get("timing", {}).items():
+            if key.endswith("_s") and isinstance(value, (int, float)):
+                stages.setdefault(key[:-2], []).append(float(value))
+    counters = {}
+    for key in ("llm_calls", "tool_calls", "prompt_tokens", "completion_tokens", "context_tokens"):
+        values = [r["timing"][key] for r in ok if key in r.get("timing", {})]
+        if values:
+            counters[f"mean_{key}"] = round(float(np.mean(values)), 2)
+    return {
+        "questions": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "errors_sample": [r["error"] for r in results if r.get("error")][:5],
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_qps": round(len(ok) / elapsed_s, 3) if elapsed_s else 0.0,
+        "latency": {stage: percentiles(samples) for stage, samples in sorted(stages.items())},
+        **counters,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# -----------------------------------------------------------------------------
+# Runner
+# -----------------------------------------------------------------------------
+def run_mode(agent, questions: list[str], mode: str, concurrency: int, stream: bool, use_cache: bool) -> dict:
+    """Answer every question once in `mode`; returns summarize() output."""
+    t0 = time.perf_counter()
+    if stream:
+        # Sequential, so time-to-first-token isn't skewed by queueing
+        results = []
+        for question in questions:
+            answer_stream = agent.ask_stream(question, use_cache=use_cache, mode=mode)
+            try:
+                for _ in answer_stream:
+                    pass
+                results.append(answer_stream.result)
+            except Exception as e:
+                results.append({"question": question, "error": f"{type(e).__name__}: {e}"})
+    else:
+        results = asyncio.run(agent.ask_many(questions, concurrency, use_cache=use_cache, mode=mode))
+    return summarize(results, time.perf_counter() - t0)
+
+
+def benchmark(db_path: str = DEFAULT_DB_PATH, questions: list[str] | None = None, modes: tuple = ("fast",),
+              repeat: int = 1, warmup: int = 1, concurrency: int = 1, stream: bool = False, use_cache: bool = False,
+              model: str = DEFAULT_MODEL, max_iter: int = DEFAULT_MAX_ITER, responder: StubResponder | None = None,
+              llm_url: str | None = None) -> dict:
+    """
+    Run the benchmark and return the JSON-able report.
+
+    Args:
+        llm_url: Use this OpenAI-compatible endpoint instead of starting a stub.
+    """
+    # Imported here so --help works without crewai / the embedding model loaded
+    from backend.agent import RAGAgent, runtime_stats
+    from backend.database import RAGDatabase, embedding_backend
+
+    questions = questions or load_questions()
+    set_rate_limit(None)  # the stub has no quota; throttling would hide our own latency
+    rss_start = current_rss_mb()
+
+    server = None
+    if llm_url is None:
+        server = StubLLMServer(responder)
+        llm_url = server.start()
+    try:
+        t_init = time.perf_counter()
+        db = RAGDatabase(db_path)
+        agent = RAGAgent(db, model, max_iter, api_key="stub", base_url=llm_url)
+        init_s = time.perf_counter() - t_init
+        rss_ready = current_rss_mb()
+
+        for question in questions[:warmup]:
+            for mode in modes:
+                agent.ask(question, use_cache=False, mode=mode)
+
+        report_modes = {}
+        for mode in modes:
+            report_modes[mode] = run_mode(agent, questions * repeat, mode, concurrency, stream, use_cache)
+            report_modes[mode]["rss_after_mb"] = round(current_rss_mb(), 1)
+
+        return {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "commit": git_commit(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "db_path": db_path,
+                "retrieval_backend": db.backend,
+                "model": model,
+                "max_iter": max_iter,
+                "top_k": DEFAULT_TOP_K,
+                "questions": len(questions),
+                "repeat": repeat,
+                "concurrency": concurrency,
+                "stream": stream,
+                "use_cache": use_cache,
+                "llm": {"url": llm_url, "stub": server is not None,
+                        "latency_ms": responder.latency_s * 1000 if responder else None,
+                        "tokens_per_s": responder.tokens_per_s if responder else None},
+            },
+            "init_s": round(init_s, 3),
+            "memory": {
+                "rss_start_mb": round(rss_start, 1),
+                "rss_ready_mb": round(rss_ready, 1),
+                "rss_end_mb": round(current_rss_mb(), 1),
+                "peak_mb": round(peak_memory_mb(), 1),
+            },
+            "modes": report_modes,
+            "runtimes": runtime_stats(),
+            "db_pool": db.pool_stats(),
+            "embedding_cache": db.cache_stats(),
+            "embedding_backend": embedding_backend(),
+        }
+    finally:
+        if server is not None:
+            server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline RAG benchmark against a local stub LLM.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the .duckdb file")
+    parser.add_argument("--questions", help=".txt or .jsonl question set (default: feedback.jsonl + app.py examples)")
+    parser.add_argument("--mode", choices=["fast", "agentic", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the question set this many times")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured questions run first")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--stream", action="store_true", help="Use ask_stream (reports time to first token)")
+    parser.add_argument("--use-cache", action="store_true", help="Allow semantic answer cache hits")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model name sent to the LLM (and used for token counting)")
+    parser.add_argument("--max-iter", type=int, default=DEFAULT_MAX_ITER)
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0)
+    parser.add_argument("--stub-tokens-per-s", type=float, default=100.0)
+    parser.add_argument("--stub-responses", help="Canned responses JSON for the stub (see backend.stub_llm)")
+    parser.add_argument("--llm-url", help="Existing OpenAI-compatible endpoint instead of the built-in stub")
+    parser.add_argument("--out", help="Write the JSON report here (also printed)")
+    args = parser.parse_args()
+
+    responses, default_answer = load_responses(args.stub_responses)
+    responder = None if args.llm_url else StubResponder(responses, default_answer, args.stub_latency_ms, args.stub_tokens_per_s)
+    report = benchmark(
+        db_path=args.db,
+        questions=load_questions(args.questions),
+        modes=("fast", "agentic") if args.mode == "both" else (args.mode,),
+        repeat=args.repeat,
+        warmup=args.warmup,
+        concurrency=args.concurrency,
+        stream=args.stream,
+        use_cache=args.use_cache,
+        model=args.model,
+        max_iter=args.max_iter,
+        responder=responder,
+        llm_url=args.llm_url,
+    )
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# =============================================================================
+# Token-budgeted context packing for RAG Assistant
+# =============================================================================
+# Retrieved passages go into the LLM prompt verbatim, and a few very long
+# chunks can multiply prompt size (and generation latency). Before passages
+# are handed to the LLM we:
+#   1. drop the low-similarity tail (below a fraction of the best passage)
+#   2. window long passages down to PASSAGE_MAX_TOKENS around the sentences
+#      that best match the query
+#   3. stop adding passages once the prompt budget is spent
+# Tokens are counted with tiktoken for the configured model when it is
+# installed (otherwise ~4 characters per token), and whole-chunk counts are
+# cached by chunk id so packing the same passages again is just lookups.
+# =============================================================================
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from config import (
+    CONTEXT_MIN_RELATIVE_SIMILARITY,
+    CONTEXT_TOKEN_BUDGET,
+    PASSAGE_MAX_TOKENS,
+    TOKEN_COUNT_CACHE_SIZE,
+)
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character estimate
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4  # estimate used without tiktoken
+PASSAGE_OVERHEAD_TOKENS = 12  # "Passage N (source=...):" header + separator
+MIN_PASSAGE_TOKENS = 48  # don't bother adding an excerpt shorter than this
+ELLIPSIS = "…"
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or should that the this "
+    "to was we what when where which who why will with would our my your their its".split()
+)
+
+
+class Tokenizer:
+    """Token counter for one model, with an LRU cache of whole-chunk counts."""
+
+    def __init__(self, model_name: str, cache_size: int = TOKEN_COUNT_CACHE_SIZE):
+        self.model_name = model_name
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                # Unknown/new model names: the gpt-4o family encoding is the best guess
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # chunk key -> token count
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens."""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+    def count_chunk(self, row: dict) -> int:
+        """Cached token count of a retrieved row's full text (keyed by id, else text hash)."""
+        text = row.get("text", "")
+        # Length guards against an id being reused for different text after re-ingestion
+        key = (row["id"], len(text)) if row.get("id") is not None else hashlib.md5(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            n = self._cache.get(key)
+            if n is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return n
+        n = self.count(text)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = n
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "exact": self.encoding is not None,
+                "cached_chunks": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+def get_tokenizer(model_name: str) -> Tokenizer:
+    """One shared Tokenizer (and count cache) per model."""
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(model_name)
+        if tokenizer is None:
+            tokenizer = _tokenizers[model_name] = Tokenizer(model_name)
+        return tokenizer
+
+
+def _terms(text: str) -> set[str]:
+    return {word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS}
+
+
+def window_passage(tokenizer: Tokenizer, query: str, text: str, max_tokens: int, total_tokens: int | None = None) -> tuple[str, int]:
+    """
+    Shorten a passage to ~max_tokens around its best-matching sentences.
+
+    The sentence sharing the most query terms is kept, then neighbours are
+    added (the better-matching side first) while they fit, so the excerpt
+    stays contiguous and readable. Elided text is marked with an ellipsis.
+
+    Returns:
+        (excerpt, token count)
+    """
+    total_tokens = tokenizer.count(text) if total_tokens is None else total_tokens
+    if total_tokens <= max_tokens:
+        return text, total_tokens
+
+    sentences = [s for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+    if len(sentences) <= 1:
+        excerpt = tokenizer.truncate(text, max_tokens)
+        return excerpt + ELLIPSIS, tokenizer.count(excerpt) + 1
+
+    query_terms = _terms(query)
+    scores = [len(query_terms & _terms(s)) for s in sentences]
+    sizes = [tokenizer.count(s) + 1 for s in sentences]
+    best = max(range(len(sentences)), key=lambda i: scores[i])
+    if sizes[best] >= max_tokens:
+        excerpt = tokenizer.truncate(sentences[best], max_tokens)
+        return excerpt + ELLIPSIS, tokenizer.count(excerpt) + 1
+
+    lo = hi = best
+    used = sizes[best]
+    while True:
+        left = lo - 1 if lo > 0 and used + sizes[lo - 1] <= max_tokens else None
+        right = hi + 1 if hi + 1 < len(sentences) and used + sizes[hi + 1] <= max_tokens else None
+        if left is None and right is None:
+            break
+        # Better-matching side first; on a tie grow the shorter side so the best sentence stays central
+        if right is None or (left is not None and (scores[left], hi - best) >= (scores[right], best - lo)):
+            lo, used = left, used + sizes[left]
+        else:
+            hi, used = right, used + sizes[right]
+
+    excerpt = " ".join(sentences[lo:hi + 1])
+    if lo > 0:
+        excerpt = f"{ELLIPSIS} {excerpt}"
+    if hi < len(sentences) - 1:
+        excerpt = f"{excerpt} {ELLIPSIS}"
+    return excerpt, used
+
+
+def pack(tokenizer: Tokenizer, query: str, rows: list[dict], budget: int | None = CONTEXT_TOKEN_BUDGET,
+         passage_max_tokens: int = PASSAGE_MAX_TOKENS,
+         min_relative_similarity: float = CONTEXT_MIN_RELATIVE_SIMILARITY) -> tuple[list[dict], list[dict], int]:
+    """
+    Fit retrieved rows (best first) into a token budget.
+
+    Args:
+        tokenizer: Token counter for the model that will read the prompt.
+        query: The search query (used to pick the window of long passages).
+        rows: Retrieved rows with 'text' and (optionally) 'id' / 'similarity'.
+        budget: Max tokens for all passages, or None to keep everything as is.
+
+    Returns:
+        (kept rows unchanged, the same rows with 'text' as it should go into
+        the prompt, tokens used)
+    """
+    if budget is None:
+        return rows, rows, sum(tokenizer.count_chunk(row) + PASSAGE_OVERHEAD_TOKENS for row in rows)
+
+    best_similarity = max((float(row.get("similarity") or 0.0) for row in rows), default=0.0)
+    floor = best_similarity * min_relative_similarity if best_similarity > 0 else None
+
+    kept, prompt_rows, used = [], [], 0
+    for row in rows:
+        if floor is not None and float(row.get("similarity") or 0.0) < floor:
+            continue
+        remaining = budget - used - PASSAGE_OVERHEAD_TOKENS
+        if remaining < min(MIN_PASSAGE_TOKENS, passage_max_tokens):
+            break
+        text, n = window_passage(tokenizer, query, row.get("text", ""),
+                                 min(passage_max_tokens, remaining), tokenizer.count_chunk(row))
+        if not text.strip() or n > remaining:
+            continue
+        kept.append(row)
+        prompt_rows.append({**row, "text": text})
+        used += n + PASSAGE_OVERHEAD_TOKENS
+    return kept, prompt_rows, used
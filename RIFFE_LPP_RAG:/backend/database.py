@@ -6,12 +6,253 @@
 # =============================================================================
 
 import duckdb
+import numpy as np
 import os
-from sentence_transformers import SentenceTransformer
-import streamlit as st
+import threading
+import time
+import weakref
+from typing import Protocol
 
 # Import config final with embedding name and dimensions 
-from config import EMBEDDING_DIMENSION, EMBEDDING_MODEL_NAME, DEFAULT_TOP_K
+from config import (
+    EMBEDDING_DIMENSION, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, DEFAULT_TOP_K, DB_HEALTHCHECK_INTERVAL_S,
+    VECTOR_TABLE_NAME, USE_ANN_INDEX,
+    EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH, PASSAGE_CACHE_MAX_CHARS, RETRIEVAL_BACKEND, VECTOR_EXPORT_DIR,
+    EMBEDDING_QUANTIZATION, RETRIEVAL_MODE, HYBRID_CANDIDATES, MMR_LAMBDA, MMR_FETCH_MULTIPLIER,
+)
+from backend import ann_index, fts_index, principles, timing
+from backend.embedding_cache import EmbeddingCache
+from backend.filters import METADATA_COLUMNS, where_clause
+from backend.passage_cache import PassageCache
+from backend.vector_engine import NumpyVectorEngine, corpus_version
+
+
+# =============================================================================
+# Embedding model
+# =============================================================================
+# sentence_transformers imports torch, which takes seconds, so it is imported
+# only when the model is first needed. The model used to be an
+# @st.cache_resource; a plain process-wide singleton does the same job and can
+# also be loaded from the app's background warm-up thread (and from CLIs
+# without Streamlit).
+# With EMBEDDING_BACKEND = "onnx" queries are encoded by onnxruntime instead
+# (backend.onnx_embedding), so torch is never imported at all.
+# =============================================================================
+
+class QueryEncoder(Protocol):
+    """What RAGDatabase needs from an embedding model: SentenceTransformer and OnnxEncoder both fit."""
+
+    def encode(self, texts: list[str], batch_size: int = 32, **kwargs) -> np.ndarray: ...
+
+_model = None
+_model_info = {}  # which backend actually loaded, and why "onnx" fell back
+_model_lock = threading.Lock()
+
+def load_embedding_model() -> QueryEncoder:
+    """Return the process-wide query encoder, loading it once (thread-safe)."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            if EMBEDDING_BACKEND == "onnx":
+                from backend import onnx_embedding
+                try:
+                    _model = onnx_embedding.load_encoder()
+                    _model_info.update(backend="onnx", file=_model.file)
+                except Exception as e:
+                    # Not exported / failed the cosine check / onnxruntime missing:
+                    # torch gives the same vectors, just slower
+                    _model_info["fallback_reason"] = f"{type(e).__name__}: {e}"
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                _model_info["backend"] = "torch"
+        return _model
+
+def embedding_backend() -> dict:
+    """Configured vs. loaded query-embedding backend (empty until the model loads)."""
+    with _model_lock:
+        return {"configured": EMBEDDING_BACKEND, **_model_info}
+
+def warm_up_model() -> None:
+    """Load the model and run one dummy encode, so the first real query pays neither."""
+    RAGDatabase._load_model().encode(["warm-up"])
+
+
+# =============================================================================
+# Connection pool
+# =============================================================================
+# Opening the .duckdb file and loading its catalog is the slowest part of a
+# small query, so we keep ONE read-only connection alive for the lifetime of
+# the (cached) RAGDatabase and hand every thread its own cursor.
+# DuckDB cursors are cheap duplicates of the parent connection that are safe
+# to use from a single thread, which matches how Streamlit runs sessions.
+# A failed health check first replaces only the calling thread's cursor. If
+# the connection itself is bad, a new one is swapped in and the old one is
+# retired: it is closed only once the last cursor opened on it is released,
+# so other threads' in-flight queries are never cut off.
+# =============================================================================
+
+class ConnectionPool:
+    """Long-lived read-only DuckDB connection with per-thread cursors."""
+
+    def __init__(self, db_path: str, healthcheck_interval_s: float = DB_HEALTHCHECK_INTERVAL_S,
+                 on_connect=None):
+        self.db_path = db_path
+        self.healthcheck_interval_s = healthcheck_interval_s
+        self.on_connect = on_connect  # called with each freshly opened connection
+        self._conn = None
+        self._generation = 0  # bumped on reconnect so stale cursors are dropped
+        self._live_cursors = {}  # generation -> cursors not yet garbage-collected
+        self._retired = {}  # generation -> replaced connection, closed when its cursors are gone
+        # Re-entrant: a cursor's finalizer may run while this thread holds the lock
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._stats = {
+            "connections_opened": 0,
+            "reconnects": 0,
+            "cursors_created": 0,
+            "cursor_reuses": 0,
+            "cursor_replacements": 0,
+            "health_checks": 0,
+            "health_failures": 0,
+            "connections_retired": 0,
+        }
+
+    def _bump(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def _thread_cursor(self):
+        """Return this thread's cursor, creating it (and the connection) if needed."""
+        local = self._local
+        cursor = getattr(local, "cursor", None)
+        if cursor is not None and local.generation == self._generation:
+            self._bump("cursor_reuses")
+            return cursor
+
+        with self._lock:
+            self._open_locked()
+            cursor = self._new_cursor_locked()
+        return cursor
+
+    def _new_cursor_locked(self):
+        """Open a cursor on the current connection and make it this thread's cursor."""
+        cursor = self._conn.cursor()
+        generation = self._generation
+        self._live_cursors[generation] = self._live_cursors.get(generation, 0) + 1
+        # Counts the cursor out when it is garbage-collected (replaced or its thread ended)
+        weakref.finalize(cursor, self._release, generation)
+        self._stats["cursors_created"] += 1
+        local = self._local
+        local.cursor = cursor
+        local.generation = generation
+        local.checked_at = time.monotonic()
+        return cursor
+
+    def _release(self, generation: int) -> None:
+        """Finalizer for a cursor: close its retired connection once no cursor uses it."""
+        with self._lock:
+            remaining = self._live_cursors.get(generation, 0) - 1
+            if remaining > 0:
+                self._live_cursors[generation] = remaining
+                return
+            self._live_cursors.pop(generation, None)
+            self._close_conn(self._retired.pop(generation, None))
+
+    def cursor(self):
+        """Return a healthy cursor for the calling thread."""
+        cursor = self._thread_cursor()
+        # Health check at most once per interval per thread, not on every query
+        if time.monotonic() - self._local.checked_at >= self.healthcheck_interval_s:
+            self._bump("health_checks")
+            if not self._healthy(cursor):
+                self._bump("health_failures")
+                cursor = self._replace_cursor()
+        return cursor
+
+    @staticmethod
+    def _healthy(cursor) -> bool:
+        try:
+            cursor.execute("SELECT 1").fetchone()
+            return True
+        except duckdb.Error:
+            return False
+
+    def _replace_cursor(self):
+        """Give the calling thread a new cursor; reconnect only if the connection is bad too."""
+        with self._lock:
+            self._open_locked()
+            cursor = self._new_cursor_locked()
+            self._stats["cursor_replacements"] += 1
+        if self._healthy(cursor):
+            return cursor
+        self.reconnect()
+        return self._thread_cursor()
+
+    def execute(self, sql: str, params: list | None = None) -> list[tuple]:
+        """Run a read query, reconnecting once if the connection has gone bad."""
+        with timing.stage("db"):
+            try:
+                return self.cursor().execute(sql, params or []).fetchall()
+            except (duckdb.ConnectionException, duckdb.IOException, duckdb.InternalException):
+                self._replace_cursor()
+                return self.cursor().execute(sql, params or []).fetchall()
+
+    def connect(self) -> None:
+        """Open the shared connection if it is not already open."""
+        if self._conn is None:
+            with self._lock:
+                self._open_locked()
+
+    def _open_locked(self) -> None:
+        if self._conn is None:
+            # read_only=True prevents accidental modifications
+            self._conn = duckdb.connect(self.db_path, read_only=True)
+            self._stats["connections_opened"] += 1
+            if self.on_connect is not None:
+                self.on_connect(self._conn)
+
+    def reconnect(self) -> None:
+        """
+        Swap in a new connection on next use; every thread gets a fresh cursor.
+
+        The old connection stays open until the cursors other threads still
+        hold on it are released, then it is closed.
+        """
+        with self._lock:
+            if self._conn is not None:
+                if self._live_cursors.get(self._generation):
+                    self._retired[self._generation] = self._conn
+                    self._stats["connections_retired"] += 1
+                else:
+                    self._close_conn(self._conn)
+                self._conn = None
+            self._generation += 1
+            self._stats["reconnects"] += 1
+
+    def close(self) -> None:
+        """Close the connection and any retired ones (callers must be done querying)."""
+        with self._lock:
+            self._close_conn(self._conn)
+            self._conn = None
+            for conn in self._retired.values():
+                self._close_conn(conn)
+            self._retired.clear()
+            self._generation += 1
+
+    @staticmethod
+    def _close_conn(conn) -> None:
+        if conn is not None:
+            try:
+                conn.close()
+            except duckdb.Error:
+                pass
+
+    def stats(self) -> dict:
+        """Connection-reuse counters (handy for checking behaviour under load)."""
+        with self._lock:
+            return dict(self._stats)
+
 
 class RAGDatabase:
 
@@ -19,69 +260,425 @@ class RAGDatabase:
     def __init__(self, db_path: str):
         # STORE PATH
         self.db_path = db_path
-        # LOAD MODEL METHOD
-        self.model = self._load_model()
+        # Embedding model: loaded on first use (see the `model` property)
+        self._model = None
+        # Query text -> embedding (skips re-encoding repeated questions)
+        self.embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH)
+        # Chunk id -> passage text for the app's source panels (bounded by characters)
+        self.passage_cache = PassageCache(PASSAGE_CACHE_MAX_CHARS)
+        # Set per connection: True when the HNSW index is loaded and fresh
+        self.ann_ready = False
+        # Set per connection: "id" if the table has one, else DuckDB's rowid
+        self.id_column = "rowid"
+        # Fingerprint of the .duckdb file the pool was opened against
+        self.corpus_version = corpus_version(db_path)
+        # "duckdb" scans in SQL; "numpy" scores an exported in-memory matrix
+        self.backend = RETRIEVAL_BACKEND
+        self.engine = (
+            NumpyVectorEngine(db_path, VECTOR_EXPORT_DIR, EMBEDDING_QUANTIZATION)
+            if self.backend == "numpy" else None
+        )
+        # Set per connection: True when the BM25 index is loaded and fresh
+        self.fts_ready = False
+        # Set per connection: True when every chunk has current CST principle tags
+        self.principles_ready = False
+        # Set per connection: result key -> metadata column, and columns filters may use
+        self.metadata_columns = {}
+        self.filter_columns = set()
+        # (corpus_version, filter_options()) so the sidebar doesn't rescan on every rerun
+        self._filter_options = None
+        # One long-lived read-only connection shared by every query/thread
+        self.pool = ConnectionPool(db_path, on_connect=self._prepare_connection)
 
-    # @st.cache_resource because Streamlit reruns entire script on ever interaction
-    # @st.cache_resource stores information throughout session
-    # @staticmethod caches info because functions can't use 'self'
+    # One model per process (load_embedding_model), shared by every RAGDatabase
+    # @staticmethod because the model doesn't depend on 'self'
     @staticmethod
-    @st.cache_resource
 
     # TO DO: CREATE _load_model() method that stores model attribute
-    def _load_model():
-        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    def _load_model() -> QueryEncoder:
+        return load_embedding_model()
+
+    @property
+    def model(self) -> QueryEncoder:
+        """
+        The query encoder, loaded on first use (app.py warms it up in the background).
+
+        A SentenceTransformer, or an OnnxEncoder with EMBEDDING_BACKEND = "onnx";
+        only encode() is shared, so callers must not rely on anything else.
+        """
+        if self._model is None:
+            self._model = self._load_model()
+        return self._model
 
     def test_connection(self) -> bool:
         """Test if the database can be connected to."""
         # First check: does the file even exist?
         if not os.path.exists(self.db_path):
             return False
-        # Second check: can DuckDB actually open it?
+        # Second check: can DuckDB actually open it? (reuses the pooled connection)
         try:
-            conn = duckdb.connect(self.db_path, read_only=True)
-            conn.close()
+            self.pool.execute("SELECT 1")
             return True
         except Exception:
             return False
 
+    def _prepare_connection(self, conn) -> None:
+        """Inspect the table and decide which query paths are usable."""
+        columns = {row[0] for row in conn.execute(
+            "SELECT column_name FROM duckdb_columns() WHERE table_name = ?", [VECTOR_TABLE_NAME]
+        ).fetchall()}
+        self.id_column = "id" if "id" in columns else "rowid"
+        self.ann_ready = USE_ANN_INDEX and ann_index.enable_for_queries(conn)
+        self.fts_ready = fts_index.enable_for_queries(conn)
+        self.principles_ready = principles.is_tagged(conn)
+        self.metadata_columns = {key: column for key, column in METADATA_COLUMNS.items() if column in columns}
+        self.filter_columns = {column for column in ("doc", "section", "doc_date") if column in columns}
+        if self.principles_ready:
+            self.filter_columns.add(principles.PRINCIPLES_COLUMN)
+
+    def refresh_if_changed(self) -> None:
+        """Reopen the pool (and re-export, for numpy) when the .duckdb file changed."""
+        current = corpus_version(self.db_path)
+        if current != self.corpus_version:
+            self.corpus_version = current
+            self.pool.reconnect()
+        self.pool.connect()
+        if self.engine is not None:
+            self.engine.ensure_fresh(lambda: self.pool.execute(
+                f"SELECT {self.id_column}, text, embedding FROM {VECTOR_TABLE_NAME} ORDER BY {self.id_column}"
+            ))
+
+    def encode(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed query texts, encoding only the ones missing from the cache.
+
+        Args:
+            texts: Query strings.
+
+        Returns:
+            One embedding (list of floats) per input text, same order.
+        """
+        vectors = [self.embedding_cache.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # One batch for all misses instead of one encode() per text
+            with timing.stage("embedding"):
+                encoded = self.model.encode([texts[i] for i in missing]).tolist()
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+                self.embedding_cache.put(texts[i], vector)
+        return vectors
+
+    def cache_stats(self) -> dict:
+        """Return embedding cache hit/miss counters."""
+        return self.embedding_cache.stats()
+
+    def passage_stats(self) -> dict:
+        """Return passage text cache counters."""
+        return self.passage_cache.stats()
+
+    def pool_stats(self) -> dict:
+        """Return connection pool reuse counters."""
+        return self.pool.stats()
+
+    def close(self) -> None:
+        """Release the pooled connection (e.g. before re-indexing the file)."""
+        self.pool.close()
+
     # TO DO: Update query() method
-    def query(self, query_text: str, top_k: int = DEFAULT_TOP_K) -> list[dict]:
+    def query(self, query_text: str, top_k: int = DEFAULT_TOP_K, mode: str | None = None,
+              filters: dict | None = None) -> list[dict]:
         """
         Query the database for relevant passages.
         
         Args:
             query_text: The search query.
             top_k: Number of results to return.
+            mode: "vector" or "hybrid" (vector + BM25 fused with RRF).
+                Defaults to RETRIEVAL_MODE; hybrid falls back to vector
+                when the full-text index is missing or stale.
+            filters: Structured filters (doc, section, principles, date_from,
+                date_to; see backend.filters), applied in the WHERE clause
+                before similarity ranking.
             
         Returns:
-            List of dictionaries containing 'text' and 'similarity'.
+            List of dictionaries containing 'id', 'text' and 'similarity'
+            plus the stored metadata ('doc', 'title', 'section', 'url',
+            'chunk_index', 'date') when the table has it
+            (hybrid results also carry 'bm25' and 'rrf_score').
         """
         try:
-            # TO DO: Connect to database in read-only mode
-            # read_only=True prevents accidental modifications
-            conn = duckdb.connect(self.db_path, read_only=True)
-            
             # TO DO: Convert query text to embedding vector
-            query_embedding = self.model.encode(query_text).tolist()
+            query_embedding = self.encode([query_text])[0]
             
             # TO DO: Update table name
             # Execute vector search
             # Return top k most similar passages
             # Note: We cast the parameter to FLOAT[384] to match the embedding dimension
-            results = conn.execute(f"""
-                SELECT text, array_cosine_similarity(embedding, ?::FLOAT[{EMBEDDING_DIMENSION}]) as similarity
-                FROM handbag_rag_documents
-                ORDER BY similarity DESC
-                LIMIT ?
-            """, [query_embedding, top_k]).fetchall()
-            
-            # TO DO: Close database connection
-            conn.close()
+            self.refresh_if_changed()
+            where, params = where_clause(filters, self.filter_columns)
+            hybrid = (mode or RETRIEVAL_MODE) == "hybrid" and self.fts_ready
+            # Without the HNSW index / NumPy export (or with a filter) vectors are scored exactly,
+            # and hybrid then scores both rankings in a single scan instead of two
+            indexed = not where and (self.engine is not None or self.ann_ready)
+            results = None
+            if not hybrid or indexed:
+                # Hybrid fuses the top HYBRID_CANDIDATES of the indexed vector path with BM25
+                depth = max(top_k, HYBRID_CANDIDATES) if hybrid else top_k
+                if self.engine is not None and not where:
+                    with timing.stage("db"):
+                        results = self.engine.search([query_embedding], depth)[0]
+                else:
+                    # The exported matrix has no metadata, so filtered queries always run in DuckDB
+                    results = self._search(query_embedding, depth, where, params)
+            if hybrid:
+                results = fts_index.hybrid_search(self.pool.execute, self.id_column, results, query_embedding,
+                                                  query_text, top_k, where=where, where_params=params)
+                return self._attach_metadata([
+                    {"id": row[0], "text": row[1], "similarity": float(row[2]),
+                     "bm25": float(row[3]) if row[3] is not None else None, "rrf_score": float(row[4])}
+                    for row in results
+                ])
             
             # TO DO: Format results for the agent
-            # Each result row is (text, similarity_score)
-            return [{"text":row[0], "similarity":float(row[1])} for row in results]
+            # Each result row is (id, text, similarity_score)
+            return self._attach_metadata([{"id":row[0], "text":row[1], "similarity":float(row[2])} for row in results])
             
         except Exception as e:
             raise Exception(f"Database query failed: {str(e)}")
+
+    def _attach_metadata(self, rows: list[dict]) -> list[dict]:
+        """Add the stored metadata columns to result rows (one IN lookup for all of them)."""
+        if not rows or not self.metadata_columns:
+            return rows
+        # ids are integers, so inlining them is safe and lets DuckDB filter in the scan
+        id_list = ", ".join(str(int(row["id"])) for row in rows)
+        found = {record[0]: record[1:] for record in self.pool.execute(
+            f"SELECT {self.id_column}, {', '.join(self.metadata_columns.values())} "
+            f"FROM {VECTOR_TABLE_NAME} WHERE {self.id_column} IN ({id_list})"
+        )}
+        keys = list(self.metadata_columns)
+        for row in rows:
+            for key, value in zip(keys, found.get(row["id"], ())):
+                # Dates as ISO strings: rows end up in session state, JSON exports and the answer cache
+                row[key] = value.isoformat() if hasattr(value, "isoformat") else value
+        return rows
+
+    def filter_options(self) -> dict:
+        """
+        Values the app offers as filters for this store.
+
+        Returns:
+            {'doc': [...], 'section': [...], 'date': (min, max), 'principles': [...]},
+            each key present only when the store can filter on it.
+        """
+        self.refresh_if_changed()
+        cached = self._filter_options
+        if cached is not None and cached[0] == self.corpus_version:
+            return cached[1]
+        options = {}
+        for column in ("doc", "section"):
+            if column in self.filter_columns:
+                options[column] = [row[0] for row in self.pool.execute(
+                    f"SELECT DISTINCT {column} FROM {VECTOR_TABLE_NAME} WHERE coalesce({column}, '') <> '' ORDER BY 1"
+                )]
+        if "doc_date" in self.filter_columns:
+            low, high = self.pool.execute(f"SELECT min(doc_date), max(doc_date) FROM {VECTOR_TABLE_NAME}")[0]
+            if low is not None:
+                options["date"] = (low, high)
+        if principles.PRINCIPLES_COLUMN in self.filter_columns:
+            options["principles"] = list(principles.PRINCIPLE_NAMES)
+        self._filter_options = (self.corpus_version, options)
+        return options
+
+    def get_embeddings(self, ids: list) -> dict:
+        """
+        Fetch stored embeddings for a handful of chunk ids.
+
+        Returns:
+            {id: np.ndarray} for every id found.
+        """
+        if not ids:
+            return {}
+        self.refresh_if_changed()
+        if self.engine is not None:
+            return self.engine.vectors(ids)
+        # ids are integers, so inlining them is safe and lets DuckDB filter in the scan
+        id_list = ", ".join(str(int(chunk_id)) for chunk_id in ids)
+        rows = self.pool.execute(
+            f"SELECT {self.id_column}, embedding FROM {VECTOR_TABLE_NAME} WHERE {self.id_column} IN ({id_list})"
+        )
+        return {row[0]: np.asarray(row[1], dtype=np.float32) for row in rows}
+
+    def get_principles(self, ids: list) -> dict:
+        """
+        Fetch the CST principle bitmasks stored for chunk ids at ingestion.
+
+        Returns:
+            {id: mask} for every id found; empty when the store has no current
+            tags (callers then scan the passage text with principles.principle_mask).
+        """
+        if not ids:
+            return {}
+        self.refresh_if_changed()
+        if not self.principles_ready:
+            return {}
+        # ids are integers, so inlining them is safe and lets DuckDB filter in the scan
+        id_list = ", ".join(str(int(chunk_id)) for chunk_id in ids)
+        return dict(self.pool.execute(
+            f"SELECT {self.id_column}, {principles.PRINCIPLES_COLUMN} FROM {VECTOR_TABLE_NAME} "
+            f"WHERE {self.id_column} IN ({id_list})"
+        ))
+
+    def get_texts(self, ids: list) -> dict:
+        """
+        Fetch passage text for chunk ids (the app stores only ids in chat history).
+
+        Returns:
+            {id: text} for every id found, served from the shared passage cache when possible.
+        """
+        if not ids:
+            return {}
+        self.refresh_if_changed()
+        version = self.corpus_version
+        texts, missing = self.passage_cache.get_many(version, ids)
+        if missing:
+            if self.engine is not None:
+                fetched = self.engine.texts_for(missing)
+            else:
+                # ids are integers, so inlining them is safe and lets DuckDB filter in the scan
+                id_list = ", ".join(str(int(chunk_id)) for chunk_id in missing)
+                fetched = dict(self.pool.execute(
+                    f"SELECT {self.id_column}, text FROM {VECTOR_TABLE_NAME} WHERE {self.id_column} IN ({id_list})"
+                ))
+            self.passage_cache.put_many(version, fetched)
+            texts.update(fetched)
+        return texts
+
+    def query_diverse(self, query_text: str, top_k: int = DEFAULT_TOP_K, exclude_ids=(),
+                      mode: str | None = None, lambda_: float = MMR_LAMBDA,
+                      fetch_multiplier: int = MMR_FETCH_MULTIPLIER, filters: dict | None = None) -> list[dict]:
+        """
+        Query for passages that are relevant AND not redundant with each other.
+
+        Fetches top_k * fetch_multiplier candidates, drops any already in
+        `exclude_ids` (e.g. passages an earlier tool call returned), then picks
+        top_k with maximal marginal relevance:
+            score = lambda_ * sim(query, d) - (1 - lambda_) * max sim(d, already picked)
+
+        Returns:
+            Same shape as query(), in MMR selection order.
+        """
+        exclude_ids = set(exclude_ids)
+        candidates = [
+            row for row in self.query(query_text, top_k * fetch_multiplier + len(exclude_ids), mode, filters)
+            if row.get("id") not in exclude_ids
+        ]
+        if len(candidates) <= top_k:
+            return candidates
+
+        vectors = self.get_embeddings([row["id"] for row in candidates])
+        if len(vectors) != len(candidates):
+            # Ids not resolvable (e.g. mid re-export): relevance order is still fine
+            return candidates[:top_k]
+        matrix = np.stack([vectors[row["id"]] for row in candidates])
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        relevance = np.array([row["similarity"] for row in candidates], dtype=np.float32)
+
+        selected = []
+        redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+        for _ in range(top_k):
+            scores = lambda_ * relevance - (1 - lambda_) * np.where(np.isinf(redundancy), 0.0, redundancy)
+            scores[selected] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            redundancy = np.maximum(redundancy, matrix @ matrix[best])
+        return [candidates[i] for i in selected]
+
+    def query_many(self, queries: list[str], top_k: int = DEFAULT_TOP_K, filters: dict | None = None) -> list[list[dict]]:
+        """
+        Query the database for several searches at once.
+
+        All queries are encoded in ONE SentenceTransformer batch and scored in
+        ONE SQL statement, so the encoder and DuckDB per-call overhead is paid
+        once instead of len(queries) times.
+
+        Args:
+            queries: The search queries.
+            top_k: Number of results to return per query.
+            filters: Structured filters applied to every query (see query()).
+
+        Returns:
+            One list per query (same order), each shaped like query()'s output.
+        """
+        if not queries:
+            return []
+        try:
+            query_embeddings = self.encode(list(queries))
+            self.refresh_if_changed()
+            where, params = where_clause(filters, self.filter_columns, alias="d")
+            if self.engine is not None and not where:
+                # One (n_queries x n_chunks) matrix product for the whole batch
+                with timing.stage("db"):
+                    batches = self.engine.search(query_embeddings, top_k)
+                grouped = [
+                    [{"id": row[0], "text": row[1], "similarity": float(row[2])} for row in rows]
+                    for rows in batches
+                ]
+                self._attach_metadata([row for rows in grouped for row in rows])
+                return grouped
+
+            # Unnest the batch into (query_idx, query_vec) rows, score every
+            # (query, document) pair and keep the top k per query with QUALIFY
+            results = self.pool.execute(f"""
+                WITH batch AS (
+                    SELECT ?::FLOAT[{EMBEDDING_DIMENSION}][] AS vecs
+                ),
+                queries AS (
+                    SELECT unnest(range(len(vecs))) AS query_idx, unnest(vecs) AS query_vec
+                    FROM batch
+                )
+                SELECT q.query_idx, d.{self.id_column}, d.text, array_cosine_similarity(d.embedding, q.query_vec) as similarity
+                FROM queries q CROSS JOIN {VECTOR_TABLE_NAME} d
+                {f"WHERE {where}" if where else ""}
+                QUALIFY row_number() OVER (PARTITION BY q.query_idx ORDER BY similarity DESC) <= ?
+                ORDER BY q.query_idx, similarity DESC
+            """, [query_embeddings, *params, top_k])
+
+            grouped = [[] for _ in queries]
+            for query_idx, chunk_id, text, similarity in results:
+                grouped[query_idx].append({"id": chunk_id, "text": text, "similarity": float(similarity)})
+            self._attach_metadata([row for rows in grouped for row in rows])
+            return grouped
+
+        except Exception as e:
+            raise Exception(f"Database query failed: {str(e)}")
+
+    def _search(self, query_embedding: list[float], top_k: int, where: str = "", params: list = ()) -> list[tuple]:
+        """
+        Run the ANN index scan when available, otherwise the exact scan.
+
+        `where` (from backend.filters.where_clause) restricts the rows before
+        they are scored. vss applies a WHERE only AFTER its HNSW search (so a
+        selective filter can leave fewer than top_k rows); filtered queries
+        therefore take the pre-filtered exact scan instead.
+
+        Quantized (int8 / float16) first passes only run in the NumPy backend:
+        in DuckDB the TINYINT[] -> FLOAT[] cast per row costs more than the
+        smaller column saves (see python -m backend.quantization compare).
+        """
+        if self.ann_ready and not where:
+            try:
+                rows = self.pool.execute(ann_index.search_sql(self.id_column, query_embedding), [top_k])
+                return [(chunk_id, text, 1 - distance) for chunk_id, text, distance in rows]
+            except duckdb.Error:
+                # e.g. vss failed to load on a reconnect—exact scan still works
+                self.ann_ready = False
+
+        return self.pool.execute(f"""
+            SELECT {self.id_column}, text, array_cosine_similarity(embedding, ?::FLOAT[{EMBEDDING_DIMENSION}]) as similarity
+            FROM {VECTOR_TABLE_NAME}
+            {f"WHERE {where}" if where else ""}
+            ORDER BY similarity DESC
+            LIMIT ?
+        """, [query_embedding, *params, top_k])
@@ -0,0 +1,134 @@
+# =============================================================================
+# Query-embedding cache for RAG Assistant
+# =============================================================================
+# Users re-click the same example questions and the agent often re-issues the
+# same tool query, so we remember query -> embedding instead of re-running
+# SentenceTransformer.encode every time.
+# - Bounded LRU in memory (thread-safe, shared by all sessions)
+# - Optional .npz file on disk so the cache survives restarts
+# - Keys include the embedding model + dimension, so changing either in
+#   config.py invalidates every cached vector
+# =============================================================================
+
+import atexit
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import EMBEDDING_DIMENSION, EMBEDDING_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace and case (MiniLM is uncased, so the vector is the same)."""
+    return " ".join((text or "").split()).casefold()
+
+
+class EmbeddingCache:
+    """Bounded LRU of query embeddings with hit/miss counters."""
+
+    def __init__(self, max_entries: int, path: str | None = None, save_every: int = 50,
+                 model_name: str = EMBEDDING_MODEL_NAME, dimension: int = EMBEDDING_DIMENSION):
+        self.max_entries = max_entries
+        self.path = path
+        self.save_every = save_every
+        self.model_name = model_name
+        self.dimension = dimension
+        self._entries = OrderedDict()  # key -> list[float]
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def key(self, text: str) -> str:
+        return f"{self.model_name}|{self.dimension}|{normalize_query(text)}"
+
+    def get(self, text: str) -> list[float] | None:
+        key = self.key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector: list[float]) -> None:
+        key = self.key(text)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def load(self) -> None:
+        """Load entries from disk, ignoring files written for another model/dimension."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["model_name"]) != self.model_name or int(data["dimension"]) != self.dimension:
+                    return
+                keys = data["keys"].tolist()
+                vectors = data["vectors"].tolist()
+        except Exception:
+            # A corrupt cache file is not worth failing startup over
+            return
+        with self._lock:
+            for key, vector in zip(keys[-self.max_entries:], vectors[-self.max_entries:]):
+                self._entries[key] = vector
+
+    def save(self) -> None:
+        """Write the cache to disk atomically (oldest -> newest, so LRU order survives)."""
+        if not self.path:
+            return
+        with self._lock:
+            keys = list(self._entries.keys())
+            vectors = list(self._entries.values())
+            self._unsaved = 0
+        tmp_path = None
+        try:
+            # Unique temp name per save: concurrent savers must not share (and clobber) one file
+            fd, tmp_path = tempfile.mkstemp(prefix=".embedding_cache.", suffix=".tmp.npz",
+                                            dir=os.path.dirname(os.path.abspath(self.path)))
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    model_name=np.array(self.model_name),
+                    dimension=np.array(self.dimension),
+                    keys=np.array(keys, dtype=str),
+                    vectors=np.array(vectors, dtype=np.float32).reshape(len(vectors), self.dimension),
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # Read-only deployments just keep the in-memory cache
+            logger.warning("Could not save the embedding cache to %s: %s", self.path, e)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
@@ -0,0 +1,404 @@
+# =============================================================================
+# Feedback store for RAG Assistant
+# =============================================================================
+# 👍/👎 feedback used to be appended to feedback.jsonl on every click: one
+# open() per click, writes from concurrent sessions could interleave, every
+# record carried the full answer text, and errors were silently swallowed.
+# Now:
+#   - submit() only puts the record on a queue; ONE background writer thread
+#     drains it and writes up to FEEDBACK_BATCH_SIZE records per transaction
+#     (group commit: one fsync for the whole batch)
+#   - SQLite in WAL mode with synchronous=FULL: a committed record survives a
+#     crash, and readers (summary/query) never block the writer
+#   - answer bodies live once in `answers`, keyed by SHA-256 of the text;
+#     feedback rows reference the hash
+#   - indexes on model, mode and thumb for the reporting queries
+#   - a record hash makes the feedback.jsonl import idempotent
+#   - a batch that fails to write is counted under `errors` and logged; the
+#     writer keeps running, so flush() never waits on a dead thread
+#
+# Usage (run from the project folder):
+#   python -m backend.feedback_store import feedback.jsonl   # one-time, safe to re-run
+#   python -m backend.feedback_store summary --by model
+#   python -m backend.feedback_store query --thumb 👎 --limit 20
+# =============================================================================
+
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from config import FEEDBACK_BATCH_SIZE, FEEDBACK_DB_PATH, FEEDBACK_FLUSH_INTERVAL_S
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    answer_hash TEXT PRIMARY KEY,
+    answer TEXT NOT NULL,
+    chars INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    feedback_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_hash TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL,
+    thumb TEXT NOT NULL,
+    note TEXT,
+    question TEXT,
+    answer_hash TEXT REFERENCES answers (answer_hash),
+    model TEXT,
+    mode TEXT,
+    tone TEXT,
+    strict_citations INTEGER,
+    top_k INTEGER,
+    max_iter INTEGER,
+    similarity TEXT
+);
+CREATE INDEX IF NOT EXISTS feedback_model ON feedback (model, created_at);
+CREATE INDEX IF NOT EXISTS feedback_mode ON feedback (mode, created_at);
+CREATE INDEX IF NOT EXISTS feedback_thumb ON feedback (thumb, created_at);
+"""
+GROUP_COLUMNS = ("model", "mode", "thumb", "tone")  # allowed in summary(by=...)
+WRITE_RETRIES = 3  # attempts per batch when the file is locked
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _row(record: dict) -> tuple[tuple | None, tuple]:
+    """Split a feedback record into its (answers row or None, feedback row)."""
+    answer = record.get("answer") or ""
+    answer_hash = content_hash(answer) if answer else None
+    created_at = record.get("timestamp") or time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    # Same click recorded twice (e.g. importing the JSONL again) -> same hash
+    record_hash = content_hash(json.dumps(
+        [created_at, record.get("thumb"), record.get("note"), record.get("question"), answer_hash],
+        ensure_ascii=False,
+    ))
+    strict = record.get("strict_citations")
+    feedback_row = (
+        record_hash, created_at, record.get("thumb") or "", record.get("note") or "",
+        record.get("question") or "", answer_hash, record.get("model") or "", record.get("mode") or "",
+        record.get("tone") or "", None if strict is None else int(bool(strict)),
+        record.get("top_k"), record.get("max_iter"),
+        json.dumps(record.get("similarity") or {}, ensure_ascii=False, default=str),
+    )
+    return ((answer_hash, answer, len(answer)) if answer_hash else None), feedback_row
+
+
+class FeedbackStore:
+    """Queue + background group-commit writer over a WAL-mode SQLite file."""
+
+    def __init__(self, path: str | None = FEEDBACK_DB_PATH, batch_size: int = FEEDBACK_BATCH_SIZE,
+                 flush_interval_s: float = FEEDBACK_FLUSH_INTERVAL_S):
+        self.path = path  # None = a private in-memory database (gone when the store closes)
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()  # counters only
+        self.submitted = 0
+        self.written = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+
+        # Written only by the writer thread (after setup). In-memory stores have no
+        # file for readers to open, so their reads share it under _conn_lock.
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+        self._conn_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False, timeout=10)
+        if self.path:
+            conn.execute("PRAGMA journal_mode=WAL")
+        # FULL fsyncs every commit; group commit means that's once per batch, not per click
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+    def submit(self, record: dict) -> None:
+        """Queue one feedback record; returns immediately."""
+        if self._closed:
+            raise RuntimeError("FeedbackStore is closed")
+        if not isinstance(record, dict):
+            raise TypeError(f"feedback record must be a dict, not {type(record).__name__}")
+        with self._lock:
+            self.submitted += 1
+        self._queue.put(record)
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:  # close()
+                self._queue.task_done()
+                return
+            batch = [record]
+            # Group commit: give other clicks up to flush_interval_s to join this transaction
+            deadline = time.monotonic() + self.flush_interval_s
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            try:
+                self._write(batch)
+            except Exception as e:  # a bad record must not kill the writer (flush() would hang)
+                logger.exception("Could not write %d feedback record(s)", len(batch))
+                with self._lock:
+                    self.errors += len(batch)
+                    self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch: list[dict]) -> None:
+        rows = []
+        for record in batch:
+            try:
+                rows.append(_row(record))
+            except (TypeError, ValueError, AttributeError) as e:  # e.g. a non-string answer
+                logger.warning("Skipping malformed feedback record: %s", e)
+                with self._lock:
+                    self.errors += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+        if not rows:
+            return
+        answers = {answer[0]: answer for answer, _ in rows if answer is not None}
+        for attempt in range(WRITE_RETRIES):
+            try:
+                with self._conn_lock, self._conn:
+                    self._conn.executemany("INSERT OR IGNORE INTO answers VALUES (?, ?, ?)", list(answers.values()))
+                    before = self._conn.total_changes
+                    self._conn.executemany("""
+                        INSERT OR IGNORE INTO feedback (record_hash, created_at, thumb, note, question, answer_hash,
+                                                        model, mode, tone, strict_citations, top_k, max_iter, similarity)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, [row for _, row in rows])
+                    inserted = self._conn.total_changes - before
+                with self._lock:
+                    self.written += inserted
+                    self.duplicates += len(rows) - inserted
+                    self.batches += 1
+                return
+            except sqlite3.OperationalError as e:  # "database is locked" from another process
+                error = e
+                time.sleep(0.1 * 2 ** attempt)
+            except sqlite3.Error as e:
+                error = e
+                break
+        logger.warning("Could not write %d feedback record(s): %s", len(rows), error)
+        with self._lock:
+            self.errors += len(rows)
+            self.last_error = f"{type(error).__name__}: {error}"
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Wait until everything submitted so far is written.
+
+        Returns:
+            True once the queue is drained; False if `timeout` seconds passed
+            first or the writer thread is no longer running.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                if not self._thread.is_alive():
+                    return False
+                remaining = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+                if remaining <= 0:
+                    return False
+                # Short waits so a writer that died is noticed
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self) -> None:
+        """Commit what is queued, stop the writer and close the connection."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._conn.close()
+
+    def import_jsonl(self, path: str) -> dict:
+        """Load an old feedback.jsonl; records already in the store are skipped."""
+        read = bad = 0
+        before = self.stats()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    bad += 1
+                    continue
+                if not isinstance(record, dict):  # valid JSON, but not a feedback record
+                    bad += 1
+                    continue
+                read += 1
+                self.submit(record)
+        self.flush()
+        after = self.stats()
+        return {
+            "path": path,
+            "read": read,
+            "bad_lines": bad,
+            "inserted": after["written"] - before["written"],
+            "duplicates": after["duplicates"] - before["duplicates"],
+            "errors": after["errors"] - before["errors"],
+        }
+
+    # -------------------------------------------------------------------------
+    # Reading (own connection per call; WAL lets it run while the writer commits)
+    # -------------------------------------------------------------------------
+    def _read(self, sql: str, params: list) -> list[dict]:
+        if self.path is None:
+            with self._conn_lock:
+                return self._fetch(self._conn, sql, params)
+        conn = self._connect()
+        try:
+            return self._fetch(conn, sql, params)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _fetch(conn: sqlite3.Connection, sql: str, params: list) -> list[dict]:
+        cursor = conn.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def query(self, model: str | None = None, mode: str | None = None, thumb: str | None = None,
+              since: str | None = None, limit: int = 100, with_answer: bool = False) -> list[dict]:
+        """
+        Most recent feedback matching every given filter (uses the indexes).
+
+        Args:
+            since: ISO timestamp; only feedback at or after it.
+            with_answer: Join the full answer text back in.
+        """
+        where, params = [], []
+        for column, value in (("f.model", model), ("f.mode", mode), ("f.thumb", thumb)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("f.created_at >= ?")
+            params.append(since)
+        rows = self._read(f"""
+            SELECT f.*, a.chars AS answer_chars{", a.answer" if with_answer else ""}
+            FROM feedback f LEFT JOIN answers a USING (answer_hash)
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY f.created_at DESC
+            LIMIT ?
+        """, params + [int(limit)])
+        for row in rows:
+            row["similarity"] = json.loads(row["similarity"] or "{}")
+        return rows
+
+    def summary(self, by: str = "model") -> list[dict]:
+        """👍 / 👎 counts grouped by model, mode, thumb or tone."""
+        if by not in GROUP_COLUMNS:
+            raise ValueError(f"by must be one of {GROUP_COLUMNS}")
+        return self._read(f"""
+            SELECT {by}, count(*) AS total,
+                   sum(thumb = '👍') AS thumbs_up, sum(thumb = '👎') AS thumbs_down,
+                   max(created_at) AS latest
+            FROM feedback GROUP BY {by} ORDER BY total DESC
+        """, [])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "queued": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "duplicates": self.duplicates,
+                "batches": self.batches,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_feedback_store() -> FeedbackStore:
+    """Return the process-wide store (one writer thread shared by all sessions)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FeedbackStore()
+        return _store
+
+
+def stored_questions(path: str | None = FEEDBACK_DB_PATH) -> list[str]:
+    """Distinct questions that received feedback, oldest first (no writer thread started)."""
+    if not path or not os.path.exists(path):
+        return []
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute(
+            "SELECT question FROM feedback WHERE question != '' GROUP BY question ORDER BY min(created_at)"
+        ).fetchall()]
+    except sqlite3.OperationalError:  # file exists but has no feedback table yet
+        return []
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Feedback store: import, summarize and query.")
+    parser.add_argument("--db", default=FEEDBACK_DB_PATH, help="SQLite feedback database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="Import an existing feedback.jsonl (idempotent)")
+    import_cmd.add_argument("path")
+    summary_cmd = sub.add_parser("summary", help="👍/👎 counts per group")
+    summary_cmd.add_argument("--by", choices=GROUP_COLUMNS, default="model")
+    query_cmd = sub.add_parser("query", help="Recent feedback, filtered")
+    query_cmd.add_argument("--model")
+    query_cmd.add_argument("--mode")
+    query_cmd.add_argument("--thumb")
+    query_cmd.add_argument("--since", help="ISO timestamp")
+    query_cmd.add_argument("--limit", type=int, default=20)
+    query_cmd.add_argument("--with-answer", action="store_true")
+    args = parser.parse_args()
+
+    store = FeedbackStore(args.db)
+    try:
+        if args.command == "import":
+            result = store.import_jsonl(args.path)
+        elif args.command == "summary":
+            result = store.summary(args.by)
+        else:
+            result = store.query(args.model, args.mode, args.thumb, args.since, args.limit, args.with_answer)
+    finally:
+        store.close()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
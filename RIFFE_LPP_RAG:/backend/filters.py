@@ -0,0 +1,108 @@
+# =============================================================================
+# Structured retrieval filters for RAG Assistant
+# =============================================================================
+# RAGDatabase.query(..., filters={...}) narrows the candidate set BEFORE
+# similarity ranking: the filter becomes the WHERE clause of the scoring query
+# itself, so DuckDB only reads and scores embeddings of rows that pass it.
+# Filter keys (all optional, combined with AND):
+#   doc         document name, or a list of names
+#   section     section heading, or a list of headings
+#   principles  CST principle names (backend.principles); a chunk passes when
+#               it mentions ANY of them
+#   date_from / date_to   inclusive bounds on the document date
+#                         (ISO "YYYY-MM-DD" string or datetime.date)
+# Empty values mean "no filter", so UI widgets can be passed through as-is.
+# =============================================================================
+
+import json
+from datetime import date
+
+from backend import principles
+
+# Result key -> column in the vector table (written by backend.ingest)
+METADATA_COLUMNS = {
+    "doc": "doc",
+    "title": "title",
+    "section": "section",
+    "url": "url",
+    "chunk_index": "chunk_index",
+    "date": "doc_date",
+}
+FILTER_KEYS = ("doc", "section", "principles", "date_from", "date_to")
+
+
+def normalize(filters: dict | None) -> dict:
+    """
+    Drop empty values and put the rest in a canonical form.
+
+    Raises:
+        ValueError: Unknown filter key, principle name or date.
+    """
+    normalized = {}
+    for key, value in (filters or {}).items():
+        if key not in FILTER_KEYS:
+            raise ValueError(f"Unknown retrieval filter: {key!r} (expected one of {FILTER_KEYS})")
+        if value is None or value == "" or value == [] or value == ():
+            continue
+        if key in ("doc", "section", "principles"):
+            values = [value] if isinstance(value, str) else list(value)
+            normalized[key] = sorted(set(values))
+        else:
+            try:
+                normalized[key] = value if isinstance(value, date) else date.fromisoformat(str(value))
+            except ValueError:
+                raise ValueError(f"Invalid {key}: {value!r} (expected YYYY-MM-DD)") from None
+    if "principles" in normalized:
+        try:
+            principles.mask_for(normalized["principles"])
+        except KeyError as e:
+            raise ValueError(e.args[0]) from None
+    return normalized
+
+
+def describe(filters: dict | None) -> str:
+    """Stable string for a filter set ("" = no filter), e.g. for cache keys."""
+    normalized = normalize(filters)
+    return json.dumps(normalized, sort_keys=True, default=str) if normalized else ""
+
+
+def where_clause(filters: dict | None, available: set, alias: str = "") -> tuple[str, list]:
+    """
+    Build the SQL predicate for a filter set.
+
+    Args:
+        filters: Filter dict (see the module header).
+        available: Filterable columns this store has: any of "doc", "section",
+            "doc_date", and "principles" when its tags are current.
+        alias: Table alias to prefix columns with (e.g. "d").
+
+    Returns:
+        (predicate, params): "" and [] when there is nothing to filter on.
+
+    Raises:
+        ValueError: A filter needs a column the store does not have.
+    """
+    normalized = normalize(filters)
+    prefix = f"{alias}." if alias else ""
+    parts, params = [], []
+
+    def require(column: str, hint: str) -> None:
+        if column not in available:
+            raise ValueError(f"This vector store cannot filter on {column!r}; {hint}")
+
+    for key in ("doc", "section"):
+        if key in normalized:
+            require(key, "re-ingest it with python -m backend.ingest")
+            values = normalized[key]
+            parts.append(f"{prefix}{key} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+    if "principles" in normalized:
+        require("principles", "run python -m backend.principles build")
+        parts.append(f"({prefix}{principles.PRINCIPLES_COLUMN} & ?) <> 0")
+        params.append(principles.mask_for(normalized["principles"]))
+    for key, op in (("date_from", ">="), ("date_to", "<=")):
+        if key in normalized:
+            require("doc_date", "re-ingest it with python -m backend.ingest (.jsonl records with a \"date\")")
+            parts.append(f"{prefix}doc_date {op} ?")
+            params.append(normalized[key])
+    return " AND ".join(parts), params
@@ -0,0 +1,243 @@
+# =============================================================================
+# Full-text (BM25) index module for RAG Assistant
+# =============================================================================
+# MiniLM similarity is great for paraphrases but weak on exact terms
+# ("Rerum Novarum", "Quadragesimo Anno", "fiduciary duty"). DuckDB's fts
+# extension keeps a BM25 index over the `text` column next to the vectors, and
+# RAGDatabase fuses both rankings with reciprocal-rank fusion (RRF):
+#   rrf(doc) = 1 / (RRF_K + vector_rank) + 1 / (RRF_K + bm25_rank)
+# With the HNSW index or the NumPy engine active, the vector ranking is their
+# top HYBRID_CANDIDATES and SQL only computes the BM25 top-N; otherwise both
+# rankings are scored exactly in ONE scan.
+#
+# Usage (run from the project folder, with the Streamlit app stopped):
+#   python -m backend.fts_index build     # create / refresh the BM25 index
+#   python -m backend.fts_index status    # is it there, is it fresh?
+# The index is NOT updated automatically on insert or update; backend.ingest
+# refreshes it after each run, and RAGDatabase ignores it while it is stale.
+# Staleness is judged by a fingerprint of the (id, text) pairs recorded at
+# build time, so edited or replaced chunks count too, not just the row count.
+# =============================================================================
+
+import argparse
+import json
+from datetime import datetime
+
+import duckdb
+
+from config import DEFAULT_DB_PATH, EMBEDDING_DIMENSION, HYBRID_CANDIDATES, RRF_K, VECTOR_TABLE_NAME
+from backend import ann_index
+
+INDEX_NAME = f"{VECTOR_TABLE_NAME}_fts"
+FTS_SCHEMA = f"fts_main_{VECTOR_TABLE_NAME}"
+META_TABLE = f"{VECTOR_TABLE_NAME}_fts_meta"
+
+
+def load_extension(conn, install: bool = False) -> bool:
+    """Load fts on a connection. Returns False if the extension is unavailable."""
+    try:
+        if install:
+            conn.execute("INSTALL fts")
+        conn.execute("LOAD fts")
+        return True
+    except duckdb.Error:
+        return False
+
+
+def detect_id_column(conn) -> str:
+    """The document id column: `id` when the table has one, else DuckDB's rowid."""
+    has_id = conn.execute(
+        "SELECT count(*) FROM duckdb_columns() WHERE table_name = ? AND column_name = 'id'", [VECTOR_TABLE_NAME]
+    ).fetchone()[0] > 0
+    return "id" if has_id else "rowid"
+
+
+def corpus_state(conn, id_col: str) -> dict:
+    """Row count, highest id and a fingerprint of every (id, text) pair."""
+    row = conn.execute(
+        f"SELECT count(*), max({id_col}), bit_xor(hash({id_col}, text))::VARCHAR FROM {VECTOR_TABLE_NAME}"
+    ).fetchone()
+    return {"id_column": id_col, "row_count": row[0], "max_id": row[1], "fingerprint": row[2]}
+
+
+def read_meta(conn) -> dict | None:
+    """Corpus state the index was built from, or None."""
+    has_meta = conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [META_TABLE]
+    ).fetchone()[0] > 0
+    if not has_meta:
+        return None
+    row = conn.execute(f"SELECT id_column, row_count, max_id, fingerprint, built_at FROM {META_TABLE}").fetchone()
+    if row is None:
+        return None
+    return {"id_column": row[0], "row_count": row[1], "max_id": row[2], "fingerprint": row[3], "built_at": str(row[4])}
+
+
+def index_status(conn) -> dict:
+    """Describe the BM25 index: 'exists', 'stale' (rows added, removed or edited since the build) and its metadata."""
+    exists = conn.execute(
+        "SELECT count(*) FROM duckdb_schemas() WHERE schema_name = ?", [FTS_SCHEMA]
+    ).fetchone()[0] > 0
+    meta = read_meta(conn) if exists else None
+    stale = meta is None
+    if meta is not None:
+        current = corpus_state(conn, detect_id_column(conn))
+        stale = any(meta[key] != value for key, value in current.items())
+    return {
+        "exists": exists,
+        "stale": stale,
+        "meta": meta,
+    }
+
+
+def enable_for_queries(conn) -> bool:
+    """True when fts is loaded and the index is fresh, i.e. hybrid search is safe."""
+    if not load_extension(conn):
+        return False
+    try:
+        status = index_status(conn)
+    except duckdb.Error:
+        return False
+    return status["exists"] and not status["stale"]
+
+
+def build_index(conn) -> None:
+    """(Re)create the BM25 index over `text` on a writable connection."""
+    id_col = detect_id_column(conn)
+    conn.execute(f"""
+        PRAGMA create_fts_index('{VECTOR_TABLE_NAME}', '{id_col}', 'text',
+                                stemmer = 'english', stopwords = 'english',
+                                strip_accents = 1, lower = 1, overwrite = 1)
+    """)
+    state = corpus_state(conn, id_col)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {META_TABLE} (
+            id_column VARCHAR, row_count BIGINT, max_id BIGINT, fingerprint VARCHAR, built_at TIMESTAMP
+        )
+    """)
+    conn.execute(f"DELETE FROM {META_TABLE}")
+    conn.execute(f"INSERT INTO {META_TABLE} VALUES (?, ?, ?, ?, ?)", [
+        state["id_column"], state["row_count"], state["max_id"], state["fingerprint"], datetime.now(),
+    ])
+
+
+def refresh_if_present(conn) -> None:
+    """Rebuild the index after new rows were written, if the store has one."""
+    if index_status(conn)["exists"] and load_extension(conn):
+        build_index(conn)
+
+
+def hybrid_search(execute, id_column: str, vector_hits: list[tuple] | None, query_embedding: list[float], query_text: str, top_k: int,
+                  candidates: int = HYBRID_CANDIDATES, rrf_k: int = RRF_K,
+                  where: str = "", where_params: list = ()) -> list[tuple]:
+    """
+    Fuse a vector ranking with the BM25 ranking using reciprocal-rank fusion.
+
+    With `vector_hits` from the HNSW index or the NumPy engine, only the BM25
+    top `candidates` are computed in SQL, so hybrid mode keeps that path's
+    speed. With vector_hits=None, both rankings are computed exactly in one
+    scan (cheaper than an exact vector scan followed by a BM25 scan).
+    Only documents in the top `candidates` of either ranking can be returned.
+
+    Args:
+        execute: Callable(sql, params) -> rows (e.g. ConnectionPool.execute).
+        id_column: "id" or "rowid" (the column the index was built on).
+        vector_hits: [(id, text, similarity), ...] best first, at least
+            `candidates` deep when the corpus has that many rows, or None.
+        where: Optional SQL predicate (backend.filters) restricting the
+            rankings; `vector_hits` must already be filtered the same way.
+
+    Returns:
+        [(id, text, similarity, bm25, rrf_score), ...] best first (bm25 is
+        None for rows outside the BM25 top `candidates` when `vector_hits`
+        is given).
+    """
+    if vector_hits is None:
+        return _fused_exact_search(execute, id_column, query_embedding, query_text, top_k, candidates, rrf_k,
+                                   where, where_params)
+
+    lexical = execute(f"""
+        SELECT id, bm25 FROM (
+            SELECT {id_column} AS id, {FTS_SCHEMA}.match_bm25({id_column}, ?) AS bm25
+            FROM {VECTOR_TABLE_NAME}
+            {f"WHERE {where}" if where else ""}
+        )
+        WHERE bm25 IS NOT NULL
+        ORDER BY bm25 DESC
+        LIMIT ?
+    """, [query_text, *where_params, candidates])
+
+    fused = {}
+    for rank, (chunk_id, text, similarity) in enumerate(vector_hits[:candidates], start=1):
+        fused[chunk_id] = {"text": text, "similarity": similarity, "bm25": None, "rrf": 1.0 / (rrf_k + rank)}
+    for rank, (chunk_id, bm25) in enumerate(lexical, start=1):
+        entry = fused.setdefault(chunk_id, {"text": None, "similarity": None, "bm25": None, "rrf": 0.0})
+        entry["bm25"] = bm25
+        entry["rrf"] += 1.0 / (rrf_k + rank)
+    top = sorted(fused.items(), key=lambda item: -item[1]["rrf"])[:top_k]
+
+    # Rows only BM25 found still need their text and vector similarity. (Rows outside the
+    # BM25 top `candidates` keep bm25=None: match_bm25 on an id list scans the whole index.)
+    missing = [chunk_id for chunk_id, entry in top if entry["text"] is None]
+    if missing:
+        # ids are integers, so inlining them is safe and lets DuckDB filter in the scan
+        id_list = ", ".join(str(int(chunk_id)) for chunk_id in missing)
+        for chunk_id, text, similarity in execute(f"""
+            SELECT {id_column}, text, array_cosine_similarity(embedding, ?::FLOAT[{EMBEDDING_DIMENSION}])
+            FROM {VECTOR_TABLE_NAME}
+            WHERE {id_column} IN ({id_list})
+        """, [query_embedding]):
+            fused[chunk_id]["text"], fused[chunk_id]["similarity"] = text, similarity
+    return [(chunk_id, entry["text"], entry["similarity"], entry["bm25"], entry["rrf"]) for chunk_id, entry in top]
+
+
+def _fused_exact_search(execute, id_column: str, query_embedding: list[float], query_text: str, top_k: int,
+                        candidates: int, rrf_k: int, where: str, where_params: list) -> list[tuple]:
+    """Both rankings over every (matching) row, fused in one SQL round trip."""
+    return execute(f"""
+        WITH scored AS (
+            SELECT {id_column} AS id, text,
+                   array_cosine_similarity(embedding, ?::FLOAT[{EMBEDDING_DIMENSION}]) AS similarity,
+                   {FTS_SCHEMA}.match_bm25({id_column}, ?) AS bm25
+            FROM {VECTOR_TABLE_NAME}
+            {f"WHERE {where}" if where else ""}
+        ),
+        ranked AS (
+            SELECT *,
+                   row_number() OVER (ORDER BY similarity DESC) AS vector_rank,
+                   CASE WHEN bm25 IS NULL THEN NULL
+                        ELSE row_number() OVER (ORDER BY bm25 DESC NULLS LAST) END AS lexical_rank
+            FROM scored
+        )
+        SELECT id, text, similarity, bm25,
+               1.0 / ({int(rrf_k)} + vector_rank)
+                 + coalesce(1.0 / ({int(rrf_k)} + lexical_rank), 0.0) AS rrf_score
+        FROM ranked
+        WHERE vector_rank <= ? OR lexical_rank <= ?
+        ORDER BY rrf_score DESC
+        LIMIT ?
+    """, [query_embedding, query_text, *where_params, candidates, candidates, top_k])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the BM25 full-text index for the RAG vector store.")
+    parser.add_argument("command", choices=["build", "status"])
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the .duckdb file")
+    args = parser.parse_args()
+
+    conn = duckdb.connect(args.db, read_only=args.command == "status")
+    try:
+        if args.command == "build":
+            if not load_extension(conn, install=True):
+                raise RuntimeError("DuckDB fts extension is not available")
+            # Tables with an HNSW index can only be altered with vss loaded
+            ann_index.load_extension(conn)
+            build_index(conn)
+            conn.execute("CHECKPOINT")
+        print(json.dumps(index_status(conn), indent=2, default=str))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
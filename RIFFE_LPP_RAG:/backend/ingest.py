@@ -0,0 +1,333 @@
+# =============================================================================
+# Ingestion pipeline for RAG Assistant
+# =============================================================================
+# Builds (or incrementally updates) the DuckDB vector store:
+#   source files -> chunker -> batched SentenceTransformer.encode -> Arrow bulk insert
+# - Streams documents and chunks, so memory stays flat as the corpus grows
+# - Every chunk is content-hashed; re-running only embeds new/changed chunks
+#   and removes chunks that disappeared from a re-ingested document; unchanged
+#   chunks still get their title / section / url / date / position updated
+# - Every chunk is tagged with the CST principles it mentions (backend.principles)
+# - Prints throughput (chunks/s) and peak memory so re-index jobs can be sized
+#
+# Usage (run from the project folder, with the Streamlit app stopped):
+#   python -m backend.ingest path/to/sources
+# Supported sources: .txt, .md (one document per file) and .jsonl
+# (one {"text", "doc", "title", "section", "url", "date"} record per line;
+# "date" is the document's YYYY-MM-DD date, used by retrieval date filters).
+# =============================================================================
+
+import argparse
+import hashlib
+import json
+import os
+import resource
+import sys
+import time
+from datetime import date
+from typing import Iterator
+
+import duckdb
+import pyarrow as pa
+
+from config import (
+    CHUNK_OVERLAP_CHARS,
+    CHUNK_SIZE_CHARS,
+    DEFAULT_DB_PATH,
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL_NAME,
+    INGEST_BATCH_SIZE,
+    VECTOR_TABLE_NAME,
+)
+from backend import ann_index, fts_index, principles
+
+# Column name -> DuckDB type for the vector table
+SCHEMA = {
+    "id": "BIGINT",
+    "doc": "VARCHAR",
+    "title": "VARCHAR",
+    "section": "VARCHAR",
+    "url": "VARCHAR",
+    "chunk_index": "INTEGER",
+    "doc_date": "DATE",
+    "content_hash": "VARCHAR",
+    "text": "VARCHAR",
+    "principles": "INTEGER",  # CST principle bitmask (backend.principles)
+    "embedding": f"FLOAT[{EMBEDDING_DIMENSION}]",
+}
+
+
+def parse_date(value) -> date | None:
+    """Document date from a source record ("YYYY-MM-DD..." or a date); None if missing or unreadable."""
+    if isinstance(value, date) or value is None:
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def content_hash(doc: str, text: str) -> str:
+    """Same value as DuckDB's md5(coalesce(doc, '') || chr(10) || text)."""
+    return hashlib.md5(f"{doc or ''}\n{text}".encode("utf-8")).hexdigest()
+
+
+# -----------------------------------------------------------------------------
+# Reading + chunking (generators, so nothing is held in memory at once)
+# -----------------------------------------------------------------------------
+def iter_documents(source: str) -> Iterator[dict]:
+    """Yield {'doc', 'title', 'section', 'url', 'text'} (+ optional 'date') records from a file or folder."""
+    paths = [source] if os.path.isfile(source) else sorted(
+        os.path.join(root, name) for root, _, names in os.walk(source) for name in names
+    )
+    for path in paths:
+        ext = os.path.splitext(path)[1].lower()
+        name = os.path.basename(path)
+        if ext in (".txt", ".md"):
+            with open(path, encoding="utf-8") as f:
+                yield {"doc": name, "title": os.path.splitext(name)[0], "section": "", "url": "", "text": f.read()}
+        elif ext == ".jsonl":
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        record.setdefault("doc", name)
+                        yield record
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> Iterator[tuple[str, str]]:
+    """
+    Split text into ~size-character chunks on paragraph boundaries.
+
+    Markdown headings are tracked so each chunk knows its section.
+    Paragraphs longer than `size` are cut with `overlap` characters of context.
+
+    Yields:
+        (section, chunk_text) tuples.
+    """
+    section = ""
+    buffer = []
+    buffer_len = 0
+
+    def flush():
+        return "\n\n".join(buffer).strip()
+
+    for paragraph in (p.strip() for p in text.split("\n\n")):
+        if not paragraph:
+            continue
+        if paragraph.startswith("#"):
+            if buffer:
+                yield section, flush()
+                buffer, buffer_len = [], 0
+            section = paragraph.lstrip("#").strip().splitlines()[0]
+            continue
+        if buffer and buffer_len + len(paragraph) > size:
+            yield section, flush()
+            buffer, buffer_len = [], 0
+        if len(paragraph) > size:
+            step = max(size - overlap, 1)
+            for start in range(0, len(paragraph), step):
+                yield section, paragraph[start:start + size]
+            continue
+        buffer.append(paragraph)
+        buffer_len += len(paragraph)
+    if buffer:
+        yield section, flush()
+
+
+def iter_chunks(source: str, size: int, overlap: int) -> Iterator[dict]:
+    for document in iter_documents(source):
+        doc = document.get("doc", "")
+        base_section = document.get("section", "")
+        for chunk_index, (section, text) in enumerate(chunk_text(document.get("text", ""), size, overlap)):
+            yield {
+                "doc": doc,
+                "title": document.get("title", ""),
+                "section": section or base_section,
+                "url": document.get("url", ""),
+                "chunk_index": chunk_index,
+                "doc_date": parse_date(document.get("date")),
+                "content_hash": content_hash(doc, text),
+                "text": text,
+            }
+
+
+# -----------------------------------------------------------------------------
+# Schema
+# -----------------------------------------------------------------------------
+def ensure_schema(conn) -> None:
+    """Create the vector table, or add the ingestion columns to an older table."""
+    columns_sql = ", ".join(f"{name} {dtype}" for name, dtype in SCHEMA.items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {VECTOR_TABLE_NAME} ({columns_sql})")
+
+    existing = {row[0] for row in conn.execute(
+        "SELECT column_name FROM duckdb_columns() WHERE table_name = ?", [VECTOR_TABLE_NAME]
+    ).fetchall()}
+    for name, dtype in SCHEMA.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {VECTOR_TABLE_NAME} ADD COLUMN {name} {dtype}")
+
+    # Backfill rows that were loaded before these columns existed
+    conn.execute(f"UPDATE {VECTOR_TABLE_NAME} SET id = rowid WHERE id IS NULL")
+    conn.execute(f"""
+        UPDATE {VECTOR_TABLE_NAME}
+        SET content_hash = md5(coalesce(doc, '') || chr(10) || text)
+        WHERE content_hash IS NULL
+    """)
+
+
+# -----------------------------------------------------------------------------
+# Pipeline
+# -----------------------------------------------------------------------------
+def peak_memory_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def ingest(source: str, db_path: str = DEFAULT_DB_PATH, size: int = CHUNK_SIZE_CHARS,
+           overlap: int = CHUNK_OVERLAP_CHARS, batch_size: int = INGEST_BATCH_SIZE) -> dict:
+    """
+    Stream `source` into the vector table, embedding only new/changed chunks.
+
+    Returns:
+        Report with chunk counts, throughput and peak memory.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    t0 = time.perf_counter()
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    conn = duckdb.connect(db_path)
+    report = {"chunks_seen": 0, "chunks_embedded": 0, "chunks_skipped": 0, "chunks_removed": 0,
+              "chunks_metadata_updated": 0}
+    try:
+        # Inserting into a table with an HNSW index needs vss loaded
+        ann_index.load_extension(conn)
+        ensure_schema(conn)
+        known = {row[0] for row in conn.execute(f"SELECT content_hash FROM {VECTOR_TABLE_NAME}").fetchall()}
+        next_id = conn.execute(f"SELECT coalesce(max(id) + 1, 0) FROM {VECTOR_TABLE_NAME}").fetchone()[0]
+        seen_docs = {}  # doc -> hashes produced this run
+        t_embed = 0.0
+
+        def write(batch: list[dict]) -> None:
+            nonlocal next_id, t_embed
+            t_start = time.perf_counter()
+            embeddings = model.encode([c["text"] for c in batch], batch_size=64, convert_to_numpy=True)
+            t_embed += time.perf_counter() - t_start
+            table = pa.table({
+                "id": pa.array(range(next_id, next_id + len(batch)), pa.int64()),
+                **{name: [c[name] for c in batch] for name in ("doc", "title", "section", "url")},
+                "chunk_index": pa.array([c["chunk_index"] for c in batch], pa.int32()),
+                "doc_date": pa.array([c["doc_date"] for c in batch], pa.date32()),
+                "content_hash": [c["content_hash"] for c in batch],
+                "text": [c["text"] for c in batch],
+                # Tagged here, not in iter_chunks, so skipped (unchanged) chunks cost nothing
+                "principles": pa.array([principles.principle_mask(c["text"]) for c in batch], pa.int32()),
+                "embedding": pa.FixedSizeListArray.from_arrays(
+                    pa.array(embeddings.astype("float32").ravel()), EMBEDDING_DIMENSION
+                ),
+            })
+            # One bulk INSERT ... SELECT over the Arrow batch (no row-by-row INSERTs)
+            conn.register("ingest_batch", table)
+            conn.execute(f"INSERT INTO {VECTOR_TABLE_NAME} ({', '.join(SCHEMA)}) SELECT {', '.join(SCHEMA)} FROM ingest_batch")
+            conn.unregister("ingest_batch")
+            next_id += len(batch)
+            report["chunks_embedded"] += len(batch)
+
+        def refresh_metadata(batch: list[dict]) -> None:
+            # The hash only covers doc + text (all the embedding depends on), so an
+            # unchanged chunk may still have a new title / url / date / position
+            table = pa.table({
+                "content_hash": [c["content_hash"] for c in batch],
+                **{name: [c[name] for c in batch] for name in ("title", "section", "url")},
+                "chunk_index": pa.array([c["chunk_index"] for c in batch], pa.int32()),
+                "doc_date": pa.array([c["doc_date"] for c in batch], pa.date32()),
+            })
+            conn.register("metadata_batch", table)
+            updated = conn.execute(f"""
+                UPDATE {VECTOR_TABLE_NAME} AS t
+                SET title = b.title, section = b.section, url = b.url,
+                    chunk_index = b.chunk_index, doc_date = b.doc_date
+                FROM metadata_batch b
+                WHERE t.content_hash = b.content_hash
+                  AND (t.title IS DISTINCT FROM b.title OR t.section IS DISTINCT FROM b.section
+                       OR t.url IS DISTINCT FROM b.url OR t.chunk_index IS DISTINCT FROM b.chunk_index
+                       OR t.doc_date IS DISTINCT FROM b.doc_date)
+                RETURNING t.id
+            """).fetchall()
+            conn.unregister("metadata_batch")
+            report["chunks_metadata_updated"] += len(updated)
+
+        batch, skipped = [], []
+        stored = set(known)  # hashes already in the table before this run
+        for chunk in iter_chunks(source, size, overlap):
+            report["chunks_seen"] += 1
+            seen_docs.setdefault(chunk["doc"], set()).add(chunk["content_hash"])
+            if chunk["content_hash"] in known:
+                report["chunks_skipped"] += 1
+                # First occurrence of a stored chunk: bring its metadata up to date
+                if chunk["content_hash"] in stored:
+                    stored.discard(chunk["content_hash"])
+                    skipped.append(chunk)
+                    if len(skipped) >= batch_size:
+                        refresh_metadata(skipped)
+                        skipped = []
+                continue
+            known.add(chunk["content_hash"])
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+        if batch:
+            write(batch)
+        if skipped:
+            refresh_metadata(skipped)
+
+        # Drop chunks of re-ingested documents that no longer exist (changed text)
+        for doc, hashes in seen_docs.items():
+            stale = conn.execute(f"""
+                DELETE FROM {VECTOR_TABLE_NAME}
+                WHERE doc = ? AND NOT list_contains(?, content_hash)
+                RETURNING id
+            """, [doc, list(hashes)]).fetchall()
+            report["chunks_removed"] += len(stale)
+
+        # Tag rows from before the principles column existed (or all rows, if the patterns changed)
+        report["chunks_tagged"] = principles.tag_chunks(conn)
+
+        # The BM25 index is not maintained on insert, so rebuild it if present
+        fts_index.refresh_if_present(conn)
+
+        # Keep the HNSW metadata in step (vss updated the graph as we inserted)
+        status = ann_index.index_status(conn)
+        if status["exists"] and status["meta"]:
+            ann_index.write_meta(conn, status["meta"]["m"], status["meta"]["ef_construction"])
+        conn.execute("CHECKPOINT")
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - t0
+    report.update({
+        "elapsed_s": round(elapsed, 3),
+        "embed_s": round(t_embed, 3),
+        "chunks_per_s": round(report["chunks_seen"] / elapsed, 1) if elapsed else 0.0,
+        "embedded_per_s": round(report["chunks_embedded"] / t_embed, 1) if t_embed else 0.0,
+        "peak_memory_mb": round(peak_memory_mb(), 1),
+    })
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or update the RAG vector store.")
+    parser.add_argument("source", help="File or folder of .txt/.md/.jsonl documents")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the .duckdb file")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE_CHARS)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_CHARS)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+    report = ingest(args.source, args.db, args.chunk_size, args.overlap, args.batch_size)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# =============================================================================
+# Multi-session load generator for the RAG Assistant Streamlit app
+# =============================================================================
+# Simulates many users chatting at once, against the local stub LLM
+# (backend.stub_llm), to pick a worker count / server size:
+#   - driver "apptest": each session is a streamlit.testing AppTest running
+#     app.py (full script reruns, widgets, session state, shared caches)
+#   - driver "agent":   headless; each session calls RAGAgent directly
+# For every concurrency level in --sessions it reports the request latency
+# distribution, error rate, RSS growth per session and per-stage timings;
+# stages that slow down as sessions are added are listed as contention points.
+#
+# Usage (run from the project folder):
+#   python -m backend.loadtest --sessions 1,10,20,50 --turns 3 --out load.json
+#   python -m backend.loadtest --driver agent --sessions 1,20,50   # no Streamlit needed
+# =============================================================================
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from config import BASE_DIR, DEFAULT_DB_PATH, DEFAULT_MAX_ITER, DEFAULT_MODEL
+from backend.benchmark import current_rss_mb, git_commit, load_questions, percentiles
+from backend.rate_limit import set_rate_limit
+from backend.stub_llm import StubLLMServer, StubResponder
+
+APP_PATH = os.path.join(BASE_DIR, "app.py")
+STAGES = ("setup", "embedding", "db", "retrieval", "rate_limit", "llm", "total")
+CONTENTION_RATIO = 1.5  # a stage is flagged when its p50 grows by this factor vs. the lowest level
+
+
+# -----------------------------------------------------------------------------
+# Session drivers: each returns {"first_run_s", "turns": [{"wall_s", "error", "timing"}]}
+# -----------------------------------------------------------------------------
+def run_app_session(questions: list[str], timeout_s: float, use_cache: bool, mode: str) -> dict:
+    """One browser-like session of app.py via streamlit.testing AppTest."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout_s)
+    t0 = time.perf_counter()
+    at.run()
+    first_run_s = time.perf_counter() - t0
+
+    next(w for w in at.text_input if w.label == "OpenAI API Key").input("stub")
+    next(w for w in at.checkbox if w.label.startswith("Reuse answers")).set_value(use_cache)
+    next(w for w in at.radio if w.label == "Retrieval Strategy").set_value(mode)
+    at.run()
+
+    turns = []
+    for question in questions:
+        t1 = time.perf_counter()
+        error = None
+        try:
+            at.chat_input[0].set_value(question).run()
+            if at.exception:
+                error = str(at.exception[0].value)
+            elif at.error:
+                error = str(at.error[0].value)
+        except Exception as e:  # script timeout, widget not found, ...
+            error = f"{type(e).__name__}: {e}"
+        wall_s = time.perf_counter() - t1
+        try:
+            timing = dict(at.session_state["last_run_stats"].get("timing", {}))
+        except (KeyError, AttributeError):
+            timing = {}
+        turns.append({"wall_s": wall_s, "error": error, "timing": timing})
+    return {"first_run_s": first_run_s, "turns": turns}
+
+
+def run_agent_session(agent, questions: list[str], use_cache: bool, mode: str) -> dict:
+    """Headless session: the same RAGAgent calls the app makes, without Streamlit."""
+    turns = []
+    for question in questions:
+        t1 = time.perf_counter()
+        error, timing = None, {}
+        try:
+            timing = agent.ask(question, use_cache=use_cache, mode=mode).get("timing", {})
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        turns.append({"wall_s": time.perf_counter() - t1, "error": error, "timing": timing})
+    return {"first_run_s": 0.0, "turns": turns}
+
+
+# -----------------------------------------------------------------------------
+# Load levels
+# -----------------------------------------------------------------------------
+def run_level(n_sessions: int, session_fn, questions: list[str], turns: int) -> dict:
+    """Run n_sessions concurrent sessions of `turns` questions each."""
+    # Rotate the question set so sessions don't all ask the same thing at once
+    plans = [[questions[(i + t) % len(questions)] for t in range(turns)] for i in range(n_sessions)]
+    rss_before = current_rss_mb()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sessions) as pool:
+        sessions = list(pool.map(session_fn, plans))
+    elapsed = time.perf_counter() - t0
+    rss_after = current_rss_mb()
+
+    all_turns = [turn for session in sessions for turn in session["turns"]]
+    ok = [turn for turn in all_turns if not turn["error"]]
+    stages = {}
+    for stage in STAGES:
+        samples = [turn["timing"][f"{stage}_s"] for turn in ok if f"{stage}_s" in turn["timing"]]
+        if samples:
+            stages[stage] = percentiles(samples)
+    # Time outside RAGAgent.ask: script reruns, rendering, queueing for the GIL
+    overhead = [turn["wall_s"] - turn["timing"]["total_s"] for turn in ok if "total_s" in turn["timing"]]
+    if overhead:
+        stages["outside_agent"] = percentiles(overhead)
+
+    return {
+        "sessions": n_sessions,
+        "requests": len(all_turns),
+        "errors": len(all_turns) - len(ok),
+        "error_rate": round((len(all_turns) - len(ok)) / len(all_turns), 4) if all_turns else 0.0,
+        "errors_sample": list(dict.fromkeys(turn["error"] for turn in all_turns if turn["error"]))[:5],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency": percentiles([turn["wall_s"] for turn in ok]),
+        "first_run": percentiles([session["first_run_s"] for session in sessions]),
+        "stages": stages,
+        "rss_before_mb": round(rss_before, 1),
+        "rss_after_mb": round(rss_after, 1),
+        "rss_growth_per_session_mb": round((rss_after - rss_before) / n_sessions, 2),
+    }
+
+
+def contention_points(levels: list[dict]) -> list[dict]:
+    """Stages whose p50 grows by CONTENTION_RATIO or more from the lowest to the highest level."""
+    if len(levels) < 2:
+        return []
+    low, high = levels[0]["stages"], levels[-1]["stages"]
+    points = []
+    for stage, summary in high.items():
+        base = low.get(stage, {}).get("p50_ms")
+        if base and summary.get("p50_ms", 0) / base >= CONTENTION_RATIO:
+            points.append({
+                "stage": stage,
+                "p50_ms": [low[stage]["p50_ms"], summary["p50_ms"]],
+                "sessions": [levels[0]["sessions"], levels[-1]["sessions"]],
+                "slowdown": round(summary["p50_ms"] / base, 2),
+            })
+    return sorted(points, key=lambda p: -p["slowdown"])
+
+
+def loadtest(levels: list[int], turns: int = 3, driver: str = "apptest", mode: str = "fast",
+             use_cache: bool = False, rpm: int | None = None, timeout_s: float = 300.0,
+             responder: StubResponder | None = None, db_path: str = DEFAULT_DB_PATH,
+             questions: list[str] | None = None) -> dict:
+    """Start the stub LLM, run each concurrency level in turn and build the report."""
+    questions = questions or load_questions()
+    if "backend.agent" in sys.modules:
+        raise RuntimeError("Run the load test in a fresh process: backend.agent was imported before the stub URL was set")
+    server = StubLLMServer(responder or StubResponder())
+    base_url = server.start()
+    # backend.agent reads LLM_BASE_URL when app.py first imports it (inside AppTest)
+    config.LLM_BASE_URL = base_url
+    set_rate_limit(rpm)
+    try:
+        if driver == "apptest":
+            def session_fn(plan):
+                return run_app_session(plan, timeout_s, use_cache, mode)
+        else:
+            from backend.agent import RAGAgent
+            from backend.database import RAGDatabase
+            agent = RAGAgent(RAGDatabase(db_path), DEFAULT_MODEL, DEFAULT_MAX_ITER, api_key="stub", base_url=base_url)
+
+            def session_fn(plan):
+                return run_agent_session(agent, plan, use_cache, mode)
+
+        rss_start = current_rss_mb()
+        results = [run_level(n, session_fn, questions, turns) for n in levels]
+        from backend.agent import runtime_stats
+        return {
+            "meta": {
+                "commit": git_commit(),
+                "driver": driver,
+                "mode": mode,
+                "turns_per_session": turns,
+                "use_cache": use_cache,
+                "rpm_limit": rpm,
+                "stub": {"latency_ms": server.responder.latency_s * 1000, "tokens_per_s": server.responder.tokens_per_s},
+                "cpu_count": os.cpu_count(),
+            },
+            "rss_start_mb": round(rss_start, 1),
+            "levels": results,
+            "contention_points": contention_points(results),
+            "runtimes": runtime_stats(),
+            "stub_requests": server.responder.requests,
+        }
+    finally:
+        server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent chat-session load test against a stub LLM.")
+    parser.add_argument("--sessions", default="1,10,20,50", help="Comma-separated concurrency levels")
+    parser.add_argument("--turns", type=int, default=3, help="Questions asked per session")
+    parser.add_argument("--driver", choices=["apptest", "agent"], default="apptest")
+    parser.add_argument("--mode", choices=["fast", "agentic"], default="fast")
+    parser.add_argument("--use-cache", action="store_true", help="Allow semantic answer cache hits")
+    parser.add_argument("--rpm", type=int, default=None, help="Shared LLM requests/minute limit (default: none)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="AppTest script run timeout (s)")
+    parser.add_argument("--stub-latency-ms", type=float, default=500.0)
+    parser.add_argument("--stub-tokens-per-s", type=float, default=80.0)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the .duckdb file (agent driver)")
+    parser.add_argument("--questions", help=".txt or .jsonl question set (default: feedback.jsonl + app.py examples)")
+    parser.add_argument("--out", help="Write the JSON report here (also printed)")
+    args = parser.parse_args()
+
+    report = loadtest(
+        levels=[int(n) for n in args.sessions.split(",") if n.strip()],
+        turns=args.turns,
+        driver=args.driver,
+        mode=args.mode,
+        use_cache=args.use_cache,
+        rpm=args.rpm,
+        timeout_s=args.timeout,
+        responder=StubResponder(latency_ms=args.stub_latency_ms, tokens_per_s=args.stub_tokens_per_s),
+        db_path=args.db,
+        questions=load_questions(args.questions),
+    )
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# =============================================================================
+# ONNX Runtime query-embedding backend for RAG Assistant
+# =============================================================================
+# PyTorch SentenceTransformer is a big share of query latency and resident
+# memory on CPU-only hosts (importing torch alone is hundreds of MB). This
+# backend runs an exported ONNX copy of the SAME model (EMBEDDING_MODEL_NAME)
+# with onnxruntime + tokenizers only: no torch import at query time.
+#   - export: SentenceTransformer(..., backend="onnx") writes onnx/model.onnx
+#     plus tokenizer/pooling config; a dynamically int8-quantized copy
+#     (onnx/model_qint8.onnx) is written next to it
+#   - check: both ONNX files are compared with the torch model on chunk texts
+#     from the database + example questions. The minimum cosine goes into
+#     parity.json; RAGDatabase only uses a file that is within
+#     ONNX_COSINE_TOLERANCE, so vectors already stored as FLOAT[384] stay valid
+#   - bench: encode latency + RSS for torch / onnx / onnx int8, each in a
+#     fresh process so one backend's imports don't inflate another's RSS
+# Documents are still embedded by backend.ingest with the torch model; only
+# QUERY encoding is switched (EMBEDDING_BACKEND = "onnx" in config.py).
+#
+# Usage (run from the project folder; export/check need sentence-transformers[onnx]):
+#   python -m backend.onnx_embedding export
+#   python -m backend.onnx_embedding check
+#   python -m backend.onnx_embedding bench --out embed_bench.json
+# =============================================================================
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from config import (
+    DEFAULT_DB_PATH,
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL_NAME,
+    ONNX_COSINE_TOLERANCE,
+    ONNX_INTRA_OP_THREADS,
+    ONNX_MODEL_DIR,
+    ONNX_QUANTIZED,
+    VECTOR_TABLE_NAME,
+)
+
+ONNX_FILE = os.path.join("onnx", "model.onnx")
+ONNX_QINT8_FILE = os.path.join("onnx", "model_qint8.onnx")
+PARITY_FILE = "parity.json"
+DEFAULT_MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's sentence_bert_config value
+PARITY_SAMPLE_TEXTS = 200  # chunk texts sampled from the database for the check
+
+
+def onnx_file(quantized: bool) -> str:
+    return ONNX_QINT8_FILE if quantized else ONNX_FILE
+
+
+def _read_json(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class OnnxEncoder:
+    """Drop-in for SentenceTransformer.encode() backed by onnxruntime."""
+
+    backend = "onnx"
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = ONNX_QUANTIZED,
+                 threads: int | None = ONNX_INTRA_OP_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir
+        self.file = onnx_file(quantized)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        # Parallelism comes from intra-op threads; concurrent queries each call run()
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(os.path.join(model_dir, self.file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.output_names = [o.name for o in self.session.get_outputs()]
+
+        # Same tokenization, pooling and normalization as the sentence-transformers pipeline
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        max_length = _read_json(os.path.join(model_dir, "sentence_bert_config.json")).get(
+            "max_seq_length", DEFAULT_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        if self.tokenizer.padding is None:
+            pad_id = self.tokenizer.token_to_id("[PAD]")
+            self.tokenizer.enable_padding(pad_id=pad_id or 0, pad_token="[PAD]")
+        pooling = _read_json(os.path.join(model_dir, "1_Pooling", "config.json"))
+        self.cls_pooling = bool(pooling.get("pooling_mode_cls_token")) and not pooling.get("pooling_mode_mean_tokens")
+        modules = _read_json(os.path.join(model_dir, "modules.json"))
+        self.normalize = any(m.get("type", "").endswith("Normalize") for m in modules) if modules else True
+
+    def encode(self, texts: list[str], batch_size: int = 32, **_) -> np.ndarray:
+        """Embed texts; returns a float32 (n, dim) array like SentenceTransformer.encode."""
+        if isinstance(texts, str):
+            texts = [texts]
+        out = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(list(texts[start:start + batch_size]))
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+            if "sentence_embedding" in self.output_names:
+                vectors = self.session.run(["sentence_embedding"], feeds)[0]
+            else:
+                tokens = self.session.run(self.output_names[:1], feeds)[0]
+                if self.cls_pooling:
+                    vectors = tokens[:, 0]
+                else:
+                    mask = feeds["attention_mask"][..., None].astype(tokens.dtype)
+                    vectors = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out.append(vectors.astype(np.float32))
+        vectors = np.vstack(out) if out else np.zeros((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        if self.normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+
+def load_encoder(model_dir: str = ONNX_MODEL_DIR, quantized: bool = ONNX_QUANTIZED,
+                 threads: int | None = ONNX_INTRA_OP_THREADS,
+                 tolerance: float = ONNX_COSINE_TOLERANCE) -> OnnxEncoder:
+    """
+    Load the exported model, refusing files that failed (or never ran) the parity check.
+
+    Raises:
+        ValueError: parity.json is missing, for another model, or over tolerance.
+        ImportError / OSError: onnxruntime / tokenizers / the model files missing.
+    """
+    file = onnx_file(quantized)
+    parity = _read_json(os.path.join(model_dir, PARITY_FILE))
+    result = parity.get("files", {}).get(file)
+    if parity.get("model") != EMBEDDING_MODEL_NAME or result is None:
+        raise ValueError(f"No parity check for {file} against {EMBEDDING_MODEL_NAME}; run `python -m backend.onnx_embedding check`")
+    if result["dimension"] != EMBEDDING_DIMENSION:
+        raise ValueError(f"{file} produces {result['dimension']}-d vectors, the store has {EMBEDDING_DIMENSION}")
+    if result["min_cosine"] < 1.0 - tolerance:
+        raise ValueError(f"{file} min cosine vs. torch {result['min_cosine']:.4f} is outside tolerance {tolerance}")
+    return OnnxEncoder(model_dir, quantized, threads)
+
+
+# -----------------------------------------------------------------------------
+# Export + parity check
+# -----------------------------------------------------------------------------
+def sample_texts(db_path: str = DEFAULT_DB_PATH, n: int = PARITY_SAMPLE_TEXTS) -> list[str]:
+    """Example questions + a sample of stored chunk texts (long inputs exercise truncation)."""
+    from backend.benchmark import load_questions
+
+    texts = load_questions()
+    if os.path.exists(db_path):
+        import duckdb
+
+        conn = duckdb.connect(db_path, read_only=True)
+        try:
+            texts += [row[0] for row in conn.execute(
+                f"SELECT text FROM {VECTOR_TABLE_NAME} USING SAMPLE {int(n)} ROWS"
+            ).fetchall()]
+        finally:
+            conn.close()
+    return texts
+
+
+def check(model_dir: str = ONNX_MODEL_DIR, texts: list[str] | None = None) -> dict:
+    """Compare every exported ONNX file with the torch model; writes parity.json."""
+    from sentence_transformers import SentenceTransformer
+
+    texts = texts or sample_texts()
+    reference = SentenceTransformer(EMBEDDING_MODEL_NAME).encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    files = {}
+    for quantized in (False, True):
+        file = onnx_file(quantized)
+        if not os.path.exists(os.path.join(model_dir, file)):
+            continue
+        vectors = OnnxEncoder(model_dir, quantized).encode(texts)
+        cosines = np.sum(vectors * reference, axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+        files[file] = {
+            "dimension": int(vectors.shape[1]),
+            "min_cosine": round(float(cosines.min()), 6),
+            "mean_cosine": round(float(cosines.mean()), 6),
+            "within_tolerance": bool(cosines.min() >= 1.0 - ONNX_COSINE_TOLERANCE),
+        }
+    report = {"model": EMBEDDING_MODEL_NAME, "texts": len(texts), "tolerance": ONNX_COSINE_TOLERANCE, "files": files}
+    with open(os.path.join(model_dir, PARITY_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def export(model_dir: str = ONNX_MODEL_DIR, quantize: bool = True, texts: list[str] | None = None) -> dict:
+    """Export EMBEDDING_MODEL_NAME to ONNX (+ int8 copy) and run the parity check."""
+    from sentence_transformers import SentenceTransformer
+
+    SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx").save_pretrained(model_dir)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        # Dynamic quantization: int8 weights, activations quantized per batch at run time
+        quantize_dynamic(os.path.join(model_dir, ONNX_FILE), os.path.join(model_dir, ONNX_QINT8_FILE),
+                         weight_type=QuantType.QInt8)
+    return check(model_dir, texts)
+
+
+# -----------------------------------------------------------------------------
+# Latency + RSS benchmark (one fresh process per backend)
+# -----------------------------------------------------------------------------
+_PROBE = """
+import json, sys, time
+from backend.benchmark import current_rss_mb, percentiles
+backend, quantized, threads, repeat, model_dir = sys.argv[1], sys.argv[2] == "1", int(sys.argv[3]) or None, int(sys.argv[4]), sys.argv[5]
+texts = json.loads(sys.stdin.read())
+rss_before = current_rss_mb()
+t0 = time.perf_counter()
+if backend == "torch":
+    from sentence_transformers import SentenceTransformer
+    from config import EMBEDDING_MODEL_NAME
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+else:
+    from backend.onnx_embedding import OnnxEncoder
+    model = OnnxEncoder(model_dir, quantized, threads)
+model.encode(texts[:1])
+load_s = time.perf_counter() - t0
+single = []
+for _ in range(repeat):
+    for text in texts:
+        t1 = time.perf_counter()
+        model.encode([text])
+        single.append(time.perf_counter() - t1)
+t2 = time.perf_counter()
+model.encode(texts)
+batch_s = time.perf_counter() - t2
+print(json.dumps({
+    "load_s": round(load_s, 3),
+    "query_latency": percentiles(single),
+    "batch_texts_per_s": round(len(texts) / batch_s, 1) if batch_s else None,
+    "rss_model_mb": round(current_rss_mb() - rss_before, 1),
+    "rss_total_mb": round(current_rss_mb(), 1),
+}))
+"""
+
+
+def bench(texts: list[str] | None = None, repeat: int = 3, threads: int | None = ONNX_INTRA_OP_THREADS,
+          backends: tuple = ("torch", "onnx", "onnx-int8"), model_dir: str = ONNX_MODEL_DIR) -> dict:
+    """Encode latency (per query and batched) and RSS for each backend."""
+    from config import BASE_DIR
+
+    texts = texts or sample_texts()
+    results = {}
+    for backend in backends:
+        proc = subprocess.run(
+            [sys.executable, "-c", _PROBE, backend.split("-")[0], "1" if backend.endswith("int8") else "0",
+             str(threads or 0), str(repeat), model_dir],
+            input=json.dumps(texts), cwd=BASE_DIR, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            results[backend] = {"error": lines[-1] if lines else "failed"}
+        else:
+            results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {"model": EMBEDDING_MODEL_NAME, "texts": len(texts), "repeat": repeat,
+            "intra_op_threads": threads, "cpu_count": os.cpu_count(), "backends": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ONNX Runtime query-embedding backend.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="Export the model to ONNX (+ int8) and check parity")
+    export_cmd.add_argument("--no-quantize", action="store_true")
+    sub.add_parser("check", help="Re-run the cosine parity check against torch")
+    bench_cmd = sub.add_parser("bench", help="Encode latency + RSS: torch vs. onnx vs. onnx int8")
+    bench_cmd.add_argument("--repeat", type=int, default=3)
+    bench_cmd.add_argument("--threads", type=int, default=ONNX_INTRA_OP_THREADS, help="onnxruntime intra-op threads")
+    bench_cmd.add_argument("--backends", default="torch,onnx,onnx-int8")
+    for cmd in (export_cmd, sub.choices["check"], bench_cmd):
+        cmd.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+        cmd.add_argument("--db", default=DEFAULT_DB_PATH, help="Sample chunk texts from this database")
+        cmd.add_argument("--out", help="Write the JSON report here (also printed)")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.db)
+    if args.command == "export":
+        report = export(args.model_dir, not args.no_quantize, texts)
+    elif args.command == "check":
+        report = check(args.model_dir, texts)
+    else:
+        report = bench(texts, args.repeat, args.threads, tuple(b for b in args.backends.split(",") if b), args.model_dir)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# =============================================================================
+# Passage text cache for RAG Assistant
+# =============================================================================
+# Chat messages keep only compact source records (chunk id, similarity, a few
+# metadata fields); the passage text is fetched by id when someone opens a
+# sources panel. Those fetches go through this LRU so re-opening a panel, or
+# another session looking at the same popular chunks, doesn't hit DuckDB.
+# - Bounded by total characters, not entries (passages vary a lot in length)
+# - Keys include the corpus version, so re-ingesting invalidates every entry
+# - Thread-safe, one per RAGDatabase (which Streamlit shares across sessions)
+# =============================================================================
+
+import threading
+from collections import OrderedDict
+
+
+class PassageCache:
+    """LRU of chunk id -> passage text, capped at max_chars characters in total."""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._entries = OrderedDict()  # (corpus version, id) -> text
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, version: str, ids: list) -> tuple[dict, list]:
+        """Returns ({id: text} for cached ids, [ids that must be fetched])."""
+        found, missing = {}, []
+        with self._lock:
+            for chunk_id in ids:
+                key = (version, chunk_id)
+                text = self._entries.get(key)
+                if text is None:
+                    missing.append(chunk_id)
+                    continue
+                self._entries.move_to_end(key)
+                found[chunk_id] = text
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, version: str, texts: dict) -> None:
+        with self._lock:
+            for chunk_id, text in texts.items():
+                if len(text) > self.max_chars:
+                    continue
+                key = (version, chunk_id)
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self._chars -= len(previous)
+                self._entries[key] = text
+                self._chars += len(text)
+            while self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "max_chars": self.max_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
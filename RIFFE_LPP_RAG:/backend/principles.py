@@ -0,0 +1,236 @@
+# =============================================================================
+# Catholic Social Teaching (CST) principle tagging for RAG Assistant
+# =============================================================================
+# The app shows which CST principles an answer touches. That used to mean
+# lowercasing the answer plus every retrieved passage and running ~30 separate
+# re.search calls over the blob, on every response. Now:
+#   - each chunk is tagged ONCE, at ingestion, and the tags are stored as a
+#     bitmask in the `principles` column (bit i = i-th entry of CST_PRINCIPLES)
+#   - answer text is scanned with ONE precompiled combined pattern; per-principle
+#     patterns only run at the few positions where it found something
+#   - detection for a response = OR of the sources' stored masks + the answer's mask
+#   - retrieval can filter on the column (RAGDatabase.query(filters={"principles": [...]}))
+# The tags record a fingerprint of the patterns; when CST_PRINCIPLES changes,
+# the stored tags are treated as stale (the app scans source text instead)
+# until they are rebuilt.
+#
+# Usage (run from the project folder, with the Streamlit app stopped):
+#   python -m backend.principles build     # tag untagged (or stale) chunks
+#   python -m backend.principles status    # tag counts per principle
+#   python -m backend.principles tag "text to check"
+# =============================================================================
+
+import argparse
+import hashlib
+import json
+import re
+from datetime import datetime
+
+import duckdb
+import pyarrow as pa
+
+from config import DEFAULT_DB_PATH, VECTOR_TABLE_NAME
+
+PRINCIPLES_COLUMN = "principles"
+META_TABLE = f"{VECTOR_TABLE_NAME}_principles_meta"
+TAG_BATCH_ROWS = 2048  # Chunks tagged per UPDATE when backfilling
+
+CST_PRINCIPLES = {
+    "Human Dignity": [
+        r"\bdignity\b", r"\bhuman person\b", r"\bimage of God\b", r"\bintrinsic worth\b"
+    ],
+    "Common Good": [
+        r"\bcommon good\b", r"\bsocial good\b", r"\bpublic good\b"
+    ],
+    "Solidarity": [
+        r"\bsolidarity\b", r"\bmutual responsibility\b", r"\bwe are one\b"
+    ],
+    "Subsidiarity": [
+        r"\bsubsidiarity\b", r"\bclosest level\b", r"\blocal level\b", r"\bdecentraliz"
+    ],
+    "Preferential Option for the Poor": [
+        r"\bpreferential option\b", r"\bpoor\b", r"\bvulnerable\b", r"\bmarginalized\b"
+    ],
+    "Stewardship / Care for Creation": [
+        r"\bstewardship\b", r"\bcreation\b", r"\benvironment\b", r"\bsustainab"
+    ],
+    "Rights & Responsibilities": [
+        r"\bright(s)?\b", r"\bresponsibilit(y|ies)\b", r"\bdut(y|ies)\b"
+    ],
+    "Dignity of Work & Rights of Workers": [
+        r"\bdignity of work\b", r"\bworker(s)?\b", r"\blabor\b", r"\bjust wage\b", r"\bunion\b"
+    ],
+}
+
+PRINCIPLE_NAMES = list(CST_PRINCIPLES)
+ALL_PRINCIPLES = (1 << len(PRINCIPLE_NAMES)) - 1
+# Stored as INTEGER, so at most 31 principles
+assert len(PRINCIPLE_NAMES) <= 31
+
+# Where ANY principle pattern matches (zero-width, so overlapping matches like
+# "mutual responsibility" / "responsibility" are not skipped) ...
+_ANY = re.compile("(?=" + "|".join(p for patterns in CST_PRINCIPLES.values() for p in patterns) + ")", re.IGNORECASE)
+# ... then which principles match at that position
+_EACH = [(1 << bit, re.compile("|".join(patterns), re.IGNORECASE))
+         for bit, patterns in enumerate(CST_PRINCIPLES.values())]
+
+
+def fingerprint() -> str:
+    """Hash of the principle names + patterns the stored tags were computed with."""
+    return hashlib.md5(json.dumps(CST_PRINCIPLES, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def principle_mask(text: str) -> int:
+    """Bitmask of the CST principles mentioned in `text` (one pass over the text)."""
+    mask = 0
+    for hit in _ANY.finditer(text or ""):
+        start = hit.start()
+        for bit, pattern in _EACH:
+            if not mask & bit and pattern.match(text, start):
+                mask |= bit
+        if mask == ALL_PRINCIPLES:
+            break
+    return mask
+
+
+def principle_names(mask: int) -> list[str]:
+    """Principle names for a bitmask, in CST_PRINCIPLES order."""
+    return [name for bit, name in enumerate(PRINCIPLE_NAMES) if mask & (1 << bit)]
+
+
+def mask_for(names) -> int:
+    """Bitmask for principle names (raises KeyError for an unknown name)."""
+    mask = 0
+    for name in names:
+        if name not in CST_PRINCIPLES:
+            raise KeyError(f"Unknown CST principle: {name!r}")
+        mask |= 1 << PRINCIPLE_NAMES.index(name)
+    return mask
+
+
+# -----------------------------------------------------------------------------
+# DuckDB: principles column
+# -----------------------------------------------------------------------------
+def read_meta(conn) -> str | None:
+    """Fingerprint the stored tags were computed with, or None."""
+    has_meta = conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [META_TABLE]
+    ).fetchone()[0] > 0
+    if not has_meta:
+        return None
+    row = conn.execute(f"SELECT fingerprint FROM {META_TABLE}").fetchone()
+    return row[0] if row else None
+
+
+def is_tagged(conn) -> bool:
+    """True when the column exists, was filled with the current patterns and has no gaps."""
+    columns = {row[0] for row in conn.execute(
+        "SELECT column_name FROM duckdb_columns() WHERE table_name = ?", [VECTOR_TABLE_NAME]
+    ).fetchall()}
+    if PRINCIPLES_COLUMN not in columns:
+        return False
+    try:
+        if read_meta(conn) != fingerprint():
+            return False
+        untagged = conn.execute(
+            f"SELECT count(*) FROM {VECTOR_TABLE_NAME} WHERE {PRINCIPLES_COLUMN} IS NULL"
+        ).fetchone()[0]
+    except duckdb.Error:
+        return False
+    return untagged == 0
+
+
+def tag_chunks(conn) -> int:
+    """
+    Add the principles column if needed and tag every chunk that lacks tags.
+
+    All chunks are re-tagged when CST_PRINCIPLES changed since the last run
+    (backend.ingest writes tags for new chunks itself, so normally only rows
+    from before the column existed are NULL).
+
+    Returns:
+        Number of chunks tagged.
+    """
+    conn.execute(f"ALTER TABLE {VECTOR_TABLE_NAME} ADD COLUMN IF NOT EXISTS {PRINCIPLES_COLUMN} INTEGER")
+    stored = read_meta(conn)
+    if stored is not None and stored != fingerprint():
+        conn.execute(f"UPDATE {VECTOR_TABLE_NAME} SET {PRINCIPLES_COLUMN} = NULL")
+
+    id_column = "id" if conn.execute(
+        "SELECT count(*) FROM duckdb_columns() WHERE table_name = ? AND column_name = 'id'", [VECTOR_TABLE_NAME]
+    ).fetchone()[0] else "rowid"
+    ids = [row[0] for row in conn.execute(
+        f"SELECT {id_column} FROM {VECTOR_TABLE_NAME} WHERE {PRINCIPLES_COLUMN} IS NULL"
+    ).fetchall()]
+    for start in range(0, len(ids), TAG_BATCH_ROWS):
+        # ids are integers, so inlining them is safe and lets DuckDB filter in the scan
+        id_list = ", ".join(str(int(chunk_id)) for chunk_id in ids[start:start + TAG_BATCH_ROWS])
+        rows = conn.execute(
+            f"SELECT {id_column}, text FROM {VECTOR_TABLE_NAME} WHERE {id_column} IN ({id_list})"
+        ).fetchall()
+        batch = pa.table({
+            "id": pa.array([row[0] for row in rows], pa.int64()),
+            "mask": pa.array([principle_mask(row[1]) for row in rows], pa.int32()),
+        })
+        conn.register("principles_batch", batch)
+        conn.execute(f"""
+            UPDATE {VECTOR_TABLE_NAME} SET {PRINCIPLES_COLUMN} = b.mask
+            FROM principles_batch b
+            WHERE {VECTOR_TABLE_NAME}.{id_column} = b.id
+        """)
+        conn.unregister("principles_batch")
+
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (fingerprint VARCHAR, tagged_at TIMESTAMP)")
+    conn.execute(f"DELETE FROM {META_TABLE}")
+    conn.execute(f"INSERT INTO {META_TABLE} VALUES (?, ?)", [fingerprint(), datetime.now()])
+    return len(ids)
+
+
+def status(conn) -> dict:
+    """Chunks per principle (from the stored tags) and whether the tags are current."""
+    if not is_tagged(conn):
+        return {"tagged": False, "stored_fingerprint": read_meta(conn), "fingerprint": fingerprint()}
+    sums = ", ".join(
+        f"count(*) FILTER (WHERE ({PRINCIPLES_COLUMN} & {1 << bit}) <> 0)" for bit in range(len(PRINCIPLE_NAMES))
+    )
+    row = conn.execute(f"SELECT count(*), count(*) FILTER (WHERE {PRINCIPLES_COLUMN} = 0), {sums} FROM {VECTOR_TABLE_NAME}").fetchone()
+    return {
+        "tagged": True,
+        "fingerprint": fingerprint(),
+        "chunks": row[0],
+        "untouched_chunks": row[1],
+        "chunks_per_principle": dict(zip(PRINCIPLE_NAMES, row[2:])),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="CST principle tags for the RAG vector store.")
+    parser.add_argument("command", choices=["build", "status", "tag"])
+    parser.add_argument("text", nargs="?", help="Text to tag (tag command)")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the .duckdb file")
+    args = parser.parse_args()
+
+    if args.command == "tag":
+        print(json.dumps(principle_names(principle_mask(args.text or "")), indent=2))
+        return
+    if args.command == "build":
+        from backend import ann_index
+        conn = duckdb.connect(args.db)
+        try:
+            # Updating a table that has an HNSW index needs vss loaded
+            ann_index.load_extension(conn)
+            tagged = tag_chunks(conn)
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+        print(f"Tagged {tagged} chunks in {args.db}")
+    else:
+        conn = duckdb.connect(args.db, read_only=True)
+        try:
+            print(json.dumps(status(conn), indent=2))
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
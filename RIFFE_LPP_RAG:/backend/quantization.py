@@ -0,0 +1,240 @@
+# =============================================================================
+# Quantized embedding storage for RAG Assistant
+# =============================================================================
+# FLOAT[384] costs 1.5 KB per chunk, so scan cost + file size grow fast.
+# A compact copy of each embedding is used for the FIRST pass only:
+#   - int8  : value * 127 rounded (embeddings are L2-normalized, so |v| <= 1)
+#             -> 384 B per chunk (4x smaller).
+#   - float16: 768 B per chunk (2x smaller).
+# The top k * oversample candidates are then RESCORED against the full-precision
+# vectors, so the final ranking is exact for everything that made the cut.
+# The app only does this in the NumPy backend (RETRIEVAL_BACKEND = "numpy"),
+# which quantizes its in-memory export; nothing extra is stored in DuckDB.
+# `compare` also measures a DuckDB int8 two-pass (an int8 copy in a TEMP table):
+# DuckDB has no int8 distance function and the per-row TINYINT[] -> FLOAT[]
+# cast makes it SLOWER than the exact FLOAT[384] scan (100k chunks: ~445 ms
+# vs ~355 ms; NumPy int8: ~24 ms), so queries never use it.
+#
+# Usage (run from the project folder):
+#   python -m backend.quantization compare   # recall + latency vs. the exact scan
+# =============================================================================
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+import duckdb
+import numpy as np
+
+from config import (
+    DEFAULT_DB_PATH,
+    DEFAULT_TOP_K,
+    EMBEDDING_DIMENSION,
+    QUANTIZATION_OVERSAMPLE,
+    VECTOR_TABLE_NAME,
+)
+
+INT8_TABLE = "embedding_i8_tmp"  # TEMP table `compare` quantizes into
+INT8_SCALE = 127.0
+SCAN_BLOCK_ROWS = 8192  # NumPy first pass scores the matrix in blocks of this many rows
+
+
+def quantize(matrix: np.ndarray, kind: str) -> np.ndarray:
+    """Quantize an (n, dim) matrix of normalized embeddings to int8 or float16."""
+    if kind == "int8":
+        return np.clip(np.rint(matrix * INT8_SCALE), -127, 127).astype(np.int8)
+    if kind == "float16":
+        return matrix.astype(np.float16)
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+# -----------------------------------------------------------------------------
+# DuckDB: temporary int8 copy + two-pass query (compare only)
+# -----------------------------------------------------------------------------
+def create_int8_table(conn, id_column: str) -> None:
+    """Quantize every embedding into the TEMP table INT8_TABLE (dropped with the connection)."""
+    # Normalize first so the int8 values use the full [-127, 127] range
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {INT8_TABLE} AS
+        SELECT {id_column} AS id, list_transform(
+            embedding::FLOAT[],
+            x -> CAST(round(greatest(least(
+                x / sqrt(list_dot_product(embedding::FLOAT[], embedding::FLOAT[])), 1), -1) * {INT8_SCALE}) AS TINYINT)
+        )::TINYINT[{EMBEDDING_DIMENSION}] AS embedding_i8
+        FROM {VECTOR_TABLE_NAME}
+    """)
+
+
+def search_int8(execute, id_column: str, query_embedding: list[float], top_k: int,
+                oversample: int = QUANTIZATION_OVERSAMPLE) -> list[tuple]:
+    """
+    Two-pass search in DuckDB over the INT8_TABLE copy (benchmark only, see the module header).
+
+    Pass 1 only reads the 384-byte int8 column to shortlist top_k * oversample
+    candidates; pass 2 reads full-precision embeddings for that shortlist only.
+
+    Args:
+        execute: Callable(sql, params) -> rows, on a connection where
+            create_int8_table() has run.
+        id_column: "id" or "rowid".
+
+    Returns:
+        [(id, text, similarity), ...] best first.
+    """
+    vector_type = f"FLOAT[{EMBEDDING_DIMENSION}]"
+    candidates = execute(f"""
+        SELECT id
+        FROM {INT8_TABLE}
+        ORDER BY array_inner_product(embedding_i8::{vector_type}, ?::{vector_type}) DESC
+        LIMIT ?
+    """, [query_embedding, top_k * oversample])
+    if not candidates:
+        return []
+    # ids are integers, so inlining them is safe and lets DuckDB push the filter into the scan
+    id_list = ", ".join(str(int(row[0])) for row in candidates)
+    return execute(f"""
+        SELECT {id_column}, text, array_cosine_similarity(embedding, ?::{vector_type}) as similarity
+        FROM {VECTOR_TABLE_NAME}
+        WHERE {id_column} IN ({id_list})
+        ORDER BY similarity DESC
+        LIMIT ?
+    """, [query_embedding, top_k])
+
+
+# -----------------------------------------------------------------------------
+# NumPy: quantized first pass + exact rescoring
+# -----------------------------------------------------------------------------
+def search_matrix(compact: np.ndarray, full: np.ndarray, queries: np.ndarray, top_k: int,
+                  oversample: int = QUANTIZATION_OVERSAMPLE) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Shortlist with the compact matrix, then rescore against the full matrix.
+
+    Args:
+        compact: (n, dim) int8 or float16 matrix (may be a memmap).
+        full: (n, dim) float32 normalized matrix (may be a memmap).
+        queries: (q, dim) float32 normalized query vectors.
+
+    Returns:
+        One (row_indices, similarities) pair per query, best first.
+    """
+    n = compact.shape[0]
+    shortlist = min(top_k * oversample, n)
+    scale = INT8_SCALE if compact.dtype == np.int8 else 1.0
+
+    # Score in blocks so only one block is ever upcast to float32
+    scores = np.empty((queries.shape[0], n), dtype=np.float32)
+    for start in range(0, n, SCAN_BLOCK_ROWS):
+        block = np.asarray(compact[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+        scores[:, start:start + block.shape[0]] = queries @ block.T / scale
+
+    results = []
+    for query, row_scores in zip(queries, scores):
+        if shortlist < n:
+            candidates = np.argpartition(-row_scores, shortlist - 1)[:shortlist]
+        else:
+            candidates = np.arange(n)
+        candidates = np.sort(candidates)  # sorted fancy-indexing reads the memmap sequentially
+        exact = np.asarray(full[candidates], dtype=np.float32) @ query
+        order = np.argsort(-exact)[:top_k]
+        results.append((candidates[order], exact[order]))
+    return results
+
+
+# -----------------------------------------------------------------------------
+# Recall / latency comparison
+# -----------------------------------------------------------------------------
+def _latency_summary(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+    }
+
+
+def compare(db_path: str = DEFAULT_DB_PATH, n_queries: int = 50, top_k: int = DEFAULT_TOP_K,
+            oversample: int = QUANTIZATION_OVERSAMPLE) -> dict:
+    """
+    Compare quantized search against the exact array_cosine_similarity scan.
+
+    Stored chunk embeddings are used as the query set, so no embedding model
+    (or network access) is needed.
+
+    Returns:
+        recall@k and latency for each path, plus bytes per chunk.
+    """
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        columns = {row[0] for row in conn.execute(
+            "SELECT column_name FROM duckdb_columns() WHERE table_name = ?", [VECTOR_TABLE_NAME]
+        ).fetchall()}
+        id_column = "id" if "id" in columns else "rowid"
+        rows = conn.execute(f"SELECT {id_column}, embedding FROM {VECTOR_TABLE_NAME} ORDER BY {id_column}").fetchall()
+        ids = np.array([row[0] for row in rows])
+        full = np.asarray([row[1] for row in rows], dtype=np.float32)
+        full /= np.maximum(np.linalg.norm(full, axis=1, keepdims=True), 1e-12)
+        queries = [rows[i][1] for i in random.Random(0).sample(range(len(rows)), min(n_queries, len(rows)))]
+
+        def execute(sql, params):
+            return conn.execute(sql, params).fetchall()
+
+        exact_ids, exact_t = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            found = execute(f"""
+                SELECT {id_column}, array_cosine_similarity(embedding, ?::FLOAT[{EMBEDDING_DIMENSION}]) as similarity
+                FROM {VECTOR_TABLE_NAME} ORDER BY similarity DESC LIMIT ?
+            """, [q, top_k])
+            exact_t.append(time.perf_counter() - t0)
+            exact_ids.append({row[0] for row in found})
+
+        report = {
+            "chunks": len(rows),
+            "top_k": top_k,
+            "oversample": oversample,
+            "duckdb_exact": {**_latency_summary(exact_t), "recall": 1.0, "bytes_per_chunk": EMBEDDING_DIMENSION * 4},
+        }
+
+        def recall(found_ids: list[set]) -> float:
+            return round(statistics.mean(len(f & e) / max(len(e), 1) for f, e in zip(found_ids, exact_ids)), 4)
+
+        # int8 copy lives in a TEMP table so the store itself is never modified
+        create_int8_table(conn, id_column)
+        found_ids, times = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            found = search_int8(execute, id_column, q, top_k, oversample)
+            times.append(time.perf_counter() - t0)
+            found_ids.append({row[0] for row in found})
+        report["duckdb_int8"] = {**_latency_summary(times), "recall": recall(found_ids), "bytes_per_chunk": EMBEDDING_DIMENSION}
+
+        query_matrix = np.asarray(queries, dtype=np.float32)
+        query_matrix /= np.maximum(np.linalg.norm(query_matrix, axis=1, keepdims=True), 1e-12)
+        for kind in ("int8", "float16"):
+            compact = quantize(full, kind)
+            found_ids, times = [], []
+            for q in query_matrix:
+                t0 = time.perf_counter()
+                (rows_idx, _), = search_matrix(compact, full, q[None, :], top_k, oversample)
+                times.append(time.perf_counter() - t0)
+                found_ids.append(set(ids[rows_idx].tolist()))
+            report[f"numpy_{kind}"] = {**_latency_summary(times), "recall": recall(found_ids), "bytes_per_chunk": compact.itemsize * EMBEDDING_DIMENSION}
+        return report
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Quantized embedding storage for the RAG vector store.")
+    parser.add_argument("command", choices=["compare"])
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the .duckdb file")
+    parser.add_argument("--queries", type=int, default=50, help="Number of sample queries for compare")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--oversample", type=int, default=QUANTIZATION_OVERSAMPLE)
+    args = parser.parse_args()
+
+    print(json.dumps(compare(args.db, args.queries, args.top_k, args.oversample), indent=2))
+
+if __name__ == "__main__":
+    main()
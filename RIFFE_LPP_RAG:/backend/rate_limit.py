@@ -0,0 +1,80 @@
+# =============================================================================
+# Shared LLM rate limiter for RAG Assistant
+# =============================================================================
+# The OpenAI rate limit applies to the whole API key, not to one Crew, so a
+# per-Crew max_rpm stops being a limit as soon as several Crews run at once
+# (concurrent sessions, RAGAgent.ask_many). One RateLimiter per process gates
+# EVERY LLM call the agent runtimes make: at most N calls in any 60 s window.
+# Callers block in acquire(), which is fine because LLM calls already run in
+# worker threads.
+# =============================================================================
+
+import threading
+import time
+from collections import deque
+
+from config import LLM_REQUESTS_PER_MINUTE
+
+WINDOW_S = 60.0
+
+
+class RateLimiter:
+    """Sliding-window limit of max_per_minute calls, shared across threads."""
+
+    def __init__(self, max_per_minute: int):
+        self.max_per_minute = max_per_minute
+        self._calls = deque()  # monotonic timestamps of calls in the current window
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waits = 0
+        self.waited_s = 0.0
+
+    def acquire(self) -> float:
+        """Block until a call is allowed. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= WINDOW_S:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_per_minute:
+                    self._calls.append(now)
+                    self.acquired += 1
+                    if waited:
+                        self.waits += 1
+                        self.waited_s += waited
+                    return waited
+                delay = WINDOW_S - (now - self._calls[0])
+            time.sleep(delay)
+            waited += delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_per_minute": self.max_per_minute,
+                "in_window": len(self._calls),
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "waited_s": round(self.waited_s, 3),
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter | None:
+    """Return the process-wide limiter, or None if LLM_REQUESTS_PER_MINUTE is None."""
+    global _limiter
+    if LLM_REQUESTS_PER_MINUTE is None:
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE)
+        return _limiter
+
+def set_rate_limit(max_per_minute: int | None) -> None:
+    """Replace the process-wide limit (e.g. lift it for local benchmarks). Affects LLMs created afterwards."""
+    global _limiter, LLM_REQUESTS_PER_MINUTE
+    with _limiter_lock:
+        LLM_REQUESTS_PER_MINUTE = max_per_minute
+        _limiter = None
@@ -0,0 +1,168 @@
+# =============================================================================
+# Startup timing and background warm-up for RAG Assistant
+# =============================================================================
+# A cold start used to import crewai and sentence_transformers (torch) and
+# load the MiniLM model before the first pixel was drawn. Now app.py:
+#   - wraps its heavy imports in timed_import() so the cost of each is recorded
+#   - imports backend.agent (crewai) only when an agent is actually needed
+#   - starts a background thread (start_warmup) that loads the embedding
+#     model, runs one dummy encode and pre-imports crewai while the sidebar renders
+#   - mark()s milestones ("first_paint", "db_ready", "first_answer")
+# report() returns all of it (seconds since this module was imported, i.e.
+# the first line of the first app.py run); the app shows it in the debug panel.
+#
+# Regression check from the command line (fresh interpreter each time):
+#   python -m backend.startup                 # import time per module (each is the
+#                                             # extra cost on top of the ones before)
+#   python -m backend.startup --warmup --out startup.json
+# =============================================================================
+
+import argparse
+import importlib
+import json
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Heavy modules in the order app.py imports them
+APP_IMPORTS = ("streamlit", "pandas", "backend.database", "backend.agent")
+
+_T0 = time.perf_counter()
+_lock = threading.Lock()
+_imports = {}  # module name -> seconds the (first, real) import took
+_marks = {}    # milestone -> seconds since _T0
+_warmup = {}   # warm-up task -> {"s": seconds, "error": ...}
+_warmup_thread = None
+
+
+def elapsed() -> float:
+    return time.perf_counter() - _T0
+
+
+@contextmanager
+def timed_import(name: str):
+    """
+    Time the import statement(s) in the block under `name`.
+
+    Only recorded when `name` was not imported yet, so Streamlit reruns
+    (where every import is a dict lookup) don't overwrite the cold-start cost.
+    """
+    cold = name not in sys.modules
+    t0 = time.perf_counter()
+    yield
+    if cold:
+        with _lock:
+            _imports.setdefault(name, time.perf_counter() - t0)
+
+
+def preload(name: str):
+    """Import a module by name (timed), e.g. from the warm-up thread."""
+    with timed_import(name):
+        return importlib.import_module(name)
+
+
+def mark(event: str) -> None:
+    """Record the first time a milestone is reached in this process."""
+    with _lock:
+        _marks.setdefault(event, elapsed())
+
+
+def start_warmup(tasks: dict) -> bool:
+    """
+    Run {name: callable} one after another in a daemon thread, once per process.
+
+    Errors are recorded, not raised: the same work runs again (lazily, in the
+    foreground) the first time it is really needed.
+
+    Returns:
+        True if this call started the thread.
+    """
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is not None:
+            return False
+
+        def run() -> None:
+            for name, task in tasks.items():
+                t0 = time.perf_counter()
+                error = None
+                try:
+                    task()
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                with _lock:
+                    _warmup[name] = {"s": time.perf_counter() - t0, "error": error}
+            mark("warmup_done")
+
+        _warmup_thread = threading.Thread(target=run, name="rag-warmup", daemon=True)
+        _warmup_thread.start()
+        return True
+
+
+def wait_for_warmup(timeout: float | None = None) -> bool:
+    """Block until the warm-up thread finished (True) or the timeout passed."""
+    thread = _warmup_thread
+    if thread is None:
+        return True
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def report() -> dict:
+    """Import times, milestones and warm-up results, in seconds."""
+    with _lock:
+        return {
+            "since_start_s": round(elapsed(), 3),
+            "imports_s": {name: round(s, 3) for name, s in sorted(_imports.items(), key=lambda kv: -kv[1])},
+            "marks_s": {name: round(s, 3) for name, s in sorted(_marks.items(), key=lambda kv: kv[1])},
+            "warmup": {name: {**result, "s": round(result["s"], 3)} for name, result in _warmup.items()},
+        }
+
+
+# -----------------------------------------------------------------------------
+# CLI: measure a cold start in a fresh interpreter
+# -----------------------------------------------------------------------------
+_PROBE = """
+import json, sys
+from backend import startup
+for name in sys.argv[2:]:
+    startup.preload(name)
+startup.mark("imports_done")
+if sys.argv[1] == "1":
+    from backend.database import warm_up_model
+    startup.start_warmup({"embedding_model": warm_up_model})
+    startup.wait_for_warmup()
+print(json.dumps(startup.report()))
+"""
+
+
+def measure(modules: tuple = APP_IMPORTS, warmup: bool = False, cwd: str | None = None) -> dict:
+    """Import `modules` in order in a new Python process and return its report()."""
+    if cwd is None:
+        from config import BASE_DIR
+        cwd = BASE_DIR
+    proc = subprocess.run([sys.executable, "-c", _PROBE, "1" if warmup else "0", *modules],
+                          cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "probe failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold-start import and warm-up times for the RAG app.")
+    parser.add_argument("modules", nargs="*", default=list(APP_IMPORTS), help="Modules to import, in order")
+    parser.add_argument("--warmup", action="store_true", help="Also time loading the embedding model + one encode")
+    parser.add_argument("--out", help="Write the JSON report here (also printed)")
+    args = parser.parse_args()
+
+    text = json.dumps(measure(tuple(args.modules), args.warmup), indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# =============================================================================
+# Local OpenAI-compatible stub LLM for RAG Assistant benchmarks
+# =============================================================================
+# Answers POST /v1/chat/completions (streaming or not) with canned text after
+# an artificial delay, so the RAG stack's own overhead can be measured
+# without calling OpenAI. Standard library only.
+# - Agentic (ReAct) prompts get "Action: Query RAG Database" first, and a
+#   "Final Answer: ..." once the tool result is in the conversation, so the
+#   real tool + RAGDatabase path runs
+# - Canned answers can be matched on a substring of the question
+# - latency_ms = time to first token, tokens_per_s = generation speed
+#
+# Usage (run from the project folder):
+#   python -m backend.stub_llm --port 8765 --latency-ms 300 --tokens-per-s 80
+# then export RAG_LLM_BASE_URL=http://127.0.0.1:8765/v1 (backend.benchmark
+# starts its own stub automatically).
+# =============================================================================
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = (
+    "Direct Answer: Catholic Social Teaching asks the firm to weigh this decision against human dignity "
+    "and the common good [Passage 1].\n"
+    "Evidence from Sources: The retrieved passages stress the priority of labor over capital [Passage 1] "
+    "and the duties of ownership [Passage 2].\n"
+    "Ethical Analysis: Solidarity and subsidiarity both apply here.\n"
+    "Practical Implications: Boards should document stakeholder impacts before acting.\n"
+    "Confidence & Limits: Moderate; based on the passages retrieved."
+)
+CHARS_PER_TOKEN = 4
+_QUESTION = re.compile(r"USER QUESTION:\s*(.+?)\n\s*\n", re.S)
+
+
+class StubResponder:
+    """Decides what the stub says and how slowly it says it."""
+
+    def __init__(self, responses: list[dict] | None = None, default_answer: str = DEFAULT_ANSWER,
+                 latency_ms: float = 200.0, tokens_per_s: float = 100.0):
+        self.responses = responses or []  # [{"match": substring of the question, "answer": text}]
+        self.default_answer = default_answer
+        self.latency_s = latency_ms / 1000
+        self.tokens_per_s = tokens_per_s
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _content(message: dict) -> str:
+        content = message.get("content") or ""
+        if isinstance(content, list):  # [{"type": "text", "text": ...}]
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return content
+
+    def reply(self, messages: list[dict]) -> str:
+        with self._lock:
+            self.requests += 1
+        text = "\n".join(self._content(m) for m in messages)
+        match = _QUESTION.search(text)
+        question = match.group(1).strip() if match else ""
+        answer = next((r["answer"] for r in self.responses if r.get("match", "").lower() in question.lower()),
+                      self.default_answer)
+
+        # ReAct prompt (agentic mode): search first, answer once a tool result came back
+        if "Action Input:" in text:
+            # crewai appends each Action + Observation as an assistant message
+            if not any(m.get("role") == "assistant" for m in messages):
+                return (
+                    "Thought: I should search the document collection first.\n"
+                    "Action: Query RAG Database\n"
+                    f"Action Input: {json.dumps({'query': question or 'Catholic Social Teaching business ethics'})}"
+                )
+            return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+        return answer
+
+    def pieces(self, text: str) -> list[str]:
+        """Split text into ~token-sized pieces for streaming."""
+        return re.findall(r"\S+\s*|\s+", text)
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_s if self.tokens_per_s else 0.0
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "StubLLM/1.0"
+
+    def log_message(self, format, *args):  # keep benchmark output clean
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        stub: StubResponder = self.server.stub
+        messages = request.get("messages", [])
+        model = request.get("model", "stub")
+        text = stub.reply(messages)
+        prompt_tokens = stub.count_tokens("\n".join(stub._content(m) for m in messages))
+        completion_tokens = stub.count_tokens(text)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        time.sleep(stub.latency_s)  # time to first token
+        if not request.get("stream"):
+            pieces = stub.pieces(text)
+            time.sleep(stub.token_delay() * len(pieces))
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        # Server-sent events; HTTP/1.0 so closing the connection ends the stream
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def event(delta: dict, finish_reason: str | None = None, with_usage: bool = False) -> None:
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if with_usage:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for piece in stub.pieces(text):
+            event({"content": piece})
+            time.sleep(stub.token_delay())
+        event({}, "stop", with_usage=True)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class StubLLMServer:
+    """Run the stub in a background thread: `with StubLLMServer(...) as url: ...`"""
+
+    def __init__(self, responder: StubResponder | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.responder = responder or StubResponder()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self.responder
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def load_responses(path: str | None) -> tuple[list[dict], str]:
+    """Read canned responses: {"default": text, "responses": [{"match", "answer"}]}."""
+    if not path:
+        return [], DEFAULT_ANSWER
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("responses", []), data.get("default", DEFAULT_ANSWER)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=100.0, help="Generation speed (0 = instant)")
+    parser.add_argument("--responses", help='JSON file: {"default": ..., "responses": [{"match": ..., "answer": ...}]}')
+    args = parser.parse_args()
+
+    responses, default_answer = load_responses(args.responses)
+    server = StubLLMServer(StubResponder(responses, default_answer, args.latency_ms, args.tokens_per_s),
+                           args.host, args.port)
+    print(f"Stub LLM listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
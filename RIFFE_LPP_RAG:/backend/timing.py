@@ -0,0 +1,68 @@
+# =============================================================================
+# Per-request stage timing for RAG Assistant
+# =============================================================================
+# RAGAgent.ask() opens a StageTimer for the request; code deeper down
+# (embedding, DuckDB / NumPy search) adds its elapsed time to whichever timer
+# is active in the current context, without the timer being passed around.
+#   with timing.collect() as timer:
+#       ...
+#       with timing.stage("embedding"):
+#           model.encode(...)
+#   timer.as_dict()  ->  {"embedding_s": 0.012, "embedding_calls": 1, ...}
+# Outside collect() stage() only measures, so the database can be used on
+# its own (CLI tools, benchmarks) at no extra cost.
+# =============================================================================
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class StageTimer:
+    """Accumulated seconds and call counts per named stage."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def as_dict(self) -> dict:
+        """{'<stage>_s': total seconds, '<stage>_calls': count} for every stage seen."""
+        with self._lock:
+            out = {}
+            for name, seconds in self.seconds.items():
+                out[f"{name}_s"] = seconds
+                out[f"{name}_calls"] = self.calls[name]
+            return out
+
+
+_active: ContextVar[StageTimer | None] = ContextVar("rag_stage_timer", default=None)
+
+
+@contextmanager
+def collect():
+    """Make a fresh StageTimer the active one for the enclosed block."""
+    timer = StageTimer()
+    token = _active.set(timer)
+    try:
+        yield timer
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block and add it to the active timer, if any."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer = _active.get()
+        if timer is not None:
+            timer.add(name, time.perf_counter() - t0)
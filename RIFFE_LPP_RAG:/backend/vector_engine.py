@@ -0,0 +1,183 @@
+# =============================================================================
+# In-memory NumPy vector engine for RAG Assistant
+# =============================================================================
+# For a corpus of a few thousand chunks the fastest retrieval path is a plain
+# float32 matrix of L2-normalized embeddings:
+#   - ONE matrix-vector product scores every chunk (cosine = dot product)
+#   - np.argpartition picks the top k without sorting the whole corpus
+# The matrix is exported once from DuckDB (still the source of truth) into an
+# .npy file that we memory-map, plus a JSON sidecar mapping row -> id/text.
+# The export is redone automatically whenever the .duckdb file changes.
+# =============================================================================
+
+import json
+import os
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+from config import EMBEDDING_DIMENSION, EMBEDDING_MODEL_NAME
+from backend import quantization
+
+
+def corpus_version(db_path: str) -> str:
+    """
+    Cheap fingerprint of the database file (and its WAL, if any).
+
+    Changes whenever the vector store is rewritten, so exports, indexes and
+    caches derived from it know they must be refreshed.
+    """
+    parts = []
+    for path in (db_path, f"{db_path}.wal"):
+        try:
+            info = os.stat(path)
+            parts.append(f"{info.st_mtime_ns}:{info.st_size}")
+        except OSError:
+            parts.append("-")
+    return "|".join(parts)
+
+
+class EngineSnapshot(NamedTuple):
+    """One loaded export. Replaced as a whole on reload, never modified in place."""
+    matrix: np.ndarray  # np.memmap of shape (n_chunks, EMBEDDING_DIMENSION)
+    compact: np.ndarray | None  # np.memmap of the quantized matrix, if enabled
+    ids: list
+    texts: list
+    row_of: dict  # id -> matrix row
+    version: str
+
+
+class NumpyVectorEngine:
+    """Memory-mapped embedding matrix + ID-to-text sidecar exported from DuckDB."""
+
+    def __init__(self, db_path: str, export_dir: str, quantization_kind: str | None = None):
+        stem = os.path.splitext(os.path.basename(db_path))[0]
+        self.db_path = db_path
+        self.matrix_path = os.path.join(export_dir, f"{stem}.embeddings.npy")
+        self.sidecar_path = os.path.join(export_dir, f"{stem}.chunks.json")
+        # Optional compact copy ("int8" / "float16") used for the first pass
+        self.quantization_kind = quantization_kind
+        self.compact_path = os.path.join(export_dir, f"{stem}.embeddings.{quantization_kind}.npy") if quantization_kind else None
+        # Published with ONE assignment, so a reader that takes a local reference
+        # never mixes the matrix of one export with the ids/texts of another
+        self.snapshot: EngineSnapshot | None = None
+        self._lock = threading.Lock()
+
+    def ensure_fresh(self, fetch_rows) -> None:
+        """
+        Make sure the in-memory matrix matches the current database file.
+
+        Args:
+            fetch_rows: Callable returning [(id, text, embedding), ...] from DuckDB.
+                Only called when the export is missing or out of date.
+        """
+        current = corpus_version(self.db_path)
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == current:
+            return
+        with self._lock:
+            snapshot = self.snapshot
+            if snapshot is not None and snapshot.version == current:
+                return
+            if not self._load(current):
+                self.export(fetch_rows(), current)
+                self._load(current)
+
+    def export(self, rows: list[tuple], version: str) -> None:
+        """Write normalized embeddings (.npy) and the id/text sidecar (.json)."""
+        matrix = np.asarray([row[2] for row in rows], dtype=np.float32).reshape(len(rows), EMBEDDING_DIMENSION)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        # Write to temp files then rename, so a reader never sees half an export
+        tmp_matrix = f"{self.matrix_path}.tmp.npy"
+        np.save(tmp_matrix, matrix)
+        tmp_sidecar = f"{self.sidecar_path}.tmp"
+        with open(tmp_sidecar, "w", encoding="utf-8") as f:
+            json.dump({
+                "corpus_version": version,
+                "embedding_model": EMBEDDING_MODEL_NAME,
+                "embedding_dimension": EMBEDDING_DIMENSION,
+                "ids": [row[0] for row in rows],
+                "texts": [row[1] for row in rows],
+            }, f, ensure_ascii=False)
+        if self.compact_path:
+            tmp_compact = f"{self.compact_path}.tmp.npy"
+            np.save(tmp_compact, quantization.quantize(matrix, self.quantization_kind))
+            os.replace(tmp_compact, self.compact_path)
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_sidecar, self.sidecar_path)
+
+    def _load(self, version: str) -> bool:
+        """Memory-map an existing export. Returns False if it is missing or stale."""
+        required = [self.matrix_path, self.sidecar_path] + ([self.compact_path] if self.compact_path else [])
+        if not all(os.path.exists(path) for path in required):
+            return False
+        with open(self.sidecar_path, encoding="utf-8") as f:
+            sidecar = json.load(f)
+        if (
+            sidecar.get("corpus_version") != version
+            or sidecar.get("embedding_model") != EMBEDDING_MODEL_NAME
+            or sidecar.get("embedding_dimension") != EMBEDDING_DIMENSION
+        ):
+            return False
+        ids = sidecar["ids"]
+        self.snapshot = EngineSnapshot(
+            matrix=np.load(self.matrix_path, mmap_mode="r"),
+            compact=np.load(self.compact_path, mmap_mode="r") if self.compact_path else None,
+            ids=ids,
+            texts=sidecar["texts"],
+            row_of={chunk_id: row for row, chunk_id in enumerate(ids)},
+            version=version,
+        )
+        return True
+
+    def vectors(self, ids: list) -> dict:
+        """Return {id: normalized embedding} for the ids present in the export."""
+        snap = self.snapshot
+        if snap is None:
+            return {}
+        return {chunk_id: np.asarray(snap.matrix[snap.row_of[chunk_id]]) for chunk_id in ids if chunk_id in snap.row_of}
+
+    def texts_for(self, ids: list) -> dict:
+        """Return {id: text} for the ids present in the export."""
+        snap = self.snapshot
+        if snap is None:
+            return {}
+        return {chunk_id: snap.texts[snap.row_of[chunk_id]] for chunk_id in ids if chunk_id in snap.row_of}
+
+    def search(self, query_embeddings: list[list[float]], top_k: int) -> list[list[tuple]]:
+        """
+        Score a batch of queries against every chunk.
+
+        Returns:
+            One list per query of (id, text, similarity) tuples, best first.
+        """
+        snap = self.snapshot  # one export for the whole call, even if a reload happens meanwhile
+        if snap is None or len(snap.ids) == 0:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1.0, norms)
+        if snap.compact is not None:
+            # Shortlist on the compact matrix, rescore the shortlist at full precision
+            return [
+                [(snap.ids[i], snap.texts[i], float(score)) for i, score in zip(rows, sims)]
+                for rows, sims in quantization.search_matrix(snap.compact, snap.matrix, queries, top_k)
+            ]
+
+        scores = queries @ snap.matrix.T  # (n_queries, n_chunks)
+
+        k = min(top_k, scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+
+        results = []
+        for row_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-row_scores[candidates])]
+            results.append([(snap.ids[i], snap.texts[i], float(row_scores[i])) for i in ranked])
+        return results
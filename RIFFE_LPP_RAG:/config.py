@@ -13,13 +13,94 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_DB_PATH = os.path.join(BASE_DIR, "backend", "handbag_vector.duckdb")
 # DEFAULT_DB_PATH = "backend/handbag_vector.duckdb" # UPDATE WITH YOUR .duckdb file for database.py
+VECTOR_TABLE_NAME = "handbag_rag_documents" # UPDATE WITH YOUR table name for database.py
 DEFAULT_TOP_K = 10 # Default top k neighbors parameter for app.py
 DEFAULT_MAX_ITER = 3 # Default iterations for app.py
+DEFAULT_ANSWER_MODE = "fast" # "fast" = retrieve once, then one LLM call; "agentic" = agent decides when/what to retrieve
 DEFAULT_MODEL = "gpt-4o-mini" # Default model for app.py
+LLM_BASE_URL = os.environ.get("RAG_LLM_BASE_URL") # OpenAI-compatible endpoint; unset = api.openai.com (e.g. backend.stub_llm)
+DB_HEALTHCHECK_INTERVAL_S = 30.0 # Seconds between "SELECT 1" checks on a pooled DuckDB cursor
+STARTUP_WARMUP = True # app.py loads the embedding model + imports crewai in a background thread while the UI renders
 
 # Model Options
 AVAILABLE_MODELS = ["gpt-4o-mini"] # List of all available models for app.py
 
+# Chat UI
+CHAT_PAGE_TURNS = 5 # Most recent question/answer turns drawn on each rerun; older ones load a page at a time
+CHAT_MAX_TURNS = 200 # Turns kept per session; older ones are dropped (bounds session memory, see README)
+
 # Embedding Model
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2" # UPDATE TO YOUR MODEL
 EMBEDDING_DIMENSION = 384 # UPDATE TO YOUR MODEL
+EMBEDDING_CACHE_SIZE = 2048 # Max cached query embeddings (LRU)
+EMBEDDING_CACHE_PATH = os.path.join(BASE_DIR, "backend", "embedding_cache.npz") # Set to None to keep the cache in memory only
+PASSAGE_CACHE_MAX_CHARS = 4_000_000 # Passage text fetched by chunk id for source panels (shared LRU, ~4-8 MB)
+
+# Query embedding backend (python -m backend.onnx_embedding export / check / bench)
+# "torch": sentence-transformers (PyTorch)
+# "onnx":  onnxruntime on an exported copy of the same model, no torch import;
+#          falls back to "torch" unless the export passed the cosine check below
+EMBEDDING_BACKEND = "torch"
+ONNX_MODEL_DIR = os.path.join(BASE_DIR, "backend", "onnx_model") # Written by the export command
+ONNX_QUANTIZED = True # Use the int8 dynamically quantized model (smaller + faster on CPU)
+ONNX_INTRA_OP_THREADS = None # onnxruntime threads per encode; None = onnxruntime default (all cores)
+ONNX_COSINE_TOLERANCE = 0.02 # Every check text must have cosine >= 1 - this vs. the torch vector
+
+# Approximate Nearest Neighbour (HNSW) index via DuckDB's vss extension
+# Build with: python -m backend.ann_index build
+USE_ANN_INDEX = True # Falls back to an exact scan when the index is missing or stale
+HNSW_M = 16 # Graph degree: higher = better recall, bigger index
+HNSW_EF_CONSTRUCTION = 128 # Candidate list size while building
+HNSW_EF_SEARCH = 64 # Candidate list size while querying (recall vs. latency)
+
+# Retrieval Backend
+# "duckdb": similarity search in SQL (exact scan or HNSW index)
+# "numpy":  export embeddings once to a memory-mapped .npy matrix and score in NumPy
+#           (re-exported automatically whenever the .duckdb file changes)
+RETRIEVAL_BACKEND = "duckdb"
+VECTOR_EXPORT_DIR = os.path.join(BASE_DIR, "backend") # Where the .npy matrix + .json sidecar are written
+
+# Ingestion (python -m backend.ingest path/to/sources)
+CHUNK_SIZE_CHARS = 1200 # Target characters per chunk
+CHUNK_OVERLAP_CHARS = 200 # Overlap when a single paragraph must be split
+INGEST_BATCH_SIZE = 256 # Chunks per encode + bulk insert batch
+
+# Quantized embeddings (python -m backend.quantization compare)
+# None: full-precision FLOAT[384] only
+# Applied by the NumPy backend only (RETRIEVAL_BACKEND = "numpy"); DuckDB scans are exact
+# "int8": 4x smaller first-pass scan
+# "float16": 2x smaller first-pass scan
+EMBEDDING_QUANTIZATION = None
+QUANTIZATION_OVERSAMPLE = 4 # Rescore top_k * this many candidates at full precision
+
+# Semantic answer cache for RAGAgent.ask (paraphrases reuse a recent answer)
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_PATH = os.path.join(BASE_DIR, "backend", "answer_cache.sqlite") # Set to None for memory only
+ANSWER_CACHE_THRESHOLD = 0.92 # Min cosine similarity between questions to count as a hit
+ANSWER_CACHE_TTL_S = 24 * 60 * 60 # Entries older than this are dropped
+ANSWER_CACHE_MAX_ENTRIES = 500 # LRU bound
+
+# Feedback store (python -m backend.feedback_store import feedback.jsonl / summary / query)
+FEEDBACK_DB_PATH = os.path.join(BASE_DIR, "backend", "feedback.sqlite") # Set to None for memory only
+FEEDBACK_BATCH_SIZE = 64 # Max feedback records per group commit
+FEEDBACK_FLUSH_INTERVAL_S = 0.5 # Longest a record waits for others to share its commit
+
+# Hybrid lexical + vector retrieval (python -m backend.fts_index build)
+RETRIEVAL_MODE = "hybrid" # "vector" or "hybrid" (falls back to vector without a fresh BM25 index)
+HYBRID_CANDIDATES = 50 # Depth of each ranking considered for fusion
+RRF_K = 60 # Reciprocal-rank fusion constant (higher = flatter rank weighting)
+
+# Diversity (maximal marginal relevance) for the agent's retrieval tool
+MMR_LAMBDA = 0.7 # 1.0 = pure relevance, lower = penalize passages similar to ones already picked
+MMR_FETCH_MULTIPLIER = 3 # Candidates considered = top_k * this
+
+# Token-budgeted context packing for retrieved passages
+CONTEXT_TOKEN_BUDGET = 3000 # Max passage tokens per question (shared across tool calls); None = no packing
+PASSAGE_MAX_TOKENS = 400 # Longer passages are windowed around their best-matching sentences
+CONTEXT_MIN_RELATIVE_SIMILARITY = 0.75 # Drop passages scoring below this fraction of the best passage
+TOKEN_COUNT_CACHE_SIZE = 20000 # Per-chunk token counts kept in memory
+
+# Concurrency + rate limiting for LLM calls
+LLM_REQUESTS_PER_MINUTE = 20 # Shared by every Crew / fast-mode call in the process; None = unlimited
+ASK_MANY_CONCURRENCY = 4 # Questions answered at once by RAGAgent.ask_many
+AGENT_RUNTIME_CACHE_SIZE = 8 # Pooled runtimes (model / max_iter / mode / API key / endpoint); least recently used are closed